@@ -35,110 +35,160 @@ if ($_SERVER['REQUEST_METHOD'] === 'POST') {
 }
 
 // ==========================
-// Determine the DATE Field Type
+// Fetch Dashboard Aggregates from Flask API
 // ==========================
 
-// Initialize the variable
-$isDateTime = false;
-
-// Determine the DATE field type
-try {
-    $stmt = $conn->prepare("DESCRIBE laundry");
-    $stmt->execute();
-    $columns = $stmt->fetchAll(PDO::FETCH_ASSOC);
-    foreach ($columns as $column) {
-        if (strtolower($column['Field']) === 'date') {
-            // Check if the field type is DATETIME or TIMESTAMP
-            $isDateTime = in_array(strtolower($column['Type']), ['datetime', 'timestamp']);
-            echo "<!-- DATE field type: " . $column['Type'] . " -->\n"; // Remove after verification
-            break; // Exit the loop once the DATE field is found
-        }
+// The sales, detergent, customer, expense and sales-vs-predictions figures below come from one
+// call to the Flask service, which keeps them in memory. The queries are only run when it is down.
+function fetchDashboardAggregates($year, $month, $day, $userID) {
+    // URL of your Flask API
+    $apiUrl = 'http://127.0.0.1:5000/dashboard/aggregates';
+
+    // Your API key
+    $apiKey = 'testkey123'; // Replace with your actual API key
+
+    $queryParams = http_build_query([
+        'year' => $year,
+        'month' => $month,
+        'day' => $day,
+        'user_id' => $userID,
+        'api_key' => $apiKey
+    ]);
+
+    $ch = curl_init();
+    curl_setopt($ch, CURLOPT_URL, "$apiUrl?$queryParams");
+    curl_setopt($ch, CURLOPT_RETURNTRANSFER, true);
+    curl_setopt($ch, CURLOPT_TIMEOUT, 5); // Fall back to the queries after 5 seconds
+    $response = curl_exec($ch);
+    $status = curl_getinfo($ch, CURLINFO_HTTP_CODE);
+    $failed = curl_errno($ch);
+    curl_close($ch);
+
+    if ($failed || $status !== 200) {
+        return null;
     }
-} catch (PDOException $e) {
-    die("Error describing the laundry table: " . $e->getMessage());
+    $result = json_decode($response, true);
+    return json_last_error() === JSON_ERROR_NONE ? $result : null;
 }
 
-// Default to false if DATE field is not found
-if (!isset($isDateTime)) {
-    $isDateTime = false;
-    echo "<!-- DATE field not found. Defaulting to DATE type. -->\n"; // Debugging
-}
+$aggregates = fetchDashboardAggregates($selectedYear, $selectedMonth, $selectedDay, $_SESSION['userID']);
+echo "<!-- Dashboard aggregates: " . ($aggregates ? "Flask service" : "database queries") . " -->\n";
 
 // ==========================
-// Fetch Today's Sales (Always Based on Current Date)
+// Determine the DATE Field Type
 // ==========================
 
-// Define the filtered date from user input or use current date as fallback
-$filteredDate = isset($_POST['year']) ? sprintf("%04d-%02d-%02d", $_POST['year'], $_POST['month'], $_POST['day']) : date('Y-m-d');
+if ($aggregates) {
+    $today_sales = $aggregates['today_sales'];
+} else {
+    // Initialize the variable
+    $isDateTime = false;
+
+    // Determine the DATE field type
+    try {
+        $stmt = $conn->prepare("DESCRIBE laundry");
+        $stmt->execute();
+        $columns = $stmt->fetchAll(PDO::FETCH_ASSOC);
+        foreach ($columns as $column) {
+            if (strtolower($column['Field']) === 'date') {
+                // Check if the field type is DATETIME or TIMESTAMP
+                $isDateTime = in_array(strtolower($column['Type']), ['datetime', 'timestamp']);
+                echo "<!-- DATE field type: " . $column['Type'] . " -->\n"; // Remove after verification
+                break; // Exit the loop once the DATE field is found
+            }
+        }
+    } catch (PDOException $e) {
+        die("Error describing the laundry table: " . $e->getMessage());
+    }
 
-try {
-    if ($isDateTime) {
-        // For DATETIME or TIMESTAMP, use a range to cover the entire selected day
-        $stmt_today_sales = $conn->prepare("
-        SELECT SUM(TOTAL) as total_sales 
-        FROM laundry 
-        WHERE DATE(`DATE`) BETWEEN :filteredDate AND DATE_ADD(:filteredDate, INTERVAL 1 DAY) AND `PAYMENT_STATUS` = 'Paid'
-        ");
-        $stmt_today_sales->bindParam(':filteredDate', $filteredDate);
-    } else {
-        // For DATE, use direct comparison
-        $stmt_today_sales = $conn->prepare("
-        SELECT SUM(TOTAL) as total_sales 
-        FROM laundry 
-        WHERE DATE(`DATE`) = :filteredDate AND `PAYMENT_STATUS` = 'Paid'
-        ");
-        $stmt_today_sales->bindParam(':filteredDate', $filteredDate);
+    // Default to false if DATE field is not found
+    if (!isset($isDateTime)) {
+        $isDateTime = false;
+        echo "<!-- DATE field not found. Defaulting to DATE type. -->\n"; // Debugging
+    }
+
+    // ==========================
+    // Fetch Today's Sales (Always Based on Current Date)
+    // ==========================
+
+    // Define the filtered date from user input or use current date as fallback
+    $filteredDate = isset($_POST['year']) ? sprintf("%04d-%02d-%02d", $_POST['year'], $_POST['month'], $_POST['day']) : date('Y-m-d');
+
+    try {
+        if ($isDateTime) {
+            // For DATETIME or TIMESTAMP, use a range to cover the entire selected day
+            $stmt_today_sales = $conn->prepare("
+            SELECT SUM(TOTAL) as total_sales 
+            FROM laundry 
+            WHERE DATE(`DATE`) BETWEEN :filteredDate AND DATE_ADD(:filteredDate, INTERVAL 1 DAY) AND `PAYMENT_STATUS` = 'Paid'
+            ");
+            $stmt_today_sales->bindParam(':filteredDate', $filteredDate);
+        } else {
+            // For DATE, use direct comparison
+            $stmt_today_sales = $conn->prepare("
+            SELECT SUM(TOTAL) as total_sales 
+            FROM laundry 
+            WHERE DATE(`DATE`) = :filteredDate AND `PAYMENT_STATUS` = 'Paid'
+            ");
+            $stmt_today_sales->bindParam(':filteredDate', $filteredDate);
+        }
+        $stmt_today_sales->execute();
+        $today_sales = $stmt_today_sales->fetch(PDO::FETCH_ASSOC)['total_sales'] ?: 0;
+        echo "<!-- Debugging: Today's Sales Query Executed Successfully. Total Sales: $today_sales -->\n";
+    } catch (PDOException $e) {
+        die("Error fetching today's sales: " . $e->getMessage());
     }
-    $stmt_today_sales->execute();
-    $today_sales = $stmt_today_sales->fetch(PDO::FETCH_ASSOC)['total_sales'] ?: 0;
-    echo "<!-- Debugging: Today's Sales Query Executed Successfully. Total Sales: $today_sales -->\n";
-} catch (PDOException $e) {
-    die("Error fetching today's sales: " . $e->getMessage());
 }
 
 // ==========================
 // Fetch Sales Data
 // ==========================
 
-// Monthly Sales
-$monthlySalesCondition = "WHERE YEAR(DATE) = :selectedYear";
-$params = ['selectedYear' => $selectedYear];
-
-if ($selectedMonth) {
-    $monthlySalesCondition .= " AND MONTH(DATE) = :selectedMonth";
-    $params['selectedMonth'] = $selectedMonth;
-}
+if ($aggregates) {
+    $monthly_sales = $aggregates['monthly_sales'];
+    $yearly_sales = $aggregates['yearly_sales'];
+    $total_inventory_expenses = $aggregates['inventory_expenses'];
+} else {
+    // Monthly Sales
+    $monthlySalesCondition = "WHERE YEAR(DATE) = :selectedYear";
+    $params = ['selectedYear' => $selectedYear];
 
-$stmt_monthly_sales = $conn->prepare("SELECT SUM(TOTAL) as total_sales FROM laundry $monthlySalesCondition AND PAYMENT_STATUS = 'Paid'");
-$stmt_monthly_sales->execute(array_filter($params));
-$monthly_sales = $stmt_monthly_sales->fetch(PDO::FETCH_ASSOC)['total_sales'] ?: 0;
+    if ($selectedMonth) {
+        $monthlySalesCondition .= " AND MONTH(DATE) = :selectedMonth";
+        $params['selectedMonth'] = $selectedMonth;
+    }
 
+    $stmt_monthly_sales = $conn->prepare("SELECT SUM(TOTAL) as total_sales FROM laundry $monthlySalesCondition AND PAYMENT_STATUS = 'Paid'");
+    $stmt_monthly_sales->execute(array_filter($params));
+    $monthly_sales = $stmt_monthly_sales->fetch(PDO::FETCH_ASSOC)['total_sales'] ?: 0;
 
-$stmt_yearly_sales = $conn->prepare("
-    SELECT SUM(TOTAL) as total_sales 
-    FROM laundry 
-    WHERE YEAR(`DATE`) = :selectedYear AND `PAYMENT_STATUS` = 'Paid'
-");
-$stmt_yearly_sales->execute(['selectedYear' => $selectedYear]);
-$yearly_sales = $stmt_yearly_sales->fetch(PDO::FETCH_ASSOC)['total_sales'] ?: 0;
 
-// Inventory Expenses
-$inventoryExpensesCondition = "WHERE YEAR(ExpenseDate) = :selectedYear";
-$params_inventory_expenses = ['selectedYear' => $selectedYear];
+    $stmt_yearly_sales = $conn->prepare("
+        SELECT SUM(TOTAL) as total_sales 
+        FROM laundry 
+        WHERE YEAR(`DATE`) = :selectedYear AND `PAYMENT_STATUS` = 'Paid'
+    ");
+    $stmt_yearly_sales->execute(['selectedYear' => $selectedYear]);
+    $yearly_sales = $stmt_yearly_sales->fetch(PDO::FETCH_ASSOC)['total_sales'] ?: 0;
+
+    // Inventory Expenses
+    $inventoryExpensesCondition = "WHERE YEAR(ExpenseDate) = :selectedYear";
+    $params_inventory_expenses = ['selectedYear' => $selectedYear];
+
+    if ($selectedMonth) {
+        $inventoryExpensesCondition .= " AND MONTH(ExpenseDate) = :selectedMonth";
+        $params_inventory_expenses['selectedMonth'] = $selectedMonth;
+    }
+    if ($selectedDay) {
+        $inventoryExpensesCondition .= " AND DAY(ExpenseDate) = :selectedDay";
+        $params_inventory_expenses['selectedDay'] = $selectedDay;
+    }
 
-if ($selectedMonth) {
-    $inventoryExpensesCondition .= " AND MONTH(ExpenseDate) = :selectedMonth";
-    $params_inventory_expenses['selectedMonth'] = $selectedMonth;
-}
-if ($selectedDay) {
-    $inventoryExpensesCondition .= " AND DAY(ExpenseDate) = :selectedDay";
-    $params_inventory_expenses['selectedDay'] = $selectedDay;
+    $stmt_inventory_expenses = $conn->prepare("SELECT SUM(Amount) as total_expenses FROM inventory_expenses $inventoryExpensesCondition");
+    $stmt_inventory_expenses->execute(array_filter($params_inventory_expenses));
+    $total_inventory_expenses = $stmt_inventory_expenses->fetch(PDO::FETCH_ASSOC)['total_expenses'] ?: 0;
 }
 
-$stmt_inventory_expenses = $conn->prepare("SELECT SUM(Amount) as total_expenses FROM inventory_expenses $inventoryExpensesCondition");
-$stmt_inventory_expenses->execute(array_filter($params_inventory_expenses));
-$total_inventory_expenses = $stmt_inventory_expenses->fetch(PDO::FETCH_ASSOC)['total_expenses'] ?: 0;
-
 // ==========================
 // Calculate Revenue 
 // ==========================
@@ -151,21 +201,25 @@ if ($selectedDay) {
     $total_revenue = $yearly_sales - $total_inventory_expenses;
 }
 
-// Sales by Month
-$stmt_sales_by_month = $conn->prepare("
-    SELECT MONTH(DATE) as month, SUM(TOTAL) as total_sales
-    FROM laundry
-    WHERE YEAR(DATE) = :selectedYear
-    GROUP BY month
-    ORDER BY month
-");
-$stmt_sales_by_month->execute(['selectedYear' => $selectedYear]);
-$sales_by_month = $stmt_sales_by_month->fetchAll(PDO::FETCH_ASSOC);
-
-// Prepare the sales data for each month (initialize an array for all 12 months)
-$monthly_sales_data = array_fill(1, 12, 0); // Array for all 12 months
-foreach ($sales_by_month as $sale) {
-    $monthly_sales_data[(int)$sale['month']] = (float)$sale['total_sales'];
+if ($aggregates) {
+    $monthly_sales_data = array_combine(range(1, 12), $aggregates['sales_by_month']);
+} else {
+    // Sales by Month
+    $stmt_sales_by_month = $conn->prepare("
+        SELECT MONTH(DATE) as month, SUM(TOTAL) as total_sales
+        FROM laundry
+        WHERE YEAR(DATE) = :selectedYear
+        GROUP BY month
+        ORDER BY month
+    ");
+    $stmt_sales_by_month->execute(['selectedYear' => $selectedYear]);
+    $sales_by_month = $stmt_sales_by_month->fetchAll(PDO::FETCH_ASSOC);
+
+    // Prepare the sales data for each month (initialize an array for all 12 months)
+    $monthly_sales_data = array_fill(1, 12, 0); // Array for all 12 months
+    foreach ($sales_by_month as $sale) {
+        $monthly_sales_data[(int)$sale['month']] = (float)$sale['total_sales'];
+    }
 }
 
 // Convert the monthly sales data to a format usable by JavaScript
@@ -178,109 +232,124 @@ echo "<script>const totalRevenue = " . json_encode($total_revenue) . ";</script>
 // Fetch Detergents Data
 // ==========================
 
-// Top Used Detergents
-$detergentCondition = "WHERE YEAR(DATE) = :selectedYear";
-$paramsDetergent = ['selectedYear' => $selectedYear];
+if ($aggregates) {
+    $detergent_names = array_column($aggregates['top_detergents'], 'name');
+    $detergent_counts = array_column($aggregates['top_detergents'], 'count');
+    $fabric_detergent_names = array_column($aggregates['top_fabric_detergents'], 'name');
+    $fabric_detergent_counts = array_column($aggregates['top_fabric_detergents'], 'count');
+} else {
+    // Top Used Detergents
+    $detergentCondition = "WHERE YEAR(DATE) = :selectedYear";
+    $paramsDetergent = ['selectedYear' => $selectedYear];
 
-if ($selectedMonth) {
-    $detergentCondition .= " AND MONTH(DATE) = :selectedMonth";
-    $paramsDetergent['selectedMonth'] = $selectedMonth;
-}
-if ($selectedDay) {
-    $detergentCondition .= " AND DAY(DATE) = :selectedDay";
-    $paramsDetergent['selectedDay'] = $selectedDay;
-}
+    if ($selectedMonth) {
+        $detergentCondition .= " AND MONTH(DATE) = :selectedMonth";
+        $paramsDetergent['selectedMonth'] = $selectedMonth;
+    }
+    if ($selectedDay) {
+        $detergentCondition .= " AND DAY(DATE) = :selectedDay";
+        $paramsDetergent['selectedDay'] = $selectedDay;
+    }
 
-$stmt_top_detergents = $conn->prepare("SELECT DETERGENT, COUNT(*) as count FROM laundry $detergentCondition GROUP BY DETERGENT ORDER BY count DESC LIMIT 5");
-$stmt_top_detergents->execute(array_filter($paramsDetergent));
-$top_detergents = $stmt_top_detergents->fetchAll(PDO::FETCH_ASSOC);
+    $stmt_top_detergents = $conn->prepare("SELECT DETERGENT, COUNT(*) as count FROM laundry $detergentCondition GROUP BY DETERGENT ORDER BY count DESC LIMIT 5");
+    $stmt_top_detergents->execute(array_filter($paramsDetergent));
+    $top_detergents = $stmt_top_detergents->fetchAll(PDO::FETCH_ASSOC);
 
-// Prepare data for the pie chart
-$detergent_names = [];
-$detergent_counts = [];
-foreach ($top_detergents as $detergent) {
-    $detergent_names[] = $detergent['DETERGENT'];
-    $detergent_counts[] = $detergent['count'];
-}
+    // Prepare data for the pie chart
+    $detergent_names = [];
+    $detergent_counts = [];
+    foreach ($top_detergents as $detergent) {
+        $detergent_names[] = $detergent['DETERGENT'];
+        $detergent_counts[] = $detergent['count'];
+    }
 
-// Top Used Fabric Detergents
-$fabricDetergentCondition = "WHERE YEAR(DATE) = :selectedYear";
-$paramsFabricDetergent = ['selectedYear' => $selectedYear];
+    // Top Used Fabric Detergents
+    $fabricDetergentCondition = "WHERE YEAR(DATE) = :selectedYear";
+    $paramsFabricDetergent = ['selectedYear' => $selectedYear];
 
-if ($selectedMonth) {
-    $fabricDetergentCondition .= " AND MONTH(DATE) = :selectedMonth";
-    $paramsFabricDetergent['selectedMonth'] = $selectedMonth;
-}
-if ($selectedDay) {
-    $fabricDetergentCondition .= " AND DAY(DATE) = :selectedDay";
-    $paramsFabricDetergent['selectedDay'] = $selectedDay;
-}
+    if ($selectedMonth) {
+        $fabricDetergentCondition .= " AND MONTH(DATE) = :selectedMonth";
+        $paramsFabricDetergent['selectedMonth'] = $selectedMonth;
+    }
+    if ($selectedDay) {
+        $fabricDetergentCondition .= " AND DAY(DATE) = :selectedDay";
+        $paramsFabricDetergent['selectedDay'] = $selectedDay;
+    }
 
-$stmt_top_fabric_detergents = $conn->prepare("SELECT FABRIC_DETERGENT, COUNT(*) as count FROM laundry $fabricDetergentCondition GROUP BY FABRIC_DETERGENT ORDER BY count DESC LIMIT 5");
-$stmt_top_fabric_detergents->execute(array_filter($paramsFabricDetergent));
-$top_fabric_detergents = $stmt_top_fabric_detergents->fetchAll(PDO::FETCH_ASSOC);
+    $stmt_top_fabric_detergents = $conn->prepare("SELECT FABRIC_DETERGENT, COUNT(*) as count FROM laundry $fabricDetergentCondition GROUP BY FABRIC_DETERGENT ORDER BY count DESC LIMIT 5");
+    $stmt_top_fabric_detergents->execute(array_filter($paramsFabricDetergent));
+    $top_fabric_detergents = $stmt_top_fabric_detergents->fetchAll(PDO::FETCH_ASSOC);
 
-// Prepare data for the fabric detergent pie chart
-$fabric_detergent_names = [];
-$fabric_detergent_counts = [];
-foreach ($top_fabric_detergents as $detergent) {
-    $fabric_detergent_names[] = $detergent['FABRIC_DETERGENT'];
-    $fabric_detergent_counts[] = $detergent['count'];
+    // Prepare data for the fabric detergent pie chart
+    $fabric_detergent_names = [];
+    $fabric_detergent_counts = [];
+    foreach ($top_fabric_detergents as $detergent) {
+        $fabric_detergent_names[] = $detergent['FABRIC_DETERGENT'];
+        $fabric_detergent_counts[] = $detergent['count'];
+    }
 }
 
 // ==========================
 // Fetch Customer and Sales Data
 // ==========================
 
-// Total Customers and Days
-$customerCondition = "WHERE YEAR(DATE) = :selectedYear";
-$paramsCustomer = ['selectedYear' => $selectedYear];
+if ($aggregates) {
+    $average_customers_per_day = $aggregates['average_customers_per_day'];
+} else {
+    // Total Customers and Days
+    $customerCondition = "WHERE YEAR(DATE) = :selectedYear";
+    $paramsCustomer = ['selectedYear' => $selectedYear];
 
-if ($selectedMonth) {
-    $customerCondition .= " AND MONTH(DATE) = :selectedMonth";
-    $paramsCustomer['selectedMonth'] = $selectedMonth;
-}
+    if ($selectedMonth) {
+        $customerCondition .= " AND MONTH(DATE) = :selectedMonth";
+        $paramsCustomer['selectedMonth'] = $selectedMonth;
+    }
 
-$stmt_total_customers = $conn->prepare("
-    SELECT COUNT(*) as total_customers, COUNT(DISTINCT DATE) as total_days
-    FROM laundry
-    $customerCondition
-");
-$stmt_total_customers->execute(array_filter($paramsCustomer));
-$total_customers_data = $stmt_total_customers->fetch(PDO::FETCH_ASSOC);
+    $stmt_total_customers = $conn->prepare("
+        SELECT COUNT(*) as total_customers, COUNT(DISTINCT DATE) as total_days
+        FROM laundry
+        $customerCondition
+    ");
+    $stmt_total_customers->execute(array_filter($paramsCustomer));
+    $total_customers_data = $stmt_total_customers->fetch(PDO::FETCH_ASSOC);
 
-$total_customers = $total_customers_data['total_customers'] ?: 0;
-$total_days = $total_customers_data['total_days'] ?: 1; // Avoid division by zero
+    $total_customers = $total_customers_data['total_customers'] ?: 0;
+    $total_days = $total_customers_data['total_days'] ?: 1; // Avoid division by zero
 
-// Calculate the average number of customers per day
-$average_customers_per_day = $total_customers / $total_days;
+    // Calculate the average number of customers per day
+    $average_customers_per_day = $total_customers / $total_days;
+}
 
 // Pass the average customers per day to JavaScript
 echo "<script>const averageCustomersPerDay = " . json_encode($average_customers_per_day) . ";</script>";
 
-// Average Sales
-$salesCondition = "WHERE YEAR(DATE) = :selectedYear";
-$paramsSales = ['selectedYear' => $selectedYear];
+if ($aggregates) {
+    $average_sales_per_day = $aggregates['average_sales_per_day'];
+} else {
+    // Average Sales
+    $salesCondition = "WHERE YEAR(DATE) = :selectedYear";
+    $paramsSales = ['selectedYear' => $selectedYear];
 
-if ($selectedMonth) {
-    $salesCondition .= " AND MONTH(DATE) = :selectedMonth";
-    $paramsSales['selectedMonth'] = $selectedMonth;
-}
+    if ($selectedMonth) {
+        $salesCondition .= " AND MONTH(DATE) = :selectedMonth";
+        $paramsSales['selectedMonth'] = $selectedMonth;
+    }
 
-$stmt_total_sales = $conn->prepare("
-    SELECT SUM(TOTAL) as total_sales, COUNT(DISTINCT DATE) as total_days
-    FROM laundry
-    $salesCondition
-");
-$stmt_total_sales->execute(array_filter($paramsSales));
-$total_sales_data = $stmt_total_sales->fetch(PDO::FETCH_ASSOC);
+    $stmt_total_sales = $conn->prepare("
+        SELECT SUM(TOTAL) as total_sales, COUNT(DISTINCT DATE) as total_days
+        FROM laundry
+        $salesCondition
+    ");
+    $stmt_total_sales->execute(array_filter($paramsSales));
+    $total_sales_data = $stmt_total_sales->fetch(PDO::FETCH_ASSOC);
 
-// Get total sales and number of distinct days
-$total_sales = $total_sales_data['total_sales'] ?: 0;  // If no sales, set to 0
-$total_days_sales = $total_sales_data['total_days'] ?: 1;  // If no distinct days, set to 1 to avoid division by zero
+    // Get total sales and number of distinct days
+    $total_sales = $total_sales_data['total_sales'] ?: 0;  // If no sales, set to 0
+    $total_days_sales = $total_sales_data['total_days'] ?: 1;  // If no distinct days, set to 1 to avoid division by zero
 
-// Calculate the average sales per day
-$average_sales_per_day = $total_sales / $total_days_sales;
+    // Calculate the average sales per day
+    $average_sales_per_day = $total_sales / $total_days_sales;
+}
 
 // Pass the average sales per day to JavaScript
 echo "<script>const averageSalesPerDay = " . json_encode($average_sales_per_day) . ";</script>";
@@ -312,55 +381,60 @@ echo "<script>
 // Fetch Inventory Expenses Data
 // ==========================
 
-$expensesCondition = "WHERE ie.InventoryID = i.InventoryID AND i.userID = :userID";
-$paramsExpenses = ['userID' => $_SESSION['userID']];
+if ($aggregates) {
+    $total_expenses = $aggregates['expenses']['total'];
+    $monthly_expenses_data = array_combine(range(1, 12), $aggregates['expenses']['by_month']);
+} else {
+    $expensesCondition = "WHERE ie.InventoryID = i.InventoryID AND i.userID = :userID";
+    $paramsExpenses = ['userID' => $_SESSION['userID']];
 
-if ($selectedYear) {
-    $expensesCondition .= " AND YEAR(ie.ExpenseDate) = :selectedYear";
-    $paramsExpenses['selectedYear'] = $selectedYear;
-}
-if ($selectedMonth) {
-    $expensesCondition .= " AND MONTH(ie.ExpenseDate) = :selectedMonth";
-    $paramsExpenses['selectedMonth'] = $selectedMonth;
-}
-if ($selectedDay) {
-    $expensesCondition .= " AND DAY(ie.ExpenseDate) = :selectedDay";
-    $paramsExpenses['selectedDay'] = $selectedDay;
-}
+    if ($selectedYear) {
+        $expensesCondition .= " AND YEAR(ie.ExpenseDate) = :selectedYear";
+        $paramsExpenses['selectedYear'] = $selectedYear;
+    }
+    if ($selectedMonth) {
+        $expensesCondition .= " AND MONTH(ie.ExpenseDate) = :selectedMonth";
+        $paramsExpenses['selectedMonth'] = $selectedMonth;
+    }
+    if ($selectedDay) {
+        $expensesCondition .= " AND DAY(ie.ExpenseDate) = :selectedDay";
+        $paramsExpenses['selectedDay'] = $selectedDay;
+    }
 
-// Query to get total inventory expenses
-$stmt_total_expenses = $conn->prepare("SELECT SUM(ie.Amount) as total_expenses FROM inventory_expenses ie JOIN inventory i ON ie.InventoryID = i.InventoryID $expensesCondition");
-$stmt_total_expenses->execute(array_filter($paramsExpenses));
-$total_expenses = $stmt_total_expenses->fetch(PDO::FETCH_ASSOC)['total_expenses'] ?: 0;
+    // Query to get total inventory expenses
+    $stmt_total_expenses = $conn->prepare("SELECT SUM(ie.Amount) as total_expenses FROM inventory_expenses ie JOIN inventory i ON ie.InventoryID = i.InventoryID $expensesCondition");
+    $stmt_total_expenses->execute(array_filter($paramsExpenses));
+    $total_expenses = $stmt_total_expenses->fetch(PDO::FETCH_ASSOC)['total_expenses'] ?: 0;
 
-// Query to get expenses grouped by month (for bar chart)
-$expensesByMonthCondition = "WHERE ie.InventoryID = i.InventoryID AND i.userID = :userID";
-$paramsExpensesByMonth = ['userID' => $_SESSION['userID']];
+    // Query to get expenses grouped by month (for bar chart)
+    $expensesByMonthCondition = "WHERE ie.InventoryID = i.InventoryID AND i.userID = :userID";
+    $paramsExpensesByMonth = ['userID' => $_SESSION['userID']];
 
-if ($selectedYear) {
-    $expensesByMonthCondition .= " AND YEAR(ie.ExpenseDate) = :selectedYear";
-    $paramsExpensesByMonth['selectedYear'] = $selectedYear;
-}
-if ($selectedMonth) {
-    $expensesByMonthCondition .= " AND MONTH(ie.ExpenseDate) = :selectedMonth";
-    $paramsExpensesByMonth['selectedMonth'] = $selectedMonth;
-}
+    if ($selectedYear) {
+        $expensesByMonthCondition .= " AND YEAR(ie.ExpenseDate) = :selectedYear";
+        $paramsExpensesByMonth['selectedYear'] = $selectedYear;
+    }
+    if ($selectedMonth) {
+        $expensesByMonthCondition .= " AND MONTH(ie.ExpenseDate) = :selectedMonth";
+        $paramsExpensesByMonth['selectedMonth'] = $selectedMonth;
+    }
 
-$stmt_expenses_by_month = $conn->prepare("
-    SELECT MONTH(ie.ExpenseDate) as month, SUM(ie.Amount) as total_expenses
-    FROM inventory_expenses ie
-    JOIN inventory i ON ie.InventoryID = i.InventoryID
-    $expensesByMonthCondition
-    GROUP BY month
-    ORDER BY month ASC
-");
-$stmt_expenses_by_month->execute(array_filter($paramsExpensesByMonth));
-$expenses_by_month = $stmt_expenses_by_month->fetchAll(PDO::FETCH_ASSOC);
-
-// Prepare the expenses data for each month (initialize an array for all 12 months)
-$monthly_expenses_data = array_fill(1, 12, 0); // Array for all 12 months
-foreach ($expenses_by_month as $expense) {
-    $monthly_expenses_data[(int)$expense['month']] = (float)$expense['total_expenses'];
+    $stmt_expenses_by_month = $conn->prepare("
+        SELECT MONTH(ie.ExpenseDate) as month, SUM(ie.Amount) as total_expenses
+        FROM inventory_expenses ie
+        JOIN inventory i ON ie.InventoryID = i.InventoryID
+        $expensesByMonthCondition
+        GROUP BY month
+        ORDER BY month ASC
+    ");
+    $stmt_expenses_by_month->execute(array_filter($paramsExpensesByMonth));
+    $expenses_by_month = $stmt_expenses_by_month->fetchAll(PDO::FETCH_ASSOC);
+
+    // Prepare the expenses data for each month (initialize an array for all 12 months)
+    $monthly_expenses_data = array_fill(1, 12, 0); // Array for all 12 months
+    foreach ($expenses_by_month as $expense) {
+        $monthly_expenses_data[(int)$expense['month']] = (float)$expense['total_expenses'];
+    }
 }
 
 // Convert the monthly expenses data to a format usable by JavaScript
@@ -385,6 +459,10 @@ function fetchPredictedSales($year, $month, $day) {
         'api_key' => $apiKey // Pass API key as query parameter
     ]);
 
+    // Last forecast received for these filters, revalidated with its ETag
+    $cacheKey = "$year-$month-$day";
+    $cached = $_SESSION['predicted_sales_cache'][$cacheKey] ?? null;
+
     // Initialize cURL
     $ch = curl_init();
 
@@ -392,6 +470,16 @@ function fetchPredictedSales($year, $month, $day) {
     curl_setopt($ch, CURLOPT_URL, "$apiUrl?$queryParams");
     curl_setopt($ch, CURLOPT_RETURNTRANSFER, true);
     curl_setopt($ch, CURLOPT_TIMEOUT, 10); // Timeout after 10 seconds
+    if ($cached) {
+        curl_setopt($ch, CURLOPT_HTTPHEADER, ['If-None-Match: ' . $cached['etag']]);
+    }
+    $etag = null;
+    curl_setopt($ch, CURLOPT_HEADERFUNCTION, function ($ch, $header) use (&$etag) {
+        if (stripos($header, 'ETag:') === 0) {
+            $etag = trim(substr($header, 5));
+        }
+        return strlen($header);
+    });
 
     // Execute the request
     $response = curl_exec($ch);
@@ -403,9 +491,16 @@ function fetchPredictedSales($year, $month, $day) {
         return ['error' => $error_msg];
     }
 
+    $status = curl_getinfo($ch, CURLINFO_HTTP_CODE);
+
     // Close cURL
     curl_close($ch);
 
+    // Nothing changed since the cached forecast
+    if ($status === 304 && $cached) {
+        return $cached['result'];
+    }
+
     // Decode JSON response
     $result = json_decode($response, true);
 
@@ -414,6 +509,10 @@ function fetchPredictedSales($year, $month, $day) {
         return ['error' => 'Invalid JSON response from API'];
     }
 
+    if ($etag) {
+        $_SESSION['predicted_sales_cache'][$cacheKey] = ['etag' => $etag, 'result' => $result];
+    }
+
     return $result;
 }
 
@@ -435,49 +534,55 @@ echo "<script>
 // Fetch Actual Sales and Historical Predictions Data for the Chart
 // ==========================
 
-// Fetch actual monthly sales data for the selected year
-$stmt_actual_sales = $conn->prepare("
-    SELECT DATE_FORMAT(DATE, '%Y-%m') as month, SUM(TOTAL) as total_sales
-    FROM laundry
-    WHERE YEAR(DATE) = :selectedYear
-    GROUP BY month
-    ORDER BY month
-");
-$stmt_actual_sales->execute(['selectedYear' => $selectedYear]);
-$actual_sales_data = $stmt_actual_sales->fetchAll(PDO::FETCH_ASSOC);
-
-// Fetch historical predictions from sales_predictions table for the selected year or previous year if necessary
-$stmt_predicted_sales = $conn->prepare("
-    SELECT DATE_FORMAT(prediction_date, '%Y-%m') as month, predicted_sales
-    FROM sales_predictions
-    WHERE YEAR(prediction_date) = :selectedYear OR (YEAR(prediction_date) = :previousYear AND :selectedYear > YEAR(NOW()))
-    ORDER BY prediction_date
-");
-$stmt_predicted_sales->execute(['selectedYear' => $selectedYear, 'previousYear' => $selectedYear - 1]);
-$predicted_sales_data = $stmt_predicted_sales->fetchAll(PDO::FETCH_ASSOC);
-
-// Prepare data for JavaScript
-$actual_sales_labels = [];
-$actual_sales_values = [];
-$predicted_sales_values = [];
-
-// Populate actual sales data
-foreach ($actual_sales_data as $data) {
-    $actual_sales_labels[] = $data['month'];
-    $actual_sales_values[] = (float)$data['total_sales'];
-}
+if ($aggregates) {
+    $actual_sales_labels = $aggregates['sales_vs_predictions']['labels'];
+    $actual_sales_values = $aggregates['sales_vs_predictions']['actual'];
+    $predicted_sales_values = $aggregates['sales_vs_predictions']['predicted'];
+} else {
+    // Fetch actual monthly sales data for the selected year
+    $stmt_actual_sales = $conn->prepare("
+        SELECT DATE_FORMAT(DATE, '%Y-%m') as month, SUM(TOTAL) as total_sales
+        FROM laundry
+        WHERE YEAR(DATE) = :selectedYear
+        GROUP BY month
+        ORDER BY month
+    ");
+    $stmt_actual_sales->execute(['selectedYear' => $selectedYear]);
+    $actual_sales_data = $stmt_actual_sales->fetchAll(PDO::FETCH_ASSOC);
+
+    // Fetch historical predictions from sales_predictions table for the selected year or previous year if necessary
+    $stmt_predicted_sales = $conn->prepare("
+        SELECT DATE_FORMAT(prediction_date, '%Y-%m') as month, predicted_sales
+        FROM sales_predictions
+        WHERE YEAR(prediction_date) = :selectedYear OR (YEAR(prediction_date) = :previousYear AND :selectedYear > YEAR(NOW()))
+        ORDER BY prediction_date
+    ");
+    $stmt_predicted_sales->execute(['selectedYear' => $selectedYear, 'previousYear' => $selectedYear - 1]);
+    $predicted_sales_data = $stmt_predicted_sales->fetchAll(PDO::FETCH_ASSOC);
+
+    // Prepare data for JavaScript
+    $actual_sales_labels = [];
+    $actual_sales_values = [];
+    $predicted_sales_values = [];
+
+    // Populate actual sales data
+    foreach ($actual_sales_data as $data) {
+        $actual_sales_labels[] = $data['month'];
+        $actual_sales_values[] = (float)$data['total_sales'];
+    }
 
-// Populate predicted sales data based on the same labels
-foreach ($actual_sales_labels as $month) {
-    // Find the matching predicted sales for the month or set it to null if not available
-    $predicted_value = null;
-    foreach ($predicted_sales_data as $pred) {
-        if ($pred['month'] === $month) {
-            $predicted_value = (float)$pred['predicted_sales'];
-            break;
+    // Populate predicted sales data based on the same labels
+    foreach ($actual_sales_labels as $month) {
+        // Find the matching predicted sales for the month or set it to null if not available
+        $predicted_value = null;
+        foreach ($predicted_sales_data as $pred) {
+            if ($pred['month'] === $month) {
+                $predicted_value = (float)$pred['predicted_sales'];
+                break;
+            }
         }
+        $predicted_sales_values[] = $predicted_value;
     }
-    $predicted_sales_values[] = $predicted_value;
 }
 
 // Add the next month’s prediction if available
@@ -0,0 +1,319 @@
+# asgi_app.py
+#
+# ASGI serving mode. Run from this directory:
+#     uvicorn asgi_app:app --host 0.0.0.0 --port 5000
+#     python asgi_app.py                (binds Config.SERVER_BIND)
+#
+# /predict runs on the event loop. The API key and ETag checks and forecast cache hits are
+# answered without a thread. Monthly sales the change detector's snapshot cannot answer (day
+# filters) are read through an async SQLAlchemy engine (aiomysql, or aiosqlite for the SQLite
+# stand-in). Only the forecast itself runs on a pool of ASGI_EXECUTOR_THREADS threads, so idle
+# and cached-response connections cost a coroutine each. Every other endpoint is served by the
+# Flask app of predict_sales on ASGI_WSGI_THREADS threads, with the same api_key checks and
+# responses as under waitress or gunicorn.
+
+import asyncio
+import logging
+import time
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import asynccontextmanager
+from functools import partial, wraps
+
+from a2wsgi import WSGIMiddleware
+from starlette.applications import Starlette
+from starlette.responses import JSONResponse, PlainTextResponse, Response
+from starlette.routing import Mount, Route
+from werkzeug.http import parse_etags, quote_etag
+
+import predict_sales
+from config import Config
+from instrumentation import registry, stage, REQUEST_SECONDS
+from single_flight import AsyncSingleFlight
+
+# Threads running forecasts (and anything else that would block the event loop)
+executor = ThreadPoolExecutor(max_workers=Config.ASGI_EXECUTOR_THREADS, thread_name_prefix='asgi-forecast')
+
+# Identical /predict requests that arrive while one is being computed await its result
+predict_flight = AsyncSingleFlight()
+
+_async_engine = None    # Created by the first request that reads the database
+
+
+def async_engine():
+    """
+    Return the async SQLAlchemy engine, creating it on first use so that starting the server
+    does not wait for the SQLAlchemy and pandas imports.
+    """
+    global _async_engine
+    if _async_engine is None:
+        from sales_data import create_async_db_engine
+        _async_engine = create_async_db_engine(Config)
+    return _async_engine
+
+
+async def run_blocking(fn, *args):
+    """
+    Run fn(*args) on the executor and await its result.
+    """
+    return await asyncio.get_running_loop().run_in_executor(executor, partial(fn, *args))
+
+
+def flask_call(base_url, fn, *args):
+    """
+    Call fn(*args), which builds a Flask response (jsonify, url_for), inside a Flask request
+    context and freeze its response to (body, status, headers).
+    """
+    with predict_sales.app.test_request_context('/predict', base_url=base_url):
+        response = predict_sales.app.make_response(fn(*args))
+        return response.get_data(), response.status_code, list(response.headers)
+
+
+def frozen_response(frozen):
+    body, status, headers = frozen
+    return Response(body, status_code=status, headers=dict(headers))
+
+
+def query_number(request, name, cast=int, default=None):
+    """
+    Read a numeric query parameter the way Flask's request.args.get(name, default, type) does:
+    a missing or malformed value gives the default.
+    """
+    value = request.query_params.get(name)
+    try:
+        return cast(value) if value is not None else default
+    except ValueError:
+        return default
+
+
+async def ensure_warm(timeout=predict_sales.WARM_UP_WAIT_SECONDS):
+    """
+    predict_sales.ensure_warm without holding a thread: wait for the background warm-up on the
+    event loop, starting it if none is running. Raises if the warm-up failed.
+    """
+    predict_sales.start_warm_up()
+    deadline = time.monotonic() + timeout
+    while not predict_sales._warm_up_done.is_set():
+        thread = predict_sales._warm_up_thread
+        if predict_sales.warm_up_state['status'] == 'failed' and (thread is None or not thread.is_alive()):
+            raise RuntimeError(predict_sales.warm_up_state['error'])
+        if time.monotonic() >= deadline:
+            return False
+        await asyncio.sleep(0.05)
+    return True
+
+
+# ================================
+# Decorators
+# ================================
+
+def observed(rule):
+    """
+    Decorator recording an endpoint's latency under rule, like predict_sales' after_request hook.
+    """
+    def decorator(endpoint):
+        @wraps(endpoint)
+        async def decorated(request):
+            started = time.perf_counter()
+            response = await endpoint(request)
+            REQUEST_SECONDS.observe(time.perf_counter() - started, endpoint=rule, method=request.method,
+                                    status=response.status_code)
+            return response
+        return decorated
+    return decorator
+
+
+def require_api_key(endpoint):
+    """
+    Decorator to require API key authentication, as predict_sales.require_api_key.
+    """
+    @wraps(endpoint)
+    async def decorated(request):
+        key = request.query_params.get('api_key')
+        if key and key == predict_sales.API_KEY:
+            return await endpoint(request)
+        logging.warning("Unauthorized access attempt.")
+        return JSONResponse({'error': 'Unauthorized'}, status_code=401)
+    return decorated
+
+
+def require_warm(endpoint):
+    """
+    Decorator making an endpoint wait for the warm-up, answering 503 if it takes too long.
+    """
+    @wraps(endpoint)
+    async def decorated(request):
+        try:
+            warm = await ensure_warm()
+        except Exception as e:
+            return JSONResponse({'error': f'The service failed to warm up: {str(e)}'}, status_code=503)
+        if not warm:
+            return JSONResponse({'error': 'The service is warming up; retry shortly.'}, status_code=503,
+                                headers={'Retry-After': '5'})
+        return await endpoint(request)
+    return decorated
+
+
+# ================================
+# API Endpoints
+# ================================
+
+def cached_forecast(filter_key):
+    """
+    Return (etag, cached forecast result or None) for filter_key, from the change detector's
+    snapshot and the forecast cache.
+    """
+    cache_key = filter_key + predict_sales.data_watermark(*filter_key) + (predict_sales.forecast_version(),)
+    return predict_sales.forecast_etag(filter_key), predict_sales.forecast_cache.get(cache_key)
+
+
+async def compute_forecast(base_url, year, month, day, deadline):
+    """
+    Compute a /predict response: the monthly sales come from the snapshot, or from the async
+    engine when the snapshot cannot answer the filters, and the forecast runs on the executor.
+    """
+    df = None
+    if day is not None or not predict_sales.change_detector.ready:
+        with stage('fetch'):
+            from sales_data import fetch_monthly_sales_async
+            df = await fetch_monthly_sales_async(async_engine(), year, month, day)
+    return await run_blocking(flask_call, base_url, predict_sales.predict_response, year, month, day, deadline, df)
+
+
+def profiled_forecast(base_url, reason, metadata, year, month, day, deadline):
+    """
+    Compute a /predict response on this thread under a profile capture, as predict_sales.profiled.
+    """
+    with predict_sales.profile_store.capture('request', {'reason': reason, **metadata}) as capture:
+        body, status, headers = flask_call(base_url, predict_sales.predict_response, year, month, day, deadline)
+        capture.metadata['status'] = status
+    if capture.profile_id is not None:
+        predict_sales.PROFILES_CAPTURED.inc(kind='request', reason=reason)
+        headers.append(('X-Profile-Id', capture.profile_id))
+    return body, status, headers
+
+
+@observed('/predict')
+@require_api_key
+@require_warm
+async def predict(request):
+    """
+    /predict on the event loop, with the parameters and responses of predict_sales.predict_sales.
+    """
+    year = query_number(request, 'year')
+    month = query_number(request, 'month')
+    day = query_number(request, 'day')
+    budget = query_number(request, 'budget', float, predict_sales.PREDICT_BUDGET_SECONDS)
+    budget_seconds = min(max(budget, 0), predict_sales.PREDICT_MAX_BUDGET_SECONDS)
+    deadline = time.monotonic() + budget_seconds
+    filter_key = (year, month, day)
+    base_url = str(request.base_url)
+
+    logging.info(f"Received prediction request with year={year}, month={month}, day={day}, budget={budget}s")
+
+    reason = predict_sales.profile_reason(request.query_params, request.headers)
+    if reason is not None:
+        metadata = {'method': request.method, 'path': request.url.path, 'body': None,
+                    'args': {key: value for key, value in request.query_params.items()
+                             if key not in ('api_key', 'profile')}}
+        return frozen_response(await run_blocking(profiled_forecast, base_url, reason, metadata,
+                                                  year, month, day, deadline))
+
+    # With a polling change detector the snapshot is in memory; otherwise reading it polls the database
+    if predict_sales.change_detector.ready and Config.CHANGE_POLL_SECONDS > 0:
+        etag, forecast_result = cached_forecast(filter_key)
+    else:
+        etag, forecast_result = await run_blocking(cached_forecast, filter_key)
+
+    headers = {'Cache-Control': 'no-store'}
+    if etag is not None:
+        headers = {'ETag': quote_etag(etag), 'Cache-Control': predict_sales.PREDICT_CACHE_CONTROL}
+        if parse_etags(request.headers.get('If-None-Match')).contains(etag):
+            predict_sales.PREDICT_NOT_MODIFIED.inc()
+            return Response(status_code=304, headers=headers)
+    if forecast_result is not None:
+        logging.info(f"Forecast cache hit for year={year}, month={month}, day={day}")
+        return JSONResponse(predict_sales.forecast_payload(forecast_result, 'hit'), headers=headers)
+
+    # Coalesced per whole-second budget, like the Flask endpoint
+    frozen, shared = await predict_flight.do(filter_key + (int(budget_seconds),), compute_forecast,
+                                             base_url, year, month, day, deadline)
+    if shared:
+        logging.info(f"Coalesced prediction request with year={year}, month={month}, day={day}")
+    return frozen_response(frozen)
+
+
+@observed('/predict/status/<job_id>')
+@require_api_key
+async def prediction_status(request):
+    """
+    API endpoint to report the progress and result of a background forecast job.
+    """
+    job = predict_sales.forecast_jobs.status(request.path_params['job_id'])
+    if job is None:
+        return JSONResponse({'error': 'Unknown or expired job id.'}, status_code=404)
+    return JSONResponse(job)
+
+
+@observed('/metrics')
+@require_api_key
+async def metrics_endpoint(request):
+    """
+    API endpoint exposing latency histograms, pool and cache statistics in Prometheus format.
+    """
+    return PlainTextResponse(registry.render(), media_type='text/plain; version=0.0.4')
+
+
+async def home(request):
+    """
+    Liveness check; answers as soon as the process accepts requests, before the warm-up.
+    """
+    return PlainTextResponse("Flask Sales Prediction Service is running.")
+
+
+async def ready(request):
+    """
+    Readiness check: 200 once the warm-up has loaded the models and created the engine,
+    503 while it is running or after it failed.
+    """
+    predict_sales.start_warm_up()
+    body = {**predict_sales.warm_up_state, 'serving_model': predict_sales.serving_model is not None,
+            'model_version': predict_sales.model_version()}
+    return JSONResponse(body, status_code=200 if predict_sales._warm_up_done.is_set() else 503)
+
+
+registry.counter_callback('asgi_predict_requests_coalesced_total',
+                          'Requests to the ASGI /predict answered by an identical in-flight request.',
+                          lambda: predict_flight.stats()['coalesced'])
+
+
+@asynccontextmanager
+async def lifespan(app):
+    predict_sales.start_warm_up()
+    try:
+        yield
+    finally:
+        if _async_engine is not None:
+            await _async_engine.dispose()
+        executor.shutdown(wait=False)
+        predict_sales.shutdown()
+
+
+app = Starlette(
+    routes=[
+        Route('/', home),
+        Route('/ready', ready),
+        Route('/predict', predict, methods=['GET']),
+        Route('/predict/status/{job_id}', prediction_status, methods=['GET']),
+        Route('/metrics', metrics_endpoint, methods=['GET']),
+        # Everything else is served by the Flask app on its own thread pool
+        Mount('/', app=WSGIMiddleware(predict_sales.app, workers=Config.ASGI_WSGI_THREADS))
+    ],
+    lifespan=lifespan
+)
+
+
+if __name__ == '__main__':
+    import uvicorn
+
+    host, _, port = Config.SERVER_BIND.rpartition(':')
+    uvicorn.run(app, host=host, port=int(port))
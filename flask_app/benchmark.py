@@ -0,0 +1,744 @@
+# benchmark.py
+#
+# Benchmark suite for the sales forecasting pipeline.
+#
+# Generates synthetic laundry data into a local database (SQLite by default, or any
+# DATABASE_URI such as a scratch MySQL schema), times every stage of the pipeline and the
+# /predict round trip through the Flask test client, and writes the results as JSON.
+#
+# Examples:
+#     python benchmark.py --rows 100000 --years 4 --services 5 --output bench.json
+#     DATABASE_URI=mysql+pymysql://root:@localhost:3306/bench python benchmark.py --rows 1000000
+#     python benchmark.py --skip-generate --compare bench.json --max-slowdown 1.2
+#     python benchmark.py --skip-generate --serving --serving-workers 4
+#     python benchmark.py --skip-generate --serving --serving-concurrency 64
+
+import argparse
+import http.client
+import importlib.util
+import json
+import logging
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timezone
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+from sqlalchemy import Column, Date, Float, Integer, MetaData, Numeric, String, Table, create_engine, text
+from sqlalchemy.engine import make_url
+
+BASE_DIR = Path(__file__).resolve().parent
+DEFAULT_DATABASE_URI = f"sqlite:///{BASE_DIR / 'benchmark.db'}"
+
+SERVICE_NAMES = ['Wash', 'Dry', 'Fold', 'Wash-Dry-Fold', 'Press', 'Dry Clean', 'Comforter', 'Rush',
+                 'Pickup', 'Delivery', 'Shoes', 'Bags']
+DETERGENTS = ['Ariel', 'Tide', 'Breeze', 'Surf', 'Champion']
+FABRIC_DETERGENTS = ['Downy', 'Surf Fabcon', 'Del']
+
+# Largest relative difference tolerated between artifact and pickle forecasts
+ARTIFACT_TOLERANCE = 1e-6
+
+# Number of products in the timed stock-out simulation
+INVENTORY_SKUS = 300
+
+# The laundry and expense aggregates ADMIN/php/maindashboard.php queried on every render before
+# /dashboard/aggregates, for a year filter (MySQL's DATE_FORMAT written with YEAR/MONTH)
+DASHBOARD_QUERIES = [
+    "SELECT SUM(TOTAL) FROM laundry WHERE YEAR(DATE) = :year AND PAYMENT_STATUS = 'Paid'",
+    "SELECT SUM(TOTAL) FROM laundry WHERE YEAR(DATE) = :year AND PAYMENT_STATUS = 'Paid'",
+    "SELECT SUM(Amount) FROM inventory_expenses WHERE YEAR(ExpenseDate) = :year",
+    "SELECT MONTH(DATE) AS month, SUM(TOTAL) FROM laundry WHERE YEAR(DATE) = :year GROUP BY month",
+    "SELECT DETERGENT, COUNT(*) AS count FROM laundry WHERE YEAR(DATE) = :year "
+    "GROUP BY DETERGENT ORDER BY count DESC LIMIT 5",
+    "SELECT FABRIC_DETERGENT, COUNT(*) AS count FROM laundry WHERE YEAR(DATE) = :year "
+    "GROUP BY FABRIC_DETERGENT ORDER BY count DESC LIMIT 5",
+    "SELECT COUNT(*), COUNT(DISTINCT DATE) FROM laundry WHERE YEAR(DATE) = :year",
+    "SELECT SUM(TOTAL), COUNT(DISTINCT DATE) FROM laundry WHERE YEAR(DATE) = :year",
+    "SELECT SUM(ie.Amount) FROM inventory_expenses ie JOIN inventory i ON ie.InventoryID = i.InventoryID "
+    "WHERE i.userID = 1 AND YEAR(ie.ExpenseDate) = :year",
+    "SELECT MONTH(ie.ExpenseDate) AS month, SUM(ie.Amount) FROM inventory_expenses ie "
+    "JOIN inventory i ON ie.InventoryID = i.InventoryID WHERE i.userID = 1 AND YEAR(ie.ExpenseDate) = :year "
+    "GROUP BY month",
+    "SELECT YEAR(DATE) AS year, MONTH(DATE) AS month, SUM(TOTAL) FROM laundry WHERE YEAR(DATE) = :year "
+    "GROUP BY year, month",
+    "SELECT prediction_date, predicted_sales FROM sales_predictions WHERE YEAR(prediction_date) = :year",
+]
+
+# Registers the MySQL date functions used by the service on every SQLite connection of a process,
+# so the production queries run unchanged against the SQLite stand-in. Runs in the benchmark
+# itself and ahead of the server bootstraps; kept free of other imports so cold starts stay cold.
+SQLITE_FUNCTIONS = """
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+def _date_part(start, stop):
+    return lambda value: int(str(value)[start:stop]) if value else None
+
+@event.listens_for(Engine, 'connect')
+def _register_sqlite_functions(dbapi_connection, connection_record):
+    if hasattr(dbapi_connection, 'create_function'):   # Only SQLite connections have it
+        dbapi_connection.create_function('YEAR', 1, _date_part(0, 4), deterministic=True)
+        dbapi_connection.create_function('MONTH', 1, _date_part(5, 7), deterministic=True)
+        dbapi_connection.create_function('DAY', 1, _date_part(8, 10), deterministic=True)
+"""
+
+
+def install_sqlite_functions():
+    """
+    Register SQLITE_FUNCTIONS for the engines of this process.
+    """
+    exec(SQLITE_FUNCTIONS, {'__name__': 'sqlite_functions'})
+
+
+def is_sqlite(database_uri):
+    return make_url(database_uri).get_backend_name() == 'sqlite'
+
+# ================================
+# Synthetic Data
+# ================================
+
+def define_tables(metadata):
+    """
+    Define the subset of the dbcapstone schema used by the forecasting service.
+    """
+    tables = {}
+    tables['laundry'] = Table(
+        'laundry', metadata,
+        Column('OrderID', Integer, primary_key=True),
+        Column('NAME', String(100)),
+        Column('DATE', Date, index=True),
+        Column('SERVICE', String(50)),
+        Column('TOTAL', Float),
+        Column('PAYMENT_STATUS', String(20)),
+        Column('DETERGENT', String(50)),
+        Column('DETERGENT_ADDITIONAL', Integer),
+        Column('FABRIC_DETERGENT', String(50)),
+        Column('FABRIC_DETERGENT_ADDITIONAL', Integer),
+        Column('LAUNDRY_LOAD', Integer),
+        Column('COMFORTER_SINGLE', Integer),
+        Column('COMFORT_DOUBLE', Integer),
+        Column('BEDSHEETS_CURTAINS_TOWEL_BLANKETS', Integer))
+    tables['laundry_daily_sales'] = Table(
+        'laundry_daily_sales', metadata,
+        Column('SALE_DATE', Date, primary_key=True),
+        Column('TOTAL', Numeric(14, 2)),
+        Column('ORDER_COUNT', Integer),
+        Column('PAID_TOTAL', Numeric(14, 2)))
+    tables['sales_predictions'] = Table(
+        'sales_predictions', metadata,
+        Column('prediction_date', Date, primary_key=True),
+        Column('predicted_sales', Float))
+    tables['inventory'] = Table(
+        'inventory', metadata,
+        Column('InventoryID', Integer, primary_key=True),
+        Column('userID', Integer),
+        Column('ProductName', String(100)),
+        Column('CurrentStock', Integer))
+    tables['inventory_expenses'] = Table(
+        'inventory_expenses', metadata,
+        Column('ExpenseID', Integer, primary_key=True),
+        Column('InventoryID', Integer),
+        Column('Amount', Float),
+        Column('ExpenseDate', Date))
+    return tables
+
+
+def generate_laundry(rows, years, services, seed=42):
+    """
+    Generate synthetic laundry transactions with trend, yearly seasonality and per-service pricing.
+    """
+    rng = np.random.default_rng(seed)
+    end = pd.Timestamp.today().normalize().replace(day=1) - pd.Timedelta(days=1)
+    start = (end - pd.DateOffset(years=years)) + pd.Timedelta(days=1)
+    n_days = (end - start).days + 1
+
+    # More transactions in later days (growth) and in the rainy season months
+    day_index = np.arange(n_days)
+    dates = start + pd.to_timedelta(day_index, unit='D')
+    weights = (1 + 0.5 * day_index / n_days) * (1 + 0.3 * np.sin(2 * np.pi * (dates.month.to_numpy() - 6) / 12))
+    picked = rng.choice(n_days, size=rows, p=weights / weights.sum())
+
+    service_names = np.array(SERVICE_NAMES[:services])
+    service_idx = rng.integers(0, services, size=rows)
+    base_price = 80 + 40 * np.arange(services)
+
+    return pd.DataFrame({
+        'NAME': 'Customer',
+        'DATE': (start + pd.to_timedelta(np.sort(picked), unit='D')).date,
+        'SERVICE': service_names[service_idx],
+        'TOTAL': np.round(base_price[service_idx] * rng.uniform(1, 4, size=rows), 2),
+        'PAYMENT_STATUS': np.where(rng.random(rows) < 0.9, 'Paid', 'Unpaid'),
+        'DETERGENT': rng.choice(DETERGENTS, size=rows),
+        'DETERGENT_ADDITIONAL': rng.poisson(0.4, size=rows),
+        'FABRIC_DETERGENT': rng.choice(FABRIC_DETERGENTS, size=rows),
+        'FABRIC_DETERGENT_ADDITIONAL': rng.poisson(0.2, size=rows),
+        'LAUNDRY_LOAD': rng.integers(1, 4, size=rows),
+        'COMFORTER_SINGLE': rng.poisson(0.1, size=rows),
+        'COMFORT_DOUBLE': rng.poisson(0.05, size=rows),
+        'BEDSHEETS_CURTAINS_TOWEL_BLANKETS': rng.poisson(0.3, size=rows)
+    })
+
+
+def populate_database(engine, rows, years, services, rollup=True, chunk_rows=50000):
+    """
+    (Re)create the benchmark tables and fill them with synthetic data.
+    """
+    metadata = MetaData()
+    tables = define_tables(metadata)
+    if not rollup:
+        metadata.remove(tables['laundry_daily_sales'])
+    with engine.begin() as connection:
+        connection.execute(text("DROP TABLE IF EXISTS laundry_daily_sales"))
+    metadata.drop_all(engine)
+    metadata.create_all(engine)
+
+    df = generate_laundry(rows, years, services)
+    started = time.perf_counter()
+    for offset in range(0, len(df), chunk_rows):
+        chunk = df.iloc[offset:offset + chunk_rows]
+        with engine.begin() as connection:
+            connection.execute(tables['laundry'].insert(), chunk.to_dict('records'))
+
+    with engine.begin() as connection:
+        connection.execute(tables['inventory'].insert(), [
+            {'userID': 1, 'ProductName': name, 'CurrentStock': 500}
+            for name in DETERGENTS + FABRIC_DETERGENTS])
+
+    if rollup:
+        from sales_data import rebuild_rollup
+        rebuild_rollup(engine)
+
+    logging.warning(f"Generated {rows} laundry rows over {years} year(s) and {services} service(s) "
+                    f"in {time.perf_counter() - started:.1f}s.")
+
+# ================================
+# Timing
+# ================================
+
+def time_stage(results, name, fn, repeat):
+    """
+    Run fn repeat times and record wall-clock statistics (milliseconds) under name.
+    Returns the value of the last call.
+    """
+    timings = []
+    value = None
+    for _ in range(repeat):
+        started = time.perf_counter()
+        value = fn()
+        timings.append((time.perf_counter() - started) * 1000)
+    results[name] = {
+        'runs': repeat,
+        'median_ms': round(statistics.median(timings), 3),
+        'mean_ms': round(statistics.fmean(timings), 3),
+        'min_ms': round(min(timings), 3),
+        'max_ms': round(max(timings), 3)
+    }
+    print(f"{name:<34} median {results[name]['median_ms']:>10.2f} ms  (min {results[name]['min_ms']:.2f})",
+          flush=True)
+    return value
+
+
+def run_benchmarks(engine, args):
+    """
+    Time each stage of the pipeline against engine.
+    """
+    import predict_sales
+    import sales_data
+    import train_model
+    from dashboard_aggregates import DashboardAggregates
+    from forecast_jobs import sarimax_forecast
+    from inventory_forecast import simulate_stock_outs
+
+    logging.getLogger().setLevel(logging.WARNING)
+    predict_sales.warm_up(take_snapshot=False)
+    predict_sales.engine = engine
+    predict_sales.prediction_writer.engine = engine
+    predict_sales.change_detector.engine = engine
+    predict_sales.dashboard_aggregates.engine = engine
+    predict_sales.forecast_precomputer.engine = engine
+    train_model.engine = engine
+    sales_data._rollup_columns.clear()
+
+    stages = {}
+    repeat = args.repeat
+    year = args.filter_year
+
+    df = time_stage(stages, 'fetch_sales_data', lambda: predict_sales.fetch_sales_data(), repeat)
+    time_stage(stages, 'fetch_sales_data[year]', lambda: predict_sales.fetch_sales_data(year), repeat)
+    y, _, _ = time_stage(stages, 'prepare_data', lambda: predict_sales.prepare_data(df.copy()), repeat)
+    time_stage(stages, 'prepare_data[incremental]',
+               lambda: predict_sales.prepare_data(df, predict_sales.aggregate_features), repeat)
+    predict_sales.change_detector.start()
+    time_stage(stages, 'change_detector.poll', predict_sales.change_detector.poll, repeat)
+    time_stage(stages, 'fetch_sales_data[snapshot]', lambda: predict_sales.fetch_sales_data(), repeat)
+    time_stage(stages, 'sarimax_forecast',
+               lambda: sarimax_forecast(y, predict_sales.SARIMAX_ORDER, predict_sales.SARIMAX_SEASONAL_ORDER),
+               max(1, repeat // 2))
+
+    raw = time_stage(stages, 'train_model.fetch_sales_data', train_model.fetch_sales_data, repeat)
+    df_monthly = time_stage(stages, 'preprocess_data', lambda: train_model.preprocess_data(raw.copy()), repeat)
+
+    if args.search != 'skip':
+        # The search cache goes to a scratch file so the service's own cache is left untouched
+        with tempfile.TemporaryDirectory() as scratch:
+            search_cache_file = os.path.join(scratch, 'search_cache.json')
+            time_stage(stages, f'select_best_sarimax_model[{args.search}]',
+                       lambda: train_model.select_best_sarimax_model(
+                           df_monthly, train_model.EXOG_COLUMNS, n_jobs=args.workers,
+                           stepwise=args.search == 'stepwise', search_cache_file=search_cache_file,
+                           full_search=True),
+                       1)
+            time_stage(stages, 'select_best_sarimax_model[incremental]',
+                       lambda: train_model.select_best_sarimax_model(
+                           df_monthly, train_model.EXOG_COLUMNS, n_jobs=args.workers,
+                           search_cache_file=search_cache_file),
+                       1)
+
+    time_stage(stages, 'backtest_sarimax',
+               lambda: train_model.backtest_sarimax(df_monthly, train_model.EXOG_COLUMNS,
+                                                    train_model.BACKTEST_REFERENCE_ORDERS, n_jobs=args.workers),
+               1)
+
+    client = predict_sales.app.test_client()
+    url = f'/predict?api_key={predict_sales.API_KEY}'
+    predict_sales.PREDICT_BUDGET_SECONDS = predict_sales.PREDICT_MAX_BUDGET_SECONDS = 300
+
+    def predict(query='', cold=True):
+        if cold:
+            predict_sales.forecast_cache.clear()
+            predict_sales.last_good_forecasts.clear()
+        response = client.get(url + query)
+        if response.status_code != 200:
+            raise RuntimeError(f"/predict returned {response.status_code}: {response.get_json()}")
+        return response
+
+    serving_model = predict_sales.serving_model
+    if serving_model is not None:
+        time_stage(stages, 'predict[persisted,cold]', predict, repeat)
+        time_stage(stages, 'predict[persisted,cold,year]', lambda: predict(f'&year={year}'), repeat)
+    predict_sales.serving_model = None
+    try:
+        time_stage(stages, 'predict[refit,cold]', predict, max(1, repeat // 2))
+        time_stage(stages, 'predict[fallback,cold]', lambda: predict('&budget=0'), repeat)
+    finally:
+        predict_sales.serving_model = serving_model
+    time_stage(stages, 'predict[warm]', lambda: predict(cold=False), repeat)
+
+    def dashboard_queries():
+        with engine.connect() as connection:
+            for query in DASHBOARD_QUERIES:
+                connection.execute(text(query), {'year': year}).all()
+
+    def dashboard(query=''):
+        response = client.get(f'/dashboard/aggregates?api_key={predict_sales.API_KEY}&year={year}&user_id=1' + query)
+        if response.status_code != 200:
+            raise RuntimeError(f"/dashboard/aggregates returned {response.status_code}: {response.get_json()}")
+        return response
+
+    time_stage(stages, 'dashboard_queries[sql]', dashboard_queries, repeat)
+    time_stage(stages, 'dashboard_aggregates.build', lambda: DashboardAggregates(engine).refresh(), repeat)
+    predict_sales.dashboard_aggregates.refresh()
+    time_stage(stages, 'dashboard_aggregates.refresh',
+               lambda: predict_sales.dashboard_aggregates.refresh(force=True), repeat)
+    time_stage(stages, 'dashboard_aggregates[endpoint]', dashboard, repeat)
+
+    def forecast_inventory():
+        response = client.get(f'/forecast/inventory?api_key={predict_sales.API_KEY}')
+        if response.status_code != 200:
+            raise RuntimeError(f"/forecast/inventory returned {response.status_code}: {response.get_json()}")
+        return response
+
+    # The synthetic inventory has a handful of products; the simulation is also timed at SKU scale
+    rng = np.random.default_rng(0)
+    usage = rng.poisson(rng.uniform(0.5, 40, size=(INVENTORY_SKUS, 1)), size=(INVENTORY_SKUS, 84)).astype(np.float32)
+    remaining = (rng.integers(0, 200, size=INVENTORY_SKUS) * 15).astype(np.float32)
+    today = pd.Timestamp.today().date()
+    time_stage(stages, 'forecast_inventory[endpoint]', forecast_inventory, repeat)
+    time_stage(stages, f'simulate_stock_outs[{INVENTORY_SKUS} SKUs]',
+               lambda: simulate_stock_outs(usage, today - pd.Timedelta(days=84), remaining, today,
+                                           predict_sales.INVENTORY_HORIZON_DAYS, predict_sales.INVENTORY_PATHS, rng),
+               repeat)
+
+    predict_sales.forecast_jobs.shutdown()
+    predict_sales.prediction_writer.close()
+    predict_sales.change_detector.stop()
+
+    _, _, df_features = predict_sales.prepare_data(predict_sales.fetch_sales_data())
+    model_loading = measure_model_loading(max(1, repeat // 2), df_features)
+    return stages, model_loading
+
+# ================================
+# Model Loading
+# ================================
+
+# Run in a fresh interpreter so import time and memory are measured from a cold process
+LOAD_SCRIPT = """
+import json, sys, time
+started = time.perf_counter()
+if sys.argv[1] == 'pickle':
+    from model_server import ServingModel
+    model = ServingModel.load('sarimax_model.pkl')
+else:
+    from model_artifact import CompactServingModel
+    model = CompactServingModel.load('sarimax_serving')
+elapsed = time.perf_counter() - started
+# VmHWM is the peak RSS of this process image (ru_maxrss would include the parent's peak on Linux)
+with open('/proc/self/status') as f:
+    peak_kb = next(int(line.split()[1]) for line in f if line.startswith('VmHWM'))
+print(json.dumps({'load_ms': elapsed * 1000, 'max_rss_mb': peak_kb / 1024, 'loaded': model is not None}))
+"""
+
+
+def measure_model_loading(repeat, df_features=None):
+    """
+    Compare loading the full results pickle with loading the compact artifact: wall-clock time
+    (imports included) and peak RSS of a fresh process, plus the largest relative difference
+    between the forecasts of the two representations on df_features.
+    """
+    from model_artifact import CompactServingModel
+    from model_server import ServingModel
+
+    loading = {}
+    for kind in ('pickle', 'artifact'):
+        runs = []
+        for _ in range(repeat):
+            output = subprocess.run([sys.executable, '-c', LOAD_SCRIPT, kind], cwd=BASE_DIR, capture_output=True,
+                                    text=True, check=True).stdout
+            runs.append(json.loads(output.strip().splitlines()[-1]))
+        if not runs[-1]['loaded']:
+            print(f"load_model[{kind}]".ljust(34) + " skipped (not found)")
+            continue
+        loading[kind] = {
+            'runs': repeat,
+            'median_load_ms': round(statistics.median(run['load_ms'] for run in runs), 3),
+            'max_rss_mb': round(max(run['max_rss_mb'] for run in runs), 1)
+        }
+        print(f"{f'load_model[{kind}]':<34} median {loading[kind]['median_load_ms']:>10.2f} ms  "
+              f"(peak RSS {loading[kind]['max_rss_mb']:.1f} MB)", flush=True)
+
+    if df_features is not None and len(loading) == 2:
+        full = ServingModel.load('sarimax_model.pkl')
+        compact = CompactServingModel.load('sarimax_serving')
+        expected = np.concatenate(full.forecast_interval(df_features, steps=12))
+        actual = np.concatenate(compact.forecast_interval(df_features, steps=12))
+        difference = float(np.max(np.abs(actual - expected) / np.maximum(np.abs(expected), 1e-12)))
+        loading['max_forecast_rel_diff'] = difference
+        print(f"{'artifact vs pickle forecasts':<34} max relative difference {difference:.2e}", flush=True)
+    return loading
+
+# ================================
+# Serving Throughput
+# ================================
+
+SERVING_PORT = 5099
+SERVING_START_TIMEOUT = 180     # Seconds a server may take to answer its first request
+
+
+# Server bootstraps: 'waitress' starts like flask_service.py (warm-up in the background while
+# serving), 'waitress-eager' warms up before it starts serving, as the service used to, and
+# 'uvicorn' serves the ASGI mode of asgi_app.py
+SERVER_COMMANDS = {
+    'waitress': "import predict_sales, waitress; predict_sales.start_warm_up(); "
+                "waitress.serve(predict_sales.app, host='127.0.0.1', port={port})",
+    'waitress-eager': "import predict_sales, waitress; predict_sales.warm_up(); "
+                      "waitress.serve(predict_sales.app, host='127.0.0.1', port={port})",
+    'uvicorn': "import asgi_app, uvicorn; "
+               "uvicorn.run(asgi_app.app, host='127.0.0.1', port={port}, log_level='warning')"
+}
+
+
+def start_server(kind, database_uri, workers=1):
+    """
+    Start the service on SERVING_PORT, either single-process under waitress or uvicorn or under
+    gunicorn with gunicorn.conf.py, and wait until '/' answers.
+    """
+    env = {**os.environ, 'DATABASE_URI': database_uri, 'SERVER_BIND': f'127.0.0.1:{SERVING_PORT}',
+           'SERVER_WORKERS': str(workers)}
+    if kind == 'gunicorn':
+        bootstrap = "import sys; from gunicorn.app.wsgiapp import run; sys.argv = ['gunicorn']; run()"
+    else:
+        bootstrap = SERVER_COMMANDS[kind].format(port=SERVING_PORT)
+    if is_sqlite(database_uri):
+        bootstrap = SQLITE_FUNCTIONS + bootstrap
+    command = [sys.executable, '-c', bootstrap]
+    process = subprocess.Popen(command, cwd=BASE_DIR, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+
+    deadline = time.monotonic() + SERVING_START_TIMEOUT
+    while time.monotonic() < deadline:
+        if process.poll() is not None:
+            raise RuntimeError(f"{kind} exited with status {process.returncode} during startup.")
+        try:
+            connection = http.client.HTTPConnection('127.0.0.1', SERVING_PORT, timeout=5)
+            connection.request('GET', '/')
+            if connection.getresponse().status == 200:
+                return process
+        except OSError:
+            time.sleep(0.01)
+    process.kill()
+    raise RuntimeError(f"{kind} did not answer within {SERVING_START_TIMEOUT} seconds.")
+
+
+def measure_cold_start(database_uri, repeat):
+    """
+    Time a cold start of the service: from launching the process until '/' answers and until the
+    first /predict succeeds (which waits for the warm-up), with and without the background warm-up.
+    """
+    from config import Config
+
+    cold_start = {}
+    for kind in ('waitress-eager', 'waitress'):
+        runs = []
+        for _ in range(repeat):
+            started = time.perf_counter()
+            process = start_server(kind, database_uri)
+            try:
+                live = time.perf_counter() - started
+                connection = http.client.HTTPConnection('127.0.0.1', SERVING_PORT, timeout=SERVING_START_TIMEOUT)
+                connection.request('GET', f'/predict?api_key={Config.API_KEY}')
+                response = connection.getresponse()
+                response.read()
+                if response.status != 200:
+                    raise RuntimeError(f"/predict returned {response.status} during the cold start.")
+                runs.append((live, time.perf_counter() - started))
+            finally:
+                process.terminate()
+                process.wait(timeout=60)
+        cold_start[kind] = {
+            'runs': repeat,
+            'median_live_ms': round(statistics.median(run[0] for run in runs) * 1000, 1),
+            'median_first_predict_ms': round(statistics.median(run[1] for run in runs) * 1000, 1)
+        }
+        print(f"{f'cold_start[{kind}]':<34} '/' after {cold_start[kind]['median_live_ms']:>8.1f} ms, "
+              f"first /predict after {cold_start[kind]['median_first_predict_ms']:.1f} ms", flush=True)
+    return cold_start
+
+
+def process_tree_pss_mb(pid):
+    """
+    Proportional set size of a process and its children in MB: pages shared copy-on-write
+    between the processes are counted once in total rather than once per process.
+    """
+    pids, total_kb = [pid], 0
+    while pids:
+        current = pids.pop()
+        try:
+            with open(f'/proc/{current}/smaps_rollup') as f:
+                total_kb += next(int(line.split()[1]) for line in f if line.startswith('Pss:'))
+            with open(f'/proc/{current}/task/{current}/children') as f:
+                pids.extend(int(child) for child in f.read().split())
+        except (OSError, StopIteration):
+            continue
+    return total_kb / 1024
+
+
+def drive_load(requests, concurrency, seconds):
+    """
+    Send requests (a list of (method, path, body)) round-robin from concurrency keep-alive
+    clients for the given number of seconds.
+    """
+    deadline = time.monotonic() + seconds
+
+    def send(connection, method, path, body):
+        connection.request(method, path, body=body, headers={'Content-Type': 'application/json'})
+        response = connection.getresponse()
+        response.read()
+        return response.status == 200
+
+    def client(offset):
+        connection = http.client.HTTPConnection('127.0.0.1', SERVING_PORT, timeout=SERVING_START_TIMEOUT)
+        latencies, errors, reconnects, index = [], 0, 0, offset
+        while time.monotonic() < deadline:
+            method, path, body = requests[index % len(requests)]
+            index += 1
+            started = time.perf_counter()
+            try:
+                try:
+                    ok = send(connection, method, path, body)
+                except (ConnectionError, http.client.RemoteDisconnected):
+                    # A recycled worker closes its idle keep-alive connections; reconnect once
+                    reconnects += 1
+                    connection.close()
+                    ok = send(connection, method, path, body)
+            except (OSError, http.client.HTTPException):
+                connection.close()
+                ok = False
+            if ok:
+                latencies.append(time.perf_counter() - started)
+            else:
+                errors += 1
+        return latencies, errors, reconnects
+
+    started = time.monotonic()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        outcomes = list(pool.map(client, range(concurrency)))
+    elapsed = time.monotonic() - started
+    latencies = sorted(latency for outcome in outcomes for latency in outcome[0])
+    return {
+        'requests': len(latencies),
+        'errors': sum(outcome[1] for outcome in outcomes),
+        'reconnects': sum(outcome[2] for outcome in outcomes),
+        'requests_per_second': round(len(latencies) / elapsed, 2),
+        'median_ms': round(statistics.median(latencies) * 1000, 2) if latencies else None,
+        'p95_ms': round(latencies[int(0.95 * (len(latencies) - 1))] * 1000, 2) if latencies else None
+    }
+
+
+def measure_serving(args):
+    """
+    Compare the throughput of the single-process waitress setup with gunicorn's forked workers
+    and the ASGI mode under uvicorn (if installed), on cached /predict requests and on CPU-bound
+    /predict/batch requests.
+    """
+    from config import Config
+
+    api_key = Config.API_KEY
+    # Month-of-year and year filters, which have data however far back the synthetic history goes
+    filters = [{'month': month} for month in range(1, 13)] + [{'year': args.filter_year}]
+    workloads = {
+        'predict[cached]': [('GET', f'/predict?api_key={api_key}&' + '&'.join(f'{k}={v}' for k, v in item.items()), None)
+                            for item in filters],
+        'predict_batch[cpu]': [('POST', f'/predict/batch?api_key={api_key}',
+                                json.dumps({'filters': [item, {}], 'horizon': 12})) for item in filters]
+    }
+    setups = [('waitress', 1), ('gunicorn', args.serving_workers)]
+    if importlib.util.find_spec('uvicorn') is not None:
+        setups.append(('uvicorn', 1))
+
+    serving = {}
+    for kind, workers in setups:
+        name = f'{kind}[{workers} process]' if workers == 1 else f'{kind}[{workers} workers]'
+        process = start_server(kind, args.database_uri, workers)
+        try:
+            serving[name] = {'memory_pss_mb': None}
+            for workload, requests in workloads.items():
+                # One pass to warm every worker's caches, then the timed run
+                drive_load(requests, args.serving_concurrency, 2)
+                result = drive_load(requests, args.serving_concurrency, args.serving_seconds)
+                serving[name][workload] = result
+                print(f"{f'{name} {workload}':<34} {result['requests_per_second']:>8.1f} req/s  "
+                      f"(median {result['median_ms']} ms, p95 {result['p95_ms']} ms, {result['errors']} errors)",
+                      flush=True)
+            serving[name]['memory_pss_mb'] = round(process_tree_pss_mb(process.pid), 1)
+            print(f"{f'{name} memory':<34} {serving[name]['memory_pss_mb']:>8.1f} MB PSS", flush=True)
+        finally:
+            process.terminate()
+            process.wait(timeout=60)
+    return serving
+
+# ================================
+# Reporting
+# ================================
+
+def git_revision():
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], cwd=BASE_DIR, capture_output=True,
+                              text=True, check=True).stdout.strip()
+    except Exception:
+        return None
+
+
+def compare_results(current, baseline, max_slowdown):
+    """
+    Compare median timings against a baseline result file. Returns the list of regressed stages.
+    """
+    regressions = []
+    for name, stats in current['stages'].items():
+        previous = baseline.get('stages', {}).get(name)
+        if not previous or previous['median_ms'] <= 0:
+            continue
+        ratio = stats['median_ms'] / previous['median_ms']
+        flag = 'REGRESSION' if ratio > max_slowdown else ''
+        print(f"{name:<34} {previous['median_ms']:>10.2f} -> {stats['median_ms']:>10.2f} ms  x{ratio:.2f} {flag}")
+        if ratio > max_slowdown:
+            regressions.append(name)
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the sales forecasting pipeline on synthetic data.")
+    parser.add_argument('--database-uri', default=os.environ.get('DATABASE_URI', DEFAULT_DATABASE_URI),
+                        help="Database to generate data into and benchmark against (default: local SQLite file).")
+    parser.add_argument('--rows', type=int, default=100000, help="Number of synthetic laundry rows (10k to 10M).")
+    parser.add_argument('--years', type=int, default=4, help="Years of history to generate.")
+    parser.add_argument('--services', type=int, default=4, help=f"Number of service types (max {len(SERVICE_NAMES)}).")
+    parser.add_argument('--no-rollup', action='store_true', help="Do not create the daily rollup table.")
+    parser.add_argument('--skip-generate', action='store_true', help="Reuse the data already in the database.")
+    parser.add_argument('--repeat', type=int, default=5, help="Timed runs per stage.")
+    parser.add_argument('--search', choices=['stepwise', 'exhaustive', 'skip'], default='stepwise',
+                        help="How to benchmark select_best_sarimax_model.")
+    parser.add_argument('--workers', type=int, default=os.cpu_count() or 1, help="Workers for the order search.")
+    parser.add_argument('--filter-year', type=int, default=pd.Timestamp.today().year - 1,
+                        help="Year used for the filtered fetch and /predict stages.")
+    parser.add_argument('--serving', action='store_true',
+                        help="Also compare waitress with gunicorn worker processes over HTTP.")
+    parser.add_argument('--serving-workers', type=int, default=max(2, os.cpu_count() or 1),
+                        help="Gunicorn worker processes for the serving comparison.")
+    parser.add_argument('--serving-concurrency', type=int, default=8, help="Concurrent HTTP clients.")
+    parser.add_argument('--serving-seconds', type=float, default=15, help="Seconds of load per workload.")
+    parser.add_argument('--output', help="Write machine-readable results to this JSON file.")
+    parser.add_argument('--compare', help="Baseline JSON file to compare median timings against.")
+    parser.add_argument('--max-slowdown', type=float, default=1.25,
+                        help="Exit non-zero if a stage's median exceeds the baseline by this factor.")
+    args = parser.parse_args()
+
+    # The service reads its model files relative to the working directory
+    os.chdir(BASE_DIR)
+    sys.path.insert(0, str(BASE_DIR))
+
+    if is_sqlite(args.database_uri):
+        install_sqlite_functions()
+    engine = create_engine(args.database_uri)
+
+    if not args.skip_generate:
+        populate_database(engine, args.rows, args.years, min(args.services, len(SERVICE_NAMES)),
+                          rollup=not args.no_rollup)
+
+    stages, model_loading = run_benchmarks(engine, args)
+    cold_start = measure_cold_start(args.database_uri, max(1, args.repeat // 2))
+    serving = measure_serving(args) if args.serving else None
+
+    results = {
+        'timestamp': datetime.now(timezone.utc).isoformat(),
+        'git_revision': git_revision(),
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'cpu_count': os.cpu_count(),
+        'database': engine.dialect.name,
+        'parameters': {
+            'rows': args.rows, 'years': args.years, 'services': args.services,
+            'rollup': not args.no_rollup, 'repeat': args.repeat, 'search': args.search,
+            'workers': args.workers, 'generated': not args.skip_generate
+        },
+        'stages': stages,
+        'model_loading': model_loading,
+        'cold_start': cold_start,
+        'serving': serving
+    }
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(results, f, indent=2)
+        print(f"Results written to '{args.output}'.")
+
+    if model_loading.get('max_forecast_rel_diff', 0) > ARTIFACT_TOLERANCE:
+        print(f"Artifact forecasts differ from the pickle by more than {ARTIFACT_TOLERANCE:g}.")
+        sys.exit(1)
+
+    if args.compare:
+        with open(args.compare, 'r') as f:
+            baseline = json.load(f)
+        regressions = compare_results(results, baseline, args.max_slowdown)
+        if regressions:
+            print(f"{len(regressions)} stage(s) regressed beyond x{args.max_slowdown}: {', '.join(regressions)}")
+            sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,200 @@
+# change_detector.py
+
+import hashlib
+import logging
+import threading
+import time
+
+import pandas as pd
+
+from instrumentation import stage
+from sales_data import fetch_month_watermarks
+
+
+def month_matches(sales_month, year=None, month=None):
+    """
+    Return True if the (year, month) sales_month falls inside the year/month filters.
+    """
+    return (year is None or sales_month[0] == year) and (month is None or sales_month[1] == month)
+
+
+class ChangeDetector:
+    """
+    Detects changes to the laundry data by polling a watermark per month (order count and total)
+    on a background thread. Rows inserted by the PHP side only change the watermarks of their own
+    months, so listeners are told exactly which months changed and can invalidate or update only
+    what depends on them.
+
+    The watermarks are also the monthly sales totals, so series that are not filtered by day can
+    be served from the snapshot without querying the database.
+    """
+
+    def __init__(self, engine, interval_seconds=30):
+        """
+        Initializes the ChangeDetector.
+
+        Parameters:
+            engine (Engine): SQLAlchemy engine of the laundry database.
+            interval_seconds (float): Seconds between polls. With 0 there is no background thread
+                                      and every snapshot read polls the database first.
+        """
+        self.engine = engine
+        self.interval_seconds = interval_seconds
+        self._months = None
+        self._polled_at = None
+        self._listeners = []
+        self._lock = threading.Lock()
+        self._poll_lock = threading.Lock()
+        self._stopped = threading.Event()
+        self._thread = None
+        self._polls = 0
+        self._failures = 0
+        self._changed_months = 0
+
+    def subscribe(self, listener):
+        """
+        Register listener(changed_months) to be called with the set of (year, month) keys whose
+        watermark changed. Listeners run on the thread that polled.
+        """
+        self._listeners.append(listener)
+
+    @property
+    def ready(self):
+        return self._months is not None
+
+    def start(self):
+        """
+        Take the first snapshot and start the polling thread. Safe to call on every request;
+        only the first call does any work, and it raises if the first snapshot cannot be taken.
+        """
+        if self._thread is not None or self._stopped.is_set():
+            return
+        with self._poll_lock:
+            if self._months is None:
+                self._poll()
+        with self._lock:
+            if self._thread is None and self.interval_seconds > 0:
+                self._thread = threading.Thread(target=self._run, name='change-detector', daemon=True)
+                self._thread.start()
+
+    def stop(self):
+        """
+        Stop the polling thread.
+        """
+        self._stopped.set()
+        if self._thread is not None:
+            self._thread.join(timeout=5)
+
+    def after_fork(self):
+        """
+        Reset the detector in a forked child, which has no polling thread; the next start() takes
+        a fresh snapshot.
+        """
+        self._lock = threading.Lock()
+        self._poll_lock = threading.Lock()
+        self._stopped = threading.Event()
+        self._thread = None
+        self._months = None
+        self._polled_at = None
+
+    def _run(self):
+        while not self._stopped.wait(self.interval_seconds):
+            try:
+                self.poll()
+            except Exception:
+                logging.exception("Polling the laundry watermarks failed; keeping the previous snapshot.")
+
+    def poll(self):
+        """
+        Fetch the watermarks, notify the listeners of changed months and return them.
+        """
+        with self._poll_lock:
+            changed = self._poll()
+        # Listeners run after the lock is released: with interval_seconds 0 they poll again when
+        # they read the snapshot
+        if changed:
+            logging.info(f"Laundry data changed in {len(changed)} month(s): "
+                         + ', '.join(f"{year}-{month:02d}" for year, month in sorted(changed)))
+            for listener in self._listeners:
+                try:
+                    listener(changed)
+                except Exception:
+                    logging.exception("A data change listener failed.")
+        return changed
+
+    def _poll(self):
+        try:
+            with stage('watermark'):
+                months = fetch_month_watermarks(self.engine)
+        except Exception:
+            with self._lock:
+                self._failures += 1
+            raise
+
+        with self._lock:
+            previous = self._months
+            self._months, self._polled_at = months, time.monotonic()
+            self._polls += 1
+            if previous is None:
+                return set()
+            changed = {key for key in months.keys() | previous.keys() if months.get(key) != previous.get(key)}
+            self._changed_months += len(changed)
+        return changed
+
+    def _snapshot(self):
+        if self.interval_seconds <= 0:
+            self.poll()
+        else:
+            self.start()
+        return self._months
+
+    def watermark(self, year=None, month=None, day=None):
+        """
+        Return a watermark of the data behind the year/month/day filters, built from the
+        watermarks of the months they cover. A day filter is covered by its whole month.
+        """
+        months = self._snapshot()
+        covered = tuple(sorted((key, value) for key, value in months.items() if month_matches(key, year, month)))
+        return (len(covered), hash(covered))
+
+    def digest(self, year=None, month=None, day=None):
+        """
+        Return a hex digest of the watermarks of the months behind the filters (the months
+        watermark() covers). Unlike watermark() it is the same in every process and across
+        restarts, so it can be stored next to results computed from those months.
+        """
+        return self.digests([(year, month, day)])[0]
+
+    def digests(self, filter_keys):
+        """
+        Return digest() of every (year, month, day) in filter_keys, all from one snapshot.
+        """
+        months = self._snapshot()
+        rounded = sorted((key, (row_count, round(float(total), 2))) for key, (row_count, total) in months.items())
+        return [hashlib.sha1(repr([item for item in rounded if month_matches(item[0], year, month)]).encode()).hexdigest()
+                for year, month, day in filter_keys]
+
+    def monthly_sales(self, year=None, month=None):
+        """
+        Return the monthly sales of the months inside the year/month filters, in the format of
+        sales_data.fetch_monthly_sales, from the snapshot.
+        """
+        months = self._snapshot()
+        keys = sorted(key for key, (row_count, _) in months.items() if row_count and month_matches(key, year, month))
+        if not keys:
+            return pd.DataFrame(columns=['DATE', 'TOTAL'])
+        dates = pd.to_datetime([f"{key[0]}-{key[1]:02d}-01" for key in keys]) + pd.offsets.MonthEnd(0)
+        return pd.DataFrame({'DATE': dates, 'TOTAL': [float(months[key][1]) for key in keys]})
+
+    def stats(self):
+        """
+        Return the number of polls, failed polls and changed months, and the snapshot age in seconds.
+        """
+        with self._lock:
+            age = time.monotonic() - self._polled_at if self._polled_at is not None else None
+            return {
+                'polls': self._polls,
+                'failures': self._failures,
+                'changed_months': self._changed_months,
+                'snapshot_age_seconds': age
+            }
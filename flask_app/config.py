@@ -10,14 +10,58 @@ class Config:
     DB_USER = os.environ.get('DB_USER', 'root')
     DB_PASSWORD = os.environ.get('DB_PASSWORD', '')
     DB_NAME = os.environ.get('DB_NAME', 'dbcapstone')
-    DATABASE_URI = f'mysql+pymysql://{DB_USER}:{DB_PASSWORD}@{DB_HOST}:{DB_PORT}/{DB_NAME}'
+    DATABASE_URI = os.environ.get('DATABASE_URI',
+                                  f'mysql+pymysql://{DB_USER}:{DB_PASSWORD}@{DB_HOST}:{DB_PORT}/{DB_NAME}')
+
+    # Connection pool configuration
+    DB_POOL_SIZE = int(os.environ.get('DB_POOL_SIZE', 5))             # Connections kept open in the pool
+    DB_MAX_OVERFLOW = int(os.environ.get('DB_MAX_OVERFLOW', 10))      # Extra connections allowed under load
+    DB_POOL_PRE_PING = os.environ.get('DB_POOL_PRE_PING', '1') == '1'  # Test connections before use
+    DB_POOL_RECYCLE = int(os.environ.get('DB_POOL_RECYCLE', 1800))    # Seconds before a connection is replaced
+
+    # Write-behind buffer for sales_predictions
+    PREDICTION_FLUSH_ROWS = int(os.environ.get('PREDICTION_FLUSH_ROWS', 50))          # Flush when this many rows are buffered
+    PREDICTION_FLUSH_SECONDS = float(os.environ.get('PREDICTION_FLUSH_SECONDS', 5))  # Flush buffered rows at least this often
+
+    # Change detection on the laundry table
+    CHANGE_POLL_SECONDS = float(os.environ.get('CHANGE_POLL_SECONDS', 30))  # Seconds between watermark polls (0 polls per request)
+
+    # In-memory dashboard aggregates (/dashboard/aggregates)
+    DASHBOARD_REFRESH_SECONDS = float(os.environ.get('DASHBOARD_REFRESH_SECONDS', 5))  # Seconds between refreshes (0 refreshes per request)
+    DASHBOARD_RECHECK_SECONDS = float(os.environ.get('DASHBOARD_RECHECK_SECONDS', 300))  # Seconds between rechecks of existing orders without the rollup table
+
+    # Precomputed dashboard forecasts (forecast_precompute.py)
+    PRECOMPUTE_HOURS = tuple(int(hour) for hour in os.environ.get('PRECOMPUTE_HOURS', '2').split(',') if hour.strip())  # Local off-peak hours of the runs (empty disables the scheduler)
+    PRECOMPUTE_CHECK_SECONDS = float(os.environ.get('PRECOMPUTE_CHECK_SECONDS', 60))  # Seconds between checks of the clock and the model
+
+    # Multi-process serving on Linux (gunicorn.conf.py)
+    SERVER_BIND = os.environ.get('SERVER_BIND', '0.0.0.0:5000')
+    SERVER_WORKERS = int(os.environ.get('SERVER_WORKERS', os.cpu_count() or 1))      # Forked worker processes
+    SERVER_THREADS = int(os.environ.get('SERVER_THREADS', 4))                         # Request threads per worker
+    SERVER_MAX_REQUESTS = int(os.environ.get('SERVER_MAX_REQUESTS', 1000))            # Requests before a worker is recycled
+    SERVER_MAX_REQUESTS_JITTER = int(os.environ.get('SERVER_MAX_REQUESTS_JITTER', 100))  # Spreads out recycling
+    SERVER_TIMEOUT = int(os.environ.get('SERVER_TIMEOUT', 90))                        # Seconds before a stuck worker is killed
+    SERVER_GRACEFUL_TIMEOUT = int(os.environ.get('SERVER_GRACEFUL_TIMEOUT', 30))      # Seconds a recycled worker may finish requests
+
+    # ASGI serving mode (asgi_app.py under uvicorn)
+    ASYNC_DATABASE_URI = os.environ.get('ASYNC_DATABASE_URI')                        # Defaults to DATABASE_URI with an asyncio driver
+    ASGI_EXECUTOR_THREADS = int(os.environ.get('ASGI_EXECUTOR_THREADS', 4))          # Threads running forecasts off the event loop
+    ASGI_WSGI_THREADS = int(os.environ.get('ASGI_WSGI_THREADS', 8))                  # Threads serving the endpoints delegated to Flask
     
     # API Key for authentication
     API_KEY = os.environ.get('API_KEY', 'testkey123')
     
     # Logging configuration
     BASE_DIR = Path(__file__).resolve().parent
-    LOG_FILE = str(BASE_DIR / "api.log")  # Ensure it's a string path
+    LOG_FILE = os.environ.get('LOG_FILE', str(BASE_DIR / "api.log"))  # Ensure it's a string path
+
+    # On-demand cProfile captures of predictions and training runs (profiling.py)
+    PROFILE_DIR = os.environ.get('PROFILE_DIR', str(BASE_DIR / 'profiles'))    # Shared by API workers and train_model
+    PROFILE_MAX_FILES = int(os.environ.get('PROFILE_MAX_FILES', 50))           # Newest profiles kept; older ones are deleted
+    PROFILE_SAMPLE_RATE = float(os.environ.get('PROFILE_SAMPLE_RATE', 0))      # Fraction of prediction requests profiled unasked
+
+    # Status of background forecast jobs and refit parameters, shared by the server's worker processes
+    JOB_STATUS_DIR = os.environ.get('JOB_STATUS_DIR', str(BASE_DIR / 'jobs'))  # Every worker must see the same directory
     
     # Other configurations
     DEBUG = False
@@ -0,0 +1,362 @@
+# dashboard_aggregates.py
+
+import logging
+import math
+import threading
+import time
+from collections import Counter
+from datetime import date
+
+from sqlalchemy import text
+
+from change_detector import month_matches
+from instrumentation import stage
+from sales_data import date_filter, fetch_month_watermarks, has_rollup
+
+TOP_DETERGENTS = 5      # Detergents listed per chart, as in the dashboard's LIMIT 5
+
+# One row per day, detergent and fabric detergent; the sums come back from the same query for
+# the first build, new orders and rescanned months
+ORDERS_QUERY = ("SELECT YEAR(DATE) AS sales_year, MONTH(DATE) AS sales_month, DAY(DATE) AS sales_day, "
+                "DETERGENT AS detergent, FABRIC_DETERGENT AS fabric_detergent, COUNT(*) AS orders, "
+                "SUM(COALESCE(TOTAL, 0)) AS sales, "
+                "SUM(CASE WHEN PAYMENT_STATUS = 'Paid' THEN COALESCE(TOTAL, 0) ELSE 0 END) AS paid_sales "
+                "FROM laundry WHERE DATE IS NOT NULL AND OrderID > :after_id AND OrderID <= :last_id")
+ORDERS_GROUP_BY = " GROUP BY sales_year, sales_month, sales_day, detergent, fabric_detergent"
+
+EXPENSES_QUERY = ("SELECT YEAR(ie.ExpenseDate) AS expense_year, MONTH(ie.ExpenseDate) AS expense_month, "
+                  "DAY(ie.ExpenseDate) AS expense_day, i.userID AS user_id, SUM(ie.Amount) AS amount "
+                  "FROM inventory_expenses ie LEFT JOIN inventory i ON ie.InventoryID = i.InventoryID "
+                  "WHERE ie.ExpenseDate IS NOT NULL AND ie.ExpenseID > :after_id AND ie.ExpenseID <= :last_id "
+                  "GROUP BY expense_year, expense_month, expense_day, user_id")
+
+PREDICTIONS_QUERY = ("SELECT YEAR(prediction_date) AS prediction_year, MONTH(prediction_date) AS prediction_month, "
+                     "predicted_sales FROM sales_predictions ORDER BY prediction_date")
+
+
+class DaySales:
+    """
+    Aggregates of the laundry orders of one day.
+    """
+    __slots__ = ('orders', 'sales', 'paid_sales', 'detergents', 'fabric_detergents')
+
+    def __init__(self):
+        self.orders = 0
+        self.sales = 0.0
+        self.paid_sales = 0.0
+        self.detergents = Counter()
+        self.fabric_detergents = Counter()
+
+    def add(self, row):
+        self.orders += int(row.orders)
+        self.sales += float(row.sales or 0)
+        self.paid_sales += float(row.paid_sales or 0)
+        self.detergents[row.detergent] += int(row.orders)
+        self.fabric_detergents[row.fabric_detergent] += int(row.orders)
+
+
+class DashboardAggregates:
+    """
+    In-memory rollups of the laundry orders and inventory expenses per (year, month, day), which
+    answer every aggregate of the admin dashboard without scanning the tables.
+
+    The rollups are built by one grouped scan and then maintained incrementally: rows with a
+    primary key above the last one folded in are added as deltas, and a month whose watermark in
+    the daily rollup table (order count, total and paid total) no longer matches its in-memory
+    aggregates is rescanned on its own. That catches orders that were deleted, re-priced or paid
+    after they were folded in. Without the rollup table the watermarks come from a scan of
+    laundry, so that recheck only runs every recheck_seconds. Expenses are only ever inserted by
+    the admin pages, so they are folded in by primary key alone. The few rows of
+    sales_predictions are re-read on every refresh.
+    """
+
+    def __init__(self, engine, refresh_seconds=5, recheck_seconds=300):
+        """
+        Initializes the DashboardAggregates.
+
+        Parameters:
+            engine (Engine): SQLAlchemy engine of the laundry database.
+            refresh_seconds (float): Seconds a refresh stays current; with 0 every read refreshes.
+            recheck_seconds (float): Seconds between rechecks of existing orders when the
+                                     watermarks have to be read from laundry itself.
+        """
+        self.engine = engine
+        self.refresh_seconds = refresh_seconds
+        self.recheck_seconds = recheck_seconds
+        self._months = None         # (year, month) -> {day: DaySales}
+        self._expenses = {}         # (year, month) -> {(day, user_id): amount}
+        self._predictions = {}      # (year, month) -> predicted sales
+        self._last_order_id = 0
+        self._last_expense_id = 0
+        self._refreshed_at = None
+        self._rechecked_at = None
+        self._lock = threading.Lock()           # Guards the rollups
+        self._refresh_lock = threading.Lock()   # Held while a refresh queries the database
+        self._refreshes = 0
+        self._folded_orders = 0
+        self._rescanned_months = 0
+
+    def after_fork(self):
+        """
+        Reset the locks in a forked child; the rollups themselves stay valid.
+        """
+        self._lock = threading.Lock()
+        self._refresh_lock = threading.Lock()
+
+    def _max_id(self, connection, table, column):
+        return int(connection.execute(text(f"SELECT MAX({column}) FROM {table}")).scalar() or 0)
+
+    def _fetch_orders(self, connection, after_id, last_id, year=None, month=None):
+        """
+        Fetch the grouped orders with after_id < OrderID <= last_id, optionally of one month,
+        as {(year, month): {day: DaySales}}.
+        """
+        conditions, params = date_filter(year, month)
+        query = ORDERS_QUERY + ''.join(f" AND {condition}" for condition in conditions) + ORDERS_GROUP_BY
+        months = {}
+        for row in connection.execute(text(query), {'after_id': after_id, 'last_id': last_id, **params}):
+            days = months.setdefault((int(row.sales_year), int(row.sales_month)), {})
+            days.setdefault(int(row.sales_day), DaySales()).add(row)
+        return months
+
+    def _fetch_expenses(self, connection, after_id, last_id):
+        rows = connection.execute(text(EXPENSES_QUERY), {'after_id': after_id, 'last_id': last_id}).all()
+        return [((int(row.expense_year), int(row.expense_month)), (int(row.expense_day), row.user_id),
+                 float(row.amount or 0)) for row in rows]
+
+    def _fetch_predictions(self, connection):
+        predictions = {}
+        for row in connection.execute(text(PREDICTIONS_QUERY)):
+            if row.prediction_year is not None and row.predicted_sales is not None:
+                predictions.setdefault((int(row.prediction_year), int(row.prediction_month)),
+                                       float(row.predicted_sales))
+        return predictions
+
+    def _month_changed(self, days, watermark):
+        """
+        Return True if the aggregates of a month's days disagree with its (order count, total,
+        paid total) watermark. Totals are compared with a tolerance, because the rollup stores
+        rounded DECIMAL sums of what may be FLOAT columns.
+        """
+        orders, total, paid_total = watermark
+        return (sum(day.orders for day in days.values()) != orders
+                or not math.isclose(sum(day.sales for day in days.values()), total, rel_tol=1e-6, abs_tol=0.01)
+                or not math.isclose(sum(day.paid_sales for day in days.values()), paid_total,
+                                    rel_tol=1e-6, abs_tol=0.01))
+
+    def _recheck_due(self):
+        if has_rollup(self.engine, 'PAID_TOTAL'):
+            return True
+        return self._rechecked_at is None or time.monotonic() - self._rechecked_at >= self.recheck_seconds
+
+    def _fresh(self):
+        return self._refreshed_at is not None and time.monotonic() - self._refreshed_at < self.refresh_seconds
+
+    def refresh(self, force=False):
+        """
+        Fold in new orders and expenses and rescan the months that changed otherwise. Does nothing
+        if the last refresh is younger than refresh_seconds (unless force), or if another thread is
+        already refreshing rollups that have been built.
+        """
+        if not force and self._fresh():
+            return
+        if not self._refresh_lock.acquire(blocking=self._months is None):
+            return
+        try:
+            # Threads that waited for the first build find the rollups fresh
+            if not force and self._fresh():
+                return
+            with stage('dashboard_refresh'):
+                if self._months is None:
+                    self._build()
+                else:
+                    self._update()
+            self._refreshed_at = time.monotonic()
+            self._refreshes += 1
+        finally:
+            self._refresh_lock.release()
+
+    def _build(self):
+        started = time.perf_counter()
+        rechecked_at = time.monotonic()
+        with self.engine.connect() as connection:
+            last_order_id = self._max_id(connection, 'laundry', 'OrderID')
+            last_expense_id = self._max_id(connection, 'inventory_expenses', 'ExpenseID')
+            months = self._fetch_orders(connection, 0, last_order_id)
+            expenses = self._fetch_expenses(connection, 0, last_expense_id)
+            predictions = self._fetch_predictions(connection)
+        with self._lock:
+            self._months, self._expenses, self._predictions = months, {}, predictions
+            self._last_order_id, self._last_expense_id = last_order_id, last_expense_id
+            self._add_expenses(expenses)
+            self._rechecked_at = rechecked_at
+        logging.info(f"Dashboard aggregates built for {len(months)} month(s) in "
+                     f"{time.perf_counter() - started:.2f}s.")
+
+    def _update(self):
+        # Watermarks are read first: rows inserted after them are folded in below and can only
+        # make a month look changed, which costs one extra rescan rather than a wrong total
+        watermarks = None
+        if self._recheck_due():
+            self._rechecked_at = time.monotonic()
+            watermarks = fetch_month_watermarks(self.engine, paid=True)
+        with self.engine.connect() as connection:
+            last_order_id = self._max_id(connection, 'laundry', 'OrderID')
+            last_expense_id = self._max_id(connection, 'inventory_expenses', 'ExpenseID')
+            new_orders = self._fetch_orders(connection, self._last_order_id, last_order_id) \
+                if last_order_id > self._last_order_id else {}
+            new_expenses = self._fetch_expenses(connection, self._last_expense_id, last_expense_id) \
+                if last_expense_id > self._last_expense_id else []
+            predictions = self._fetch_predictions(connection)
+
+        with self._lock:
+            for key, days in new_orders.items():
+                month_days = self._months.setdefault(key, {})
+                for day, sales in days.items():
+                    current = month_days.get(day)
+                    if current is None:
+                        month_days[day] = sales
+                    else:
+                        current.orders += sales.orders
+                        current.sales += sales.sales
+                        current.paid_sales += sales.paid_sales
+                        current.detergents.update(sales.detergents)
+                        current.fabric_detergents.update(sales.fabric_detergents)
+                self._folded_orders += sum(day.orders for day in days.values())
+            self._last_order_id = max(self._last_order_id, last_order_id)
+            self._add_expenses(new_expenses)
+            self._last_expense_id = max(self._last_expense_id, last_expense_id)
+            self._predictions = predictions
+            if watermarks is None:
+                return
+            changed = [key for key in self._months.keys() | watermarks.keys()
+                       if self._month_changed(self._months.get(key, {}), watermarks.get(key, (0, 0.0, 0.0)))]
+
+        for year, month in changed:
+            self._rescan_month(year, month)
+
+    def _rescan_month(self, year, month):
+        """
+        Rebuild the aggregates of one month from the orders folded in so far.
+        """
+        with self._lock:
+            last_order_id = self._last_order_id
+        with self.engine.connect() as connection:
+            days = self._fetch_orders(connection, 0, last_order_id, year, month).get((year, month), {})
+        with self._lock:
+            if days:
+                self._months[(year, month)] = days
+            else:
+                self._months.pop((year, month), None)
+            self._rescanned_months += 1
+        logging.info(f"Dashboard aggregates of {year}-{month:02d} rescanned after a change to existing orders.")
+
+    def _add_expenses(self, expenses):
+        for key, day_user, amount in expenses:
+            month_expenses = self._expenses.setdefault(key, {})
+            month_expenses[day_user] = month_expenses.get(day_user, 0.0) + amount
+
+    def _days(self, year, month=None, day=None):
+        """
+        Yield the (year, month), day and DaySales of the days inside the filters.
+        """
+        for key, days in self._months.items():
+            if month_matches(key, year, month):
+                for day_number, sales in days.items():
+                    if day is None or day_number == day:
+                        yield key, day_number, sales
+
+    def _expense_total(self, year, month=None, day=None, user_id=None):
+        return sum((amount for key, month_expenses in self._expenses.items() if month_matches(key, year, month)
+                    for (day_number, owner), amount in month_expenses.items()
+                    if (day is None or day_number == day) and (user_id is None or owner == user_id)), 0.0)
+
+    def summary(self, year, month=None, day=None, user_id=None, today=None):
+        """
+        Return the aggregates shown by the admin dashboard for the year/month/day filters, with
+        the expense charts limited to the inventory of user_id when it is given.
+        """
+        self.refresh()
+        today = today or date.today()
+        selected_date = (year, month, day) if month and day else (today.year, today.month, today.day)
+
+        with self._lock:
+            selected_days = list(self._days(year, month, day))
+            period_days = list(self._days(year, month)) if day else selected_days
+            year_days = list(self._days(year)) if month else period_days
+
+            on_date = self._months.get(selected_date[:2], {}).get(selected_date[2])
+            today_sales = on_date.paid_sales if on_date is not None else 0.0
+            monthly_sales = sum(sales.paid_sales for _, _, sales in period_days)
+            yearly_sales = sum(sales.paid_sales for _, _, sales in year_days)
+            inventory_expenses = self._expense_total(year, month, day)
+            revenue = (today_sales if day else monthly_sales if month else yearly_sales) - inventory_expenses
+
+            sales_by_month = [0.0] * 12
+            for (_, month_number), _, sales in year_days:
+                sales_by_month[month_number - 1] += sales.sales
+
+            detergents, fabric_detergents = Counter(), Counter()
+            for _, _, sales in selected_days:
+                detergents.update(sales.detergents)
+                fabric_detergents.update(sales.fabric_detergents)
+
+            orders = sum(sales.orders for _, _, sales in period_days)
+            period_sales = sum(sales.sales for _, _, sales in period_days)
+            active_days = len(period_days) or 1
+
+            expenses_by_month = [0.0] * 12
+            for month_number in range(1, 13):
+                if month is None or month_number == month:
+                    expenses_by_month[month_number - 1] = self._expense_total(year, month_number, user_id=user_id)
+
+            labels, actual, predicted = [], [], []
+            for month_number, total in enumerate(sales_by_month, start=1):
+                if (year, month_number) in self._months:
+                    labels.append(f"{year}-{month_number:02d}")
+                    actual.append(round(total, 2))
+                    predicted.append(self._predictions.get((year, month_number)))
+
+            return {
+                'year': year,
+                'month': month,
+                'day': day,
+                'today_sales': round(today_sales, 2),
+                'monthly_sales': round(monthly_sales, 2),
+                'yearly_sales': round(yearly_sales, 2),
+                'inventory_expenses': round(inventory_expenses, 2),
+                'revenue': round(revenue, 2),
+                'sales_by_month': [round(total, 2) for total in sales_by_month],
+                'top_detergents': top_counts(detergents),
+                'top_fabric_detergents': top_counts(fabric_detergents),
+                'total_customers': orders,
+                'average_customers_per_day': round(orders / active_days, 2),
+                'average_sales_per_day': round(period_sales / active_days, 2),
+                'expenses': {
+                    'total': round(self._expense_total(year, month, day, user_id), 2),
+                    'by_month': [round(total, 2) for total in expenses_by_month]
+                },
+                'sales_vs_predictions': {'labels': labels, 'actual': actual, 'predicted': predicted}
+            }
+
+    def stats(self):
+        """
+        Return the number of refreshes, orders folded in as deltas and months rescanned, and the
+        age of the rollups in seconds.
+        """
+        with self._lock:
+            age = time.monotonic() - self._refreshed_at if self._refreshed_at is not None else None
+            return {
+                'refreshes': self._refreshes,
+                'folded_orders': self._folded_orders,
+                'rescanned_months': self._rescanned_months,
+                'age_seconds': age
+            }
+
+
+def top_counts(counts, limit=TOP_DETERGENTS):
+    """
+    Return the limit most common names of counts as [{'name': .., 'count': ..}], ties by name.
+    """
+    ranked = sorted(counts.items(), key=lambda item: (-item[1], str(item[0])))
+    return [{'name': name, 'count': count} for name, count in ranked[:limit] if count > 0]
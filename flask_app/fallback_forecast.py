@@ -0,0 +1,95 @@
+# fallback_forecast.py
+#
+# Closed-form forecasts used by /predict when a SARIMAX fit cannot answer within the request's
+# latency budget, or when the series is too short for a seasonal model. They work on the same
+# log1p scale as the SARIMAX models and run in microseconds.
+
+import numpy as np
+
+SEASON = 12
+
+# Smoothing parameters tried for the level, trend and seasonal components
+SMOOTHING_GRID = np.array([0.05, 0.2, 0.4, 0.6, 0.8, 0.95])
+
+
+def _parameter_grid(*axes):
+    return [axis.ravel() for axis in np.meshgrid(*axes, indexing='ij')]
+
+
+def holt_winters(y, steps=1, season=SEASON):
+    """
+    Additive Holt-Winters forecast. Every (alpha, beta, gamma) combination of SMOOTHING_GRID runs
+    as one column of a single vectorized recursion; the one with the lowest one-step squared
+    error is used. Needs at least two seasons of data.
+    """
+    y = np.asarray(y, dtype=float)
+    alpha, beta, gamma = _parameter_grid(SMOOTHING_GRID, SMOOTHING_GRID, SMOOTHING_GRID)
+
+    first, second = y[:season].mean(), y[season:2 * season].mean()
+    level = np.full(alpha.size, first)
+    trend = np.full(alpha.size, (second - first) / season)
+    seasonal = np.repeat((y[:season] - first)[:, None], alpha.size, axis=1)
+    sse = np.zeros(alpha.size)
+
+    for t in range(season, len(y)):
+        position = t % season
+        season_t = seasonal[position]
+        sse += (y[t] - (level + trend + season_t)) ** 2
+        new_level = alpha * (y[t] - season_t) + (1 - alpha) * (level + trend)
+        trend = beta * (new_level - level) + (1 - beta) * trend
+        seasonal[position] = gamma * (y[t] - new_level) + (1 - gamma) * season_t
+        level = new_level
+
+    best = np.argmin(sse)
+    horizon = np.arange(1, steps + 1)
+    return level[best] + horizon * trend[best] + seasonal[(len(y) + horizon - 1) % season, best]
+
+
+def holt(y, steps=1):
+    """
+    Holt's linear trend forecast, with the smoothing parameters chosen over SMOOTHING_GRID
+    as in holt_winters. Needs at least three observations.
+    """
+    y = np.asarray(y, dtype=float)
+    alpha, beta = _parameter_grid(SMOOTHING_GRID, SMOOTHING_GRID)
+
+    level = np.full(alpha.size, y[0])
+    trend = np.full(alpha.size, y[1] - y[0])
+    sse = np.zeros(alpha.size)
+
+    for t in range(1, len(y)):
+        sse += (y[t] - (level + trend)) ** 2
+        new_level = alpha * y[t] + (1 - alpha) * (level + trend)
+        trend = beta * (new_level - level) + (1 - beta) * trend
+        level = new_level
+
+    best = np.argmin(sse)
+    return level[best] + np.arange(1, steps + 1) * trend[best]
+
+
+def seasonal_naive(y, steps=1, season=SEASON):
+    """
+    Repeat the value observed one season earlier. Needs at least one season of data.
+    """
+    y = np.asarray(y, dtype=float)
+    return y[len(y) - season + np.arange(steps) % season]
+
+
+def fallback_forecast(y, steps=1, season=SEASON):
+    """
+    Forecast the steps periods following the sales series y with the richest closed-form model
+    its length supports.
+
+    Returns:
+        tuple: (forecast array on the sales scale, engine name)
+    """
+    y_log = np.log1p(np.maximum(np.asarray(y, dtype=float), 0))
+    if len(y_log) >= 2 * season:
+        forecast_log, engine = holt_winters(y_log, steps, season), 'holt-winters'
+    elif len(y_log) >= season:
+        forecast_log, engine = seasonal_naive(y_log, steps, season), 'seasonal-naive'
+    elif len(y_log) >= 3:
+        forecast_log, engine = holt(y_log, steps), 'holt'
+    else:
+        forecast_log, engine = np.repeat(y_log[-1], steps), 'naive'
+    return np.expm1(forecast_log), engine
@@ -0,0 +1,155 @@
+# features.py
+
+import threading
+
+import numpy as np
+import pandas as pd
+
+# Exogenous variables used by the SARIMAX model
+EXOG_COLUMNS = ['Month', 'Quarter', 'Prev_Month_Sales', 'Rolling_Avg_3']
+
+# Columns of the feature array, in storage order
+FEATURE_COLUMNS = ['TOTAL', 'TOTAL_log'] + EXOG_COLUMNS
+TOTAL, TOTAL_LOG, MONTH, QUARTER, PREV_MONTH, ROLLING_AVG = range(len(FEATURE_COLUMNS))
+
+ROLLING_WINDOW = 3
+
+
+def _month_ordinals(index):
+    index = pd.DatetimeIndex(index)
+    return np.asarray(index.year * 12 + index.month - 1, dtype=np.int64)
+
+
+class FeatureEngine:
+    """
+    Builds the SARIMAX target and exogenous features of a monthly sales series.
+    Features live in one preallocated float array, one row per month. update() only recomputes
+    the months that are new or changed (plus the rolling-window lookback), so a series that grows
+    by a month costs one row of work rather than a rebuild of its history. Training and serving
+    both build their features here.
+
+    Features, for month t of the log1p sales series:
+        Month, Quarter: calendar of month t.
+        Prev_Month_Sales: log sales of month t - 1 (month 0 uses its own value).
+        Rolling_Avg_3: mean log sales of months t - 2 .. t (months 0 and 1 use month 2's value;
+                       a series shorter than the window uses the mean of what it has).
+    """
+
+    def __init__(self, capacity=64):
+        """
+        Initializes the FeatureEngine.
+
+        Parameters:
+            capacity (int): Number of months preallocated; the array doubles when it fills up.
+        """
+        self._data = np.empty((capacity, len(FEATURE_COLUMNS)))
+        self._start = None      # Month ordinal (year * 12 + month - 1) of row 0
+        self._length = 0
+        self._lock = threading.Lock()
+
+    @classmethod
+    def from_totals(cls, totals):
+        """
+        Build the features of totals, a Series of monthly sales indexed by month-end dates.
+        """
+        engine = cls(capacity=max(len(totals), 1))
+        engine.update(totals)
+        return engine
+
+    def __len__(self):
+        return self._length
+
+    def _reserve(self, length):
+        if length > len(self._data):
+            grown = np.empty((max(length, 2 * len(self._data)), len(FEATURE_COLUMNS)))
+            grown[:self._length] = self._data[:self._length]
+            self._data = grown
+
+    def update(self, totals):
+        """
+        Bring the features in line with totals (monthly sales indexed by month-end dates; months
+        missing between the first and last are treated as zero sales). Returns the number of
+        months recomputed.
+        """
+        if len(totals) == 0:
+            with self._lock:
+                self._start, self._length = None, 0
+            return 0
+
+        ordinals = _month_ordinals(totals.index)
+        start = int(ordinals.min())
+        values = np.zeros(int(ordinals.max()) - start + 1)
+        np.add.at(values, ordinals - start, np.asarray(totals, dtype=float))
+
+        with self._lock:
+            if self._start != start:
+                self._start, self._length = start, 0
+            overlap = min(self._length, len(values))
+            changed = np.flatnonzero(self._data[:overlap, TOTAL] != values[:overlap])
+            first = int(changed[0]) if len(changed) else overlap
+            if first == len(values) == self._length:
+                return 0
+            self._reserve(len(values))
+            self._data[first:len(values), TOTAL] = values[first:]
+            self._length = len(values)
+            self._compute(first)
+            return len(values) - first
+
+    def _compute(self, first):
+        """
+        Recompute the features of rows first onwards, vectorized over the rows.
+        """
+        data, end = self._data, self._length
+        # Months 0 and 1 take their rolling average from month 2, so changes there reach back
+        first = 0 if first < ROLLING_WINDOW else first
+        rows = slice(first, end)
+
+        data[rows, TOTAL_LOG] = np.log1p(data[rows, TOTAL])
+        month_index = (self._start + np.arange(first, end)) % 12
+        data[rows, MONTH] = month_index + 1
+        data[rows, QUARTER] = month_index // 3 + 1
+
+        log = data[:end, TOTAL_LOG]
+        data[max(first, 1):end, PREV_MONTH] = log[max(first, 1) - 1:end - 1]
+        if first == 0:
+            data[0, PREV_MONTH] = log[0]
+
+        lo = max(first, ROLLING_WINDOW - 1)
+        if lo < end:
+            data[lo:end, ROLLING_AVG] = (log[lo - 2:end - 2] + log[lo - 1:end - 1] + log[lo:end]) / ROLLING_WINDOW
+        if first == 0:
+            data[:min(end, ROLLING_WINDOW - 1), ROLLING_AVG] = (data[ROLLING_WINDOW - 1, ROLLING_AVG]
+                                                                if end >= ROLLING_WINDOW else log.mean())
+
+    @property
+    def index(self):
+        """
+        Month-end DatetimeIndex of the rows.
+        """
+        if self._start is None:
+            return pd.DatetimeIndex([], freq='M')
+        first = pd.Timestamp(year=self._start // 12, month=self._start % 12 + 1, day=1) + pd.offsets.MonthEnd(0)
+        return pd.date_range(start=first, periods=self._length, freq='M')
+
+    def frame(self):
+        """
+        Return the features as a DataFrame (a copy) indexed by month-end dates.
+        """
+        with self._lock:
+            return pd.DataFrame(self._data[:self._length].copy(), index=self.index, columns=FEATURE_COLUMNS)
+
+
+def build_future_exog(df_features, steps=1):
+    """
+    Build exogenous variables for the steps months following the last month of df_features.
+    Calendar features are exact; the lag and rolling features are carried forward from the
+    last observed months because future sales are unknown.
+    """
+    future_index = pd.date_range(start=df_features.index[-1] + pd.offsets.MonthEnd(1), periods=steps, freq='M')
+    log = df_features['TOTAL_log'].to_numpy()
+    exog = np.empty((steps, len(EXOG_COLUMNS)))
+    exog[:, 0] = future_index.month
+    exog[:, 1] = future_index.quarter
+    exog[:, 2] = log[-1]
+    exog[:, 3] = log[-ROLLING_WINDOW:].mean()
+    return pd.DataFrame(exog, index=future_index, columns=EXOG_COLUMNS)
@@ -4,8 +4,7 @@ import win32event
 import servicemanager
 import socket
 import logging
-import time
-from predict_sales import app  # Import your updated Flask app
+from predict_sales import app, start_warm_up, shutdown  # Import your updated Flask app
 
 # Configure logging for the service
 logging.basicConfig(
@@ -31,6 +30,9 @@ class FlaskService(win32serviceutil.ServiceFramework):
         # Tell the Service Control Manager we're in the process of stopping
         self.ReportServiceStatus(win32service.SERVICE_STOP_PENDING)
         
+        # Write any buffered predictions and stop background work before the process exits
+        shutdown()
+
         # Set the stop event to terminate the service
         win32event.SetEvent(self.hWaitStop)
 
@@ -50,10 +52,10 @@ class FlaskService(win32serviceutil.ServiceFramework):
 
     def main(self):
         try:
-            # Adding a delay before starting the app
-            logging.info("Service initialization delay...")
-            time.sleep(5)  # Add a 5-second delay to allow for initialization
-            
+            # Load the models and connect to the database in the background; '/' answers at
+            # once and '/ready' reports when the service is warm
+            start_warm_up()
+
             logging.info("Starting Flask app with waitress...")
             
             # Use waitress to run the Flask application
@@ -69,6 +71,7 @@ if __name__ == '__main__':
     if len(sys.argv) > 1 and sys.argv[1] == 'run':
         # Run the app directly without the service for debugging
         logging.info("Running Flask app directly without the Windows Service wrapper.")
+        start_warm_up()
         app.run(host='0.0.0.0', port=5000, debug=True)  # Enable debug for development
     else:
         # Install or start as a Windows service
@@ -0,0 +1,93 @@
+# forecast_cache.py
+
+import threading
+import time
+from collections import OrderedDict
+
+
+class ForecastCache:
+    """
+    Thread-safe in-process cache for computed forecasts.
+    Entries are evicted least-recently-used once the cache is full, and expire
+    after a fixed time-to-live regardless of use.
+    """
+
+    def __init__(self, max_entries=128, ttl_seconds=3600):
+        """
+        Initializes the ForecastCache.
+
+        Parameters:
+            max_entries (int): Maximum number of forecasts kept in memory.
+            ttl_seconds (float): Seconds after which a cached forecast expires.
+        """
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.invalidations = 0
+
+    def get(self, key):
+        """
+        Returns the cached value for key, or None if it is missing or expired.
+        """
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            stored_at, value = entry
+            if now - stored_at > self.ttl_seconds:
+                del self._entries[key]
+                self.evictions += 1
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return value
+
+    def put(self, key, value):
+        """
+        Stores value under key, evicting the least recently used entries if needed.
+        """
+        with self._lock:
+            self._entries[key] = (time.monotonic(), value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def invalidate(self, predicate):
+        """
+        Removes the entries whose key satisfies predicate, returning how many were removed.
+        """
+        with self._lock:
+            stale = [key for key in self._entries if predicate(key)]
+            for key in stale:
+                del self._entries[key]
+            self.invalidations += len(stale)
+            return len(stale)
+
+    def clear(self):
+        """
+        Removes every cached entry.
+        """
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self):
+        """
+        Returns a snapshot of the cache counters.
+        """
+        with self._lock:
+            return {
+                'size': len(self._entries),
+                'max_entries': self.max_entries,
+                'hits': self.hits,
+                'misses': self.misses,
+                'evictions': self.evictions,
+                'invalidations': self.invalidations
+            }
@@ -0,0 +1,401 @@
+# forecast_jobs.py
+
+import hashlib
+import json
+import logging
+import multiprocessing
+import os
+import re
+import threading
+import time
+import uuid
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+from pathlib import Path
+
+from profiling import worker_call
+
+try:
+    import fcntl
+except ImportError:  # Windows, where the service runs a single process
+    fcntl = None
+
+# Job ids are uuid4().hex; anything else is rejected before touching the status directory
+_JOB_ID_PATTERN = re.compile(r'^[0-9a-f]{32}$')
+
+
+class JobQueueFull(Exception):
+    """
+    Raised when a forecast job is submitted while the job queue is at capacity.
+    """
+
+
+class FitTimeout(Exception):
+    """
+    Raised when a SARIMAX fit exceeds its time budget.
+    """
+
+
+def deadline_callback(timeout):
+    """
+    Build an optimizer callback for SARIMAX.fit that raises FitTimeout once timeout seconds
+    have passed. Returns None (no callback) when timeout is None.
+    Lives here rather than in train_model so that worker processes can import it without
+    train_model's database engine and scikit-learn imports.
+    """
+    if timeout is None:
+        return None
+    deadline = time.monotonic() + timeout
+
+    def callback(*args):
+        if time.monotonic() > deadline:
+            raise FitTimeout(f"fit exceeded {timeout}s")
+
+    return callback
+
+
+def sarimax_forecast(y, order, seasonal_order, steps=1, timeout=None):
+    """
+    Fit a SARIMAX model to y and forecast steps periods ahead, giving up with FitTimeout once
+    the fit has run for timeout seconds.
+    Runs inside a worker process, so it returns plain floats rather than the results object.
+    """
+    import warnings
+    import numpy as np
+    from statsmodels.tsa.statespace.sarimax import SARIMAX
+
+    warnings.filterwarnings("ignore")
+    model_fit = SARIMAX(y, order=order, seasonal_order=seasonal_order).fit(
+        disp=False, callback=deadline_callback(timeout))
+    return np.asarray(model_fit.forecast(steps=steps)).tolist()
+
+
+def sarimax_forecast_interval(y, order, seasonal_order, steps=1, alpha=0.05, timeout=None):
+    """
+    Fit a SARIMAX model to y and forecast steps periods ahead with (1 - alpha) confidence intervals,
+    giving up with FitTimeout once the fit has run for timeout seconds.
+
+    Returns:
+        tuple: (mean, lower, upper) lists of floats.
+    """
+    import warnings
+    import numpy as np
+    from statsmodels.tsa.statespace.sarimax import SARIMAX
+
+    warnings.filterwarnings("ignore")
+    model_fit = SARIMAX(y, order=order, seasonal_order=seasonal_order).fit(
+        disp=False, callback=deadline_callback(timeout))
+    prediction = model_fit.get_forecast(steps=steps)
+    conf_int = np.asarray(prediction.conf_int(alpha=alpha))
+    return (np.asarray(prediction.predicted_mean).tolist(), conf_int[:, 0].tolist(), conf_int[:, 1].tolist())
+
+
+def sarimax_fit_params(endog, exog, spec, start_params=None, timeout=None):
+    """
+    Re-estimate the parameters of a serving model's SARIMAX specification on endog and exog,
+    warm-started from start_params, giving up with FitTimeout once the fit has run for timeout
+    seconds. spec holds the order, seasonal_order, trend, enforce_stationarity and
+    enforce_invertibility of the model.
+
+    Returns:
+        list: The estimated parameters, as floats.
+    """
+    import warnings
+    import numpy as np
+    from statsmodels.tsa.statespace.sarimax import SARIMAX
+
+    warnings.filterwarnings("ignore")
+    model = SARIMAX(endog, exog=exog, order=tuple(spec['order']), seasonal_order=tuple(spec['seasonal_order']),
+                    trend=spec['trend'], enforce_stationarity=spec['enforce_stationarity'],
+                    enforce_invertibility=spec['enforce_invertibility'])
+    results = model.fit(start_params=start_params, disp=False, callback=deadline_callback(timeout))
+    return np.asarray(results.params, dtype=float).tolist()
+
+
+def shared_fit_params(directory, fit, endog, exog, spec, start_params=None):
+    """
+    Run fit(endog, exog, spec, start_params) once for all processes sharing directory (e.g. the
+    gunicorn workers, which each detect the same drift). The first process to get here fits
+    under an exclusive lock on the directory and publishes the parameters as
+    'refit-<digest of the inputs>.json'; the others wait for the lock and reuse them. Without a
+    directory, or where file locks are unavailable, fit simply runs.
+
+    Returns:
+        list: The estimated parameters.
+    """
+    if directory is None or fcntl is None:
+        return fit(endog, exog, spec, start_params)
+
+    import numpy as np
+
+    digest = hashlib.sha1(repr(sorted(spec.items())).encode())
+    for array in (endog, exog, start_params):
+        if array is not None:
+            digest.update(np.ascontiguousarray(array, dtype=np.float64).tobytes())
+    directory = Path(directory)
+    directory.mkdir(parents=True, exist_ok=True)
+    path = directory / f"refit-{digest.hexdigest()}.json"
+
+    with open(directory / 'refit.lock', 'w') as lock:
+        fcntl.flock(lock, fcntl.LOCK_EX)
+        try:
+            if path.exists():
+                logging.info("Reusing the serving model parameters fitted by another process.")
+                return json.loads(path.read_text())
+            params = fit(endog, exog, spec, start_params)
+            temporary = directory / f"{path.name}.{os.getpid()}.tmp"
+            temporary.write_text(json.dumps(params))
+            os.replace(temporary, path)
+            return params
+        finally:
+            fcntl.flock(lock, fcntl.LOCK_UN)
+
+
+class ForecastJobManager:
+    """
+    Runs CPU-bound forecast work on a process pool so model fits neither block the HTTP
+    threads nor hold their GIL. The number of unfinished jobs is bounded; submissions beyond
+    the bound raise JobQueueFull instead of queueing more work.
+
+    With a status_dir, every job's status is also written to '<job id>.json' there when it is
+    submitted and when it finishes, so that any process sharing the directory (e.g. the other
+    gunicorn workers) can answer status queries for it.
+    """
+
+    def __init__(self, max_workers=2, max_pending=8, job_ttl_seconds=600, status_dir=None):
+        """
+        Initializes the ForecastJobManager.
+
+        Parameters:
+            max_workers (int): Number of worker processes.
+            max_pending (int): Maximum number of queued or running jobs.
+            job_ttl_seconds (float): Seconds a finished job stays available for status queries.
+            status_dir (str): Directory of job status files shared between processes, if any.
+        """
+        self.max_workers = max_workers
+        self.max_pending = max_pending
+        self.job_ttl_seconds = job_ttl_seconds
+        self.status_dir = Path(status_dir) if status_dir is not None else None
+        self.rejected = 0
+        self._executor = None
+        self._jobs = {}
+        self._batch_calls = 0   # Unfinished calls submitted by run_batch()
+        self._lock = threading.Lock()
+
+    def _get_executor(self):
+        # Created on first use so the pool is never started in a process that only imports the app.
+        # Workers are spawned rather than forked: the server is multi-threaded and imports modules
+        # lazily, so a forked child could inherit a lock held by another thread.
+        if self._executor is None:
+            self._executor = ProcessPoolExecutor(max_workers=self.max_workers,
+                                                 mp_context=multiprocessing.get_context('spawn'))
+        return self._executor
+
+    def _pending_count(self):
+        return self._batch_calls + sum(1 for job in self._jobs.values() if not job['future'].done())
+
+    def _expire_finished(self):
+        now = time.time()
+        expired = [job_id for job_id, job in self._jobs.items()
+                   if job['finished_at'] is not None and now - job['finished_at'] > self.job_ttl_seconds]
+        for job_id in expired:
+            del self._jobs[job_id]
+        if self.status_dir is not None and self.status_dir.is_dir():
+            # Files of jobs whose process exited before finishing them expire the same way
+            for path in self.status_dir.glob('*.json'):
+                try:
+                    if now - path.stat().st_mtime > self.job_ttl_seconds:
+                        path.unlink()
+                except FileNotFoundError:
+                    pass
+
+    def _publish(self, job_id):
+        """
+        Write a job's status to the status directory, atomically.
+        """
+        if self.status_dir is None:
+            return
+        try:
+            self.status_dir.mkdir(parents=True, exist_ok=True)
+            temporary = self.status_dir / f"{job_id}.json.{os.getpid()}.tmp"
+            temporary.write_text(json.dumps(self.status(job_id), default=str))
+            os.replace(temporary, self.status_dir / f"{job_id}.json")
+        except (OSError, TypeError, ValueError) as e:
+            logging.warning(f"Could not publish the status of forecast job {job_id}: {e}")
+
+    def _published_status(self, job_id):
+        if self.status_dir is None or not _JOB_ID_PATTERN.match(job_id):
+            return None
+        try:
+            job = json.loads((self.status_dir / f"{job_id}.json").read_text())
+        except (FileNotFoundError, ValueError):
+            return None
+        if time.time() - (job['finished_at'] or job['submitted_at']) > self.job_ttl_seconds:
+            return None
+        return job
+
+    def submit(self, fn, *args, key=None, on_done=None, **kwargs):
+        """
+        Submit fn(*args, **kwargs) to the worker pool and return the job id.
+
+        If key is given and an unfinished job with the same key exists, its id is returned
+        instead of starting a duplicate. on_done(result) is called in the parent process when
+        the job succeeds; whatever it returns becomes the job's result. If the calling thread is
+        being profiled, the job profiles itself in the worker (see profiling.worker_call).
+        """
+        with self._lock:
+            self._expire_finished()
+            if key is not None:
+                for job_id, job in self._jobs.items():
+                    if job['key'] == key and not job['future'].done():
+                        return job_id
+            if self._pending_count() >= self.max_pending:
+                self.rejected += 1
+                raise JobQueueFull(f"{self.max_pending} forecast jobs are already pending.")
+
+            job_id = uuid.uuid4().hex
+            future = self._get_executor().submit(worker_call(fn), *args, **kwargs)
+            job = {
+                'key': key,
+                'future': future,
+                'submitted_at': time.time(),
+                'finished_at': None,
+                'result': None,
+                'error': None,
+                'done': threading.Event()
+            }
+            self._jobs[job_id] = job
+
+        def finish(fut):
+            try:
+                result = fut.result()
+                job['result'] = on_done(result) if on_done is not None else result
+            except Exception as e:
+                logging.error(f"Forecast job {job_id} failed: {e}")
+                job['error'] = str(e)
+            finally:
+                job['finished_at'] = time.time()
+                job['done'].set()
+                self._publish(job_id)
+
+        self._publish(job_id)
+        future.add_done_callback(finish)
+        logging.info(f"Submitted forecast job {job_id} (key={key}).")
+        return job_id
+
+    def run_batch(self, fn, arguments, timeout=None):
+        """
+        Run fn(*args) for every tuple in arguments on the worker pool and wait for them, at most
+        timeout seconds in total. The calls count against max_pending like jobs: the batch takes
+        the free slots, raising JobQueueFull if there are none, and submits its next call
+        whenever one of its calls finishes. Like submit(), the calls are profiled in the workers
+        while the calling thread is.
+
+        Returns:
+            list: One (result, error message) pair per argument tuple, in input order; calls that
+                  had not finished by the timeout get an error.
+        """
+        arguments = list(arguments)
+        if not arguments:
+            return []
+        with self._lock:
+            free = self.max_pending - self._pending_count()
+            if free <= 0:
+                self.rejected += 1
+                raise JobQueueFull(f"{self.max_pending} forecast jobs are already pending.")
+            slots = min(free, len(arguments))
+            self._batch_calls += slots
+
+        def release(future):
+            with self._lock:
+                self._batch_calls -= 1
+
+        fn = worker_call(fn)
+        deadline = time.monotonic() + timeout if timeout is not None else None
+        outcomes = [(None, f"Not finished within {timeout}s.")] * len(arguments)
+        running = {}
+        submitted = 0
+        try:
+            while submitted < len(arguments) or running:
+                while submitted < len(arguments) and len(running) < slots:
+                    running[self._get_executor().submit(fn, *arguments[submitted])] = submitted
+                    submitted += 1
+                remaining = max(deadline - time.monotonic(), 0) if deadline is not None else None
+                done, _ = wait(running, timeout=remaining, return_when=FIRST_COMPLETED)
+                if not done:
+                    logging.warning(f"Batch forecast gave up on {len(arguments) - submitted + len(running)} "
+                                    f"of {len(arguments)} call(s) after {timeout}s.")
+                    break
+                for future in done:
+                    index = running.pop(future)
+                    try:
+                        outcomes[index] = (future.result(), None)
+                    except Exception as e:
+                        outcomes[index] = (None, str(e))
+        finally:
+            # Calls still queued are dropped; running fits give up at their own timeout and keep
+            # their slot until then
+            for future in running:
+                future.cancel()
+            unfinished = [future for future in running if not future.done()]
+            with self._lock:
+                self._batch_calls -= slots - len(unfinished)
+            for future in unfinished:
+                future.add_done_callback(release)
+        return outcomes
+
+    def wait(self, job_id, timeout):
+        """
+        Wait up to timeout seconds for a job to finish. Returns True if it finished.
+        """
+        job = self._jobs.get(job_id)
+        return job is not None and job['done'].wait(timeout)
+
+    def status(self, job_id):
+        """
+        Returns the public status of a job, or None if the job id is unknown or expired. Jobs of
+        other processes are answered from the status directory.
+        """
+        job = self._jobs.get(job_id)
+        if job is None:
+            return self._published_status(job_id)
+        if job['done'].is_set():
+            state = 'failed' if job['error'] is not None else 'done'
+        elif job['future'].running():
+            state = 'running'
+        else:
+            state = 'queued'
+        finished_at = job['finished_at']
+        return {
+            'job_id': job_id,
+            'status': state,
+            'submitted_at': job['submitted_at'],
+            'finished_at': finished_at,
+            'elapsed_seconds': round((finished_at or time.time()) - job['submitted_at'], 3),
+            'result': job['result'],
+            'error': job['error']
+        }
+
+    def stats(self):
+        """
+        Returns a snapshot of the queue counters.
+        """
+        with self._lock:
+            return {
+                'pending': self._pending_count(),
+                'max_pending': self.max_pending,
+                'workers': self.max_workers,
+                'rejected': self.rejected
+            }
+
+    def after_fork(self):
+        """
+        Reset the manager in a forked child: the parent's worker pool and jobs are not usable there.
+        """
+        self._executor = None
+        self._jobs = {}
+        self._batch_calls = 0
+        self._lock = threading.Lock()
+
+    def shutdown(self):
+        if self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
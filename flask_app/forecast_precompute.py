@@ -0,0 +1,366 @@
+# forecast_precompute.py
+#
+# Off-peak precomputation of the /predict forecasts the admin dashboard can ask for. The
+# dashboard always sends a year and optionally a month and a day, so the filters with data are
+# every year, (year, month), (year, day) and date in laundry, plus the unfiltered series. Their
+# forecasts are stored in forecast_lookup, keyed by filter, and /predict answers them with one
+# primary key read. Each stored forecast carries a digest of the monthly watermarks it was
+# computed from and the fingerprint of the model that computed it; /predict only uses it while
+# both still match, and a run only recomputes the filters where either changed.
+#
+# Run once from cron (e.g. on gunicorn hosts, whose workers do not start the scheduler):
+#     python forecast_precompute.py
+#     python forecast_precompute.py --full
+
+import logging
+import threading
+import time
+from datetime import datetime
+
+import pandas as pd
+from sqlalchemy import Column, Date, DateTime, Integer, MetaData, Numeric, String, Table, text
+
+from sales_data import fetch_daily_sales, monthly_sales_frame
+
+ALL_FILTERS = (None, None, None)
+
+# Forecasts computed and written per batch; an interrupted run keeps the batches it finished
+PRECOMPUTE_CHUNK = 200
+
+metadata = MetaData()
+
+# Filter columns hold 0 where the filter is not set, so that they can form the primary key
+FORECAST_LOOKUP = Table(
+    'forecast_lookup', metadata,
+    Column('filter_year', Integer, primary_key=True, autoincrement=False),
+    Column('filter_month', Integer, primary_key=True, autoincrement=False),
+    Column('filter_day', Integer, primary_key=True, autoincrement=False),
+    Column('data_digest', String(40), nullable=False),
+    Column('model_key', String(64), nullable=False),
+    Column('prediction_date', Date, nullable=False),
+    Column('next_period', String(20), nullable=False),
+    Column('predicted_sales', Numeric(14, 2), nullable=False),
+    Column('forecast_engine', String(32), nullable=False),
+    Column('computed_at', DateTime, nullable=False)
+)
+
+
+def lookup_key(filter_key):
+    """
+    Return the forecast_lookup primary key of a (year, month, day) filter.
+    """
+    return tuple(value or 0 for value in filter_key)
+
+
+def filter_combinations(daily):
+    """
+    Enumerate the dashboard filters that have data in daily (as returned by
+    sales_data.fetch_daily_sales): the unfiltered series, then every year, (year, month),
+    (year, day) and date.
+    """
+    years = daily['sales_year'].astype(int).tolist()
+    months = daily['sales_month'].astype(int).tolist()
+    days = daily['sales_day'].astype(int).tolist()
+    keys = [ALL_FILTERS]
+    keys += [(year, None, None) for year in sorted(set(years))]
+    keys += [(year, month, None) for year, month in sorted(set(zip(years, months)))]
+    keys += [(year, None, day) for year, day in sorted(set(zip(years, days)))]
+    keys += [(year, month, day) for year, month, day in sorted(set(zip(years, months, days)))]
+    return keys
+
+
+class ForecastPrecomputer:
+    """
+    Computes the forecasts of every dashboard filter with data into forecast_lookup. Series not
+    filtered by day come from the change detector's snapshot, as for /predict; day-filtered
+    series are all built from one query of daily totals. The series-level forecasts (the
+    unfiltered series and whole years) are also queued for sales_predictions.
+    """
+
+    def __init__(self, engine, change_detector, forecaster, model_key, prediction_writer=None,
+                 chunk_size=PRECOMPUTE_CHUNK):
+        """
+        Initializes the ForecastPrecomputer.
+
+        Parameters:
+            engine (Engine): SQLAlchemy engine of the laundry database.
+            change_detector (ChangeDetector): Provides the monthly series and their digests.
+            forecaster (callable): forecaster(items) forecasts a list of (filter key, monthly
+                                   sales) items and returns (prediction date, forecast result)
+                                   or None per item.
+            model_key (callable): Returns the fingerprint of the model forecaster uses.
+            prediction_writer (PredictionWriter): Receives the series-level forecasts, if given.
+            chunk_size (int): Forecasts computed and written per batch.
+        """
+        self.engine = engine
+        self.change_detector = change_detector
+        self.forecaster = forecaster
+        self.model_key = model_key
+        self.prediction_writer = prediction_writer
+        self.chunk_size = chunk_size
+        self._table_ready = False
+        self._lock = threading.Lock()
+
+    def ensure_table(self):
+        """
+        Create forecast_lookup if it does not exist yet.
+        """
+        if not self._table_ready:
+            metadata.create_all(self.engine, tables=[FORECAST_LOOKUP], checkfirst=True)
+            self._table_ready = True
+
+    def lookup(self, filter_key, data_digest, model_key):
+        """
+        Return the stored forecast result of filter_key if it was computed from data with
+        data_digest by the model model_key, else None.
+        """
+        self.ensure_table()
+        year, month, day = lookup_key(filter_key)
+        with self.engine.connect() as connection:
+            row = connection.execute(
+                text("SELECT data_digest, model_key, next_period, predicted_sales, forecast_engine "
+                     "FROM forecast_lookup WHERE filter_year = :year AND filter_month = :month AND filter_day = :day"),
+                {'year': year, 'month': month, 'day': day}).first()
+        if row is None or row.data_digest != data_digest or row.model_key != model_key:
+            return None
+        return {
+            'predicted_sales': float(row.predicted_sales),
+            'next_period': row.next_period,
+            'engine': row.forecast_engine
+        }
+
+    def stored_model_keys(self):
+        """
+        Return the set of model fingerprints the stored forecasts were computed with.
+        """
+        self.ensure_table()
+        with self.engine.connect() as connection:
+            return set(connection.execute(text("SELECT DISTINCT model_key FROM forecast_lookup")).scalars())
+
+    def _series(self, filter_key, daily_by_year_day):
+        year, month, day = filter_key
+        if day is None:
+            return self.change_detector.monthly_sales(year, month)
+        rows = daily_by_year_day.get((year, day))
+        if rows is not None and month is not None:
+            rows = rows[rows['sales_month'] == month]
+        if rows is None or rows.empty:
+            return pd.DataFrame(columns=['DATE', 'TOTAL'])
+        return monthly_sales_frame(rows[['sales_year', 'sales_month', 'TOTAL']].copy())
+
+    def run(self, full=False):
+        """
+        Bring forecast_lookup up to date: compute the filters whose data digest or model changed
+        (every filter with full=True) and delete the filters that no longer have data.
+
+        Returns:
+            dict: The model fingerprint and the number of filters, computed forecasts, filters
+                  without a forecast (too little data or failed), unchanged filters and removed
+                  rows, and the run time in seconds.
+        """
+        with self._lock:
+            started = time.perf_counter()
+            self.ensure_table()
+            self.change_detector.poll()
+            daily = fetch_daily_sales(self.engine)
+            keys = filter_combinations(daily) if not daily.empty else []
+            digests = dict(zip(keys, self.change_detector.digests(keys)))
+            model_key = self.model_key()
+
+            with self.engine.connect() as connection:
+                stored = {(row.filter_year, row.filter_month, row.filter_day): (row.data_digest, row.model_key)
+                          for row in connection.execute(text(
+                              "SELECT filter_year, filter_month, filter_day, data_digest, model_key FROM forecast_lookup"))}
+            current = {lookup_key(key) for key in keys}
+            removed = [key for key in stored if key not in current]
+            stale = [key for key in keys if full or stored.get(lookup_key(key)) != (digests[key], model_key)]
+            logging.info(f"Precomputing {len(stale)} of {len(keys)} dashboard forecast(s) "
+                         f"({'full run' if full else 'incremental'}), removing {len(removed)}.")
+
+            daily_by_year_day = {key: rows for key, rows in daily.groupby(['sales_year', 'sales_day'])}
+            computed = failed = 0
+            for first in range(0, len(stale), self.chunk_size):
+                chunk = stale[first:first + self.chunk_size]
+                outcomes = self.forecaster([(key, self._series(key, daily_by_year_day)) for key in chunk])
+                rows, predictions = [], {}
+                computed_at = datetime.now().replace(microsecond=0)
+                for key, outcome in zip(chunk, outcomes):
+                    if outcome is None:
+                        failed += 1
+                        continue
+                    prediction_date, forecast_result = outcome
+                    year, month, day = lookup_key(key)
+                    rows.append({
+                        'year': year, 'month': month, 'day': day, 'digest': digests[key], 'model_key': model_key,
+                        'prediction_date': prediction_date.date(), 'next_period': forecast_result['next_period'],
+                        'predicted_sales': forecast_result['predicted_sales'],
+                        'forecast_engine': forecast_result['engine'], 'computed_at': computed_at
+                    })
+                    if key[1] is None and key[2] is None:
+                        predictions[prediction_date] = forecast_result['predicted_sales']
+                if rows:
+                    with self.engine.begin() as connection:
+                        connection.execute(text(
+                            "REPLACE INTO forecast_lookup (filter_year, filter_month, filter_day, data_digest, "
+                            "model_key, prediction_date, next_period, predicted_sales, forecast_engine, computed_at) "
+                            "VALUES (:year, :month, :day, :digest, :model_key, :prediction_date, :next_period, "
+                            ":predicted_sales, :forecast_engine, :computed_at)"), rows)
+                if predictions and self.prediction_writer is not None:
+                    self.prediction_writer.put_many(predictions)
+                computed += len(rows)
+
+            if removed:
+                with self.engine.begin() as connection:
+                    connection.execute(text("DELETE FROM forecast_lookup WHERE filter_year = :year "
+                                            "AND filter_month = :month AND filter_day = :day"),
+                                       [{'year': year, 'month': month, 'day': day} for year, month, day in removed])
+
+            stats = {
+                'model_key': model_key,
+                'filters': len(keys),
+                'computed': computed,
+                'without_forecast': failed,
+                'unchanged': len(keys) - len(stale),
+                'removed': len(removed),
+                'seconds': round(time.perf_counter() - started, 3)
+            }
+            logging.info(f"Precomputed dashboard forecasts: {stats}")
+            return stats
+
+
+class PrecomputeScheduler:
+    """
+    Runs a ForecastPrecomputer on a background thread: once in each off-peak hour of hours, soon
+    after the serving model changes (a retrained model loaded at startup, or a refit), and when
+    triggered.
+    """
+
+    def __init__(self, precomputer, hours=(2,), check_seconds=60):
+        """
+        Initializes the PrecomputeScheduler.
+
+        Parameters:
+            precomputer (ForecastPrecomputer): The precomputer to run.
+            hours (tuple): Local hours (0-23) in which a run starts; empty to run only on
+                           model changes and triggers.
+            check_seconds (float): Seconds between checks of the clock and the model.
+        """
+        self.precomputer = precomputer
+        self.hours = tuple(hours)
+        self.check_seconds = check_seconds
+        self._lock = threading.Lock()
+        self._wake = threading.Event()
+        self._stopped = threading.Event()
+        self._thread = None
+        self._runs = 0
+        self._failures = 0
+        self._computed = 0
+        self._last_run = None
+
+    def start(self):
+        """
+        Start the scheduler thread. Safe to call repeatedly.
+        """
+        with self._lock:
+            if self._thread is None and not self._stopped.is_set():
+                self._thread = threading.Thread(target=self._run, name='forecast-precompute', daemon=True)
+                self._thread.start()
+
+    def trigger(self):
+        """
+        Ask for a run as soon as the scheduler thread is free, starting the thread if needed.
+        """
+        self._wake.set()
+        self.start()
+
+    def stop(self):
+        """
+        Stop the scheduler thread; a run in progress finishes first.
+        """
+        self._stopped.set()
+        self._wake.set()
+        if self._thread is not None:
+            self._thread.join(timeout=5)
+
+    def after_fork(self):
+        """
+        Reset the scheduler in a forked child, which has no scheduler thread.
+        """
+        self._lock = threading.Lock()
+        self._wake = threading.Event()
+        self._stopped = threading.Event()
+        self._thread = None
+
+    def _initial_model_key(self):
+        # Stored forecasts from another model (e.g. before a retrain) need a run now; with no
+        # stored forecasts the first run waits for the off-peak hours
+        current = self.precomputer.model_key()
+        try:
+            stored = self.precomputer.stored_model_keys()
+        except Exception:
+            logging.exception("Could not read the stored forecast models; waiting for the off-peak hours.")
+            return current
+        return current if stored <= {current} else None
+
+    def _run(self):
+        last_model_key = self._initial_model_key()
+        last_slot = None
+        while not self._stopped.is_set():
+            now = datetime.now()
+            slot = (now.date(), now.hour)
+            if self._wake.is_set():
+                reason = 'triggered'
+            elif now.hour in self.hours and slot != last_slot:
+                reason = 'off_peak'
+            elif self.precomputer.model_key() != last_model_key:
+                reason = 'model_changed'
+            else:
+                reason = None
+
+            if reason is not None:
+                self._wake.clear()
+                if reason == 'off_peak':
+                    last_slot = slot
+                started_at = datetime.now().isoformat(timespec='seconds')
+                try:
+                    stats = self.precomputer.run()
+                    last_model_key = stats['model_key']
+                    with self._lock:
+                        self._runs += 1
+                        self._computed += stats['computed']
+                        self._last_run = {'reason': reason, 'started_at': started_at, **stats}
+                except Exception:
+                    logging.exception(f"Precomputing the dashboard forecasts ({reason}) failed.")
+                    with self._lock:
+                        self._failures += 1
+                        self._last_run = {'reason': reason, 'started_at': started_at, 'failed': True}
+            self._wake.wait(self.check_seconds)
+
+    def stats(self):
+        """
+        Return the number of runs, failed runs and computed forecasts, and the last run.
+        """
+        with self._lock:
+            return {
+                'runs': self._runs,
+                'failures': self._failures,
+                'computed': self._computed,
+                'last_run': self._last_run
+            }
+
+
+if __name__ == '__main__':
+    import argparse
+    import json
+
+    parser = argparse.ArgumentParser(description="Precompute the dashboard's /predict forecasts.")
+    parser.add_argument('--full', action='store_true', help="Recompute every filter, not only the changed ones.")
+    args = parser.parse_args()
+
+    import predict_sales
+
+    predict_sales.warm_up(take_snapshot=False)
+    try:
+        print(json.dumps(predict_sales.forecast_precomputer.run(full=args.full)))
+    finally:
+        predict_sales.shutdown()
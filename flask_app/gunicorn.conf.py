@@ -0,0 +1,53 @@
+# gunicorn.conf.py
+#
+# Multi-process serving on Linux. The parent process imports and warms up predict_sales once
+# (the Flask app, statsmodels, the serving model and model_metrics.json) and forks the workers,
+# which share those pages copy-on-write instead of each loading its own copy. Workers are
+# recycled gracefully after SERVER_MAX_REQUESTS requests; the parent keeps the preloaded state,
+# so a replacement worker is ready as soon as it is forked.
+#
+# Run from this directory:
+#     gunicorn                          (picks up gunicorn.conf.py)
+#     SERVER_WORKERS=4 gunicorn
+#
+# Each worker keeps its own forecast cache, change detector and forecast job pool. Job statuses
+# are also written to Config.JOB_STATUS_DIR, so /predict/status answers for a job started by
+# any worker, and a serving model refit is fitted by one worker and reused by the others. flask_service.py remains the entry point for the Windows service.
+
+import gc
+
+from config import Config
+
+wsgi_app = 'predict_sales:app'
+bind = Config.SERVER_BIND
+workers = Config.SERVER_WORKERS
+worker_class = 'gthread'
+threads = Config.SERVER_THREADS
+preload_app = True
+max_requests = Config.SERVER_MAX_REQUESTS
+max_requests_jitter = Config.SERVER_MAX_REQUESTS_JITTER
+timeout = Config.SERVER_TIMEOUT
+graceful_timeout = Config.SERVER_GRACEFUL_TIMEOUT
+
+
+def when_ready(server):
+    # The app is loaded; warm it up (engine, metrics, serving model) and import the model code
+    # before the first fork, so every worker starts warm
+    import predict_sales
+    predict_sales.warm_up(take_snapshot=False)   # Each worker polls the database itself
+    import statsmodels.tsa.statespace.sarimax  # noqa: F401
+
+    # Move everything loaded so far out of the collector's generations, so garbage collection
+    # in the workers does not write to (and thereby copy) the shared pages
+    gc.freeze()
+    server.log.info(f"Preloaded the forecasting service; forking {workers} worker(s).")
+
+
+def post_fork(server, worker):
+    import predict_sales
+    predict_sales.after_fork()
+
+
+def worker_exit(server, worker):
+    import predict_sales
+    predict_sales.shutdown()
@@ -0,0 +1,216 @@
+# instrumentation.py
+
+import threading
+import time
+from contextlib import contextmanager
+from functools import wraps
+
+# Histogram buckets in seconds, from a cached response up to a slow SARIMAX fit
+DEFAULT_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60)
+
+
+def _format_labels(label_names, label_values, extra=None):
+    pairs = list(zip(label_names, label_values))
+    if extra:
+        pairs.append(extra)
+    if not pairs:
+        return ''
+    escaped = (str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n') for _, value in pairs)
+    return '{' + ','.join(f'{name}="{value}"' for (name, _), value in zip(pairs, escaped)) + '}'
+
+
+def _format_value(value):
+    if value == float('inf'):
+        return '+Inf'
+    return repr(float(value))
+
+
+class Histogram:
+    """
+    Prometheus-style histogram with cumulative buckets, optionally split by labels.
+    """
+
+    def __init__(self, name, help_text, label_names=(), buckets=DEFAULT_BUCKETS):
+        self.name = name
+        self.help_text = help_text
+        self.label_names = tuple(label_names)
+        self.buckets = tuple(sorted(buckets)) + (float('inf'),)
+        self._series = {}
+        self._lock = threading.Lock()
+
+    def observe(self, value, **labels):
+        key = tuple(str(labels.get(name, '')) for name in self.label_names)
+        with self._lock:
+            series = self._series.get(key)
+            if series is None:
+                series = self._series[key] = {'counts': [0] * len(self.buckets), 'sum': 0.0, 'count': 0}
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    series['counts'][i] += 1
+                    break
+            series['sum'] += value
+            series['count'] += 1
+
+    def render(self):
+        lines = [f'# HELP {self.name} {self.help_text}', f'# TYPE {self.name} histogram']
+        with self._lock:
+            for key, series in sorted(self._series.items()):
+                cumulative = 0
+                for bound, count in zip(self.buckets, series['counts']):
+                    cumulative += count
+                    labels = _format_labels(self.label_names, key, ('le', _format_value(bound)))
+                    lines.append(f'{self.name}_bucket{labels} {cumulative}')
+                labels = _format_labels(self.label_names, key)
+                lines.append(f'{self.name}_sum{labels} {_format_value(series["sum"])}')
+                lines.append(f'{self.name}_count{labels} {series["count"]}')
+        return lines
+
+
+class Counter:
+    """
+    Monotonically increasing counter, optionally split by labels.
+    """
+
+    def __init__(self, name, help_text, label_names=()):
+        self.name = name
+        self.help_text = help_text
+        self.label_names = tuple(label_names)
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def inc(self, amount=1, **labels):
+        key = tuple(str(labels.get(name, '')) for name in self.label_names)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def render(self):
+        lines = [f'# HELP {self.name} {self.help_text}', f'# TYPE {self.name} counter']
+        with self._lock:
+            for key, value in sorted(self._values.items()):
+                lines.append(f'{self.name}{_format_labels(self.label_names, key)} {_format_value(value)}')
+        return lines
+
+
+class CallbackMetric:
+    """
+    Gauge or counter whose samples are read from a callback at scrape time.
+    The callback returns a number, or a list of (label values, number) pairs.
+    """
+
+    def __init__(self, name, metric_type, help_text, callback, label_names=()):
+        self.name = name
+        self.metric_type = metric_type
+        self.help_text = help_text
+        self.callback = callback
+        self.label_names = tuple(label_names)
+
+    def render(self):
+        try:
+            samples = self.callback()
+        except Exception:
+            return []
+        if samples is None:
+            return []
+        if not isinstance(samples, list):
+            samples = [((), samples)]
+        lines = [f'# HELP {self.name} {self.help_text}', f'# TYPE {self.name} {self.metric_type}']
+        for label_values, value in samples:
+            lines.append(f'{self.name}{_format_labels(self.label_names, label_values)} {_format_value(value)}')
+        return lines
+
+
+class MetricsRegistry:
+    """
+    Collection of metrics rendered together in the Prometheus text exposition format.
+    """
+
+    def __init__(self):
+        self._metrics = []
+
+    def histogram(self, name, help_text, label_names=(), buckets=DEFAULT_BUCKETS):
+        metric = Histogram(name, help_text, label_names, buckets)
+        self._metrics.append(metric)
+        return metric
+
+    def counter(self, name, help_text, label_names=()):
+        metric = Counter(name, help_text, label_names)
+        self._metrics.append(metric)
+        return metric
+
+    def gauge_callback(self, name, help_text, callback, label_names=()):
+        self._metrics.append(CallbackMetric(name, 'gauge', help_text, callback, label_names))
+
+    def counter_callback(self, name, help_text, callback, label_names=()):
+        self._metrics.append(CallbackMetric(name, 'counter', help_text, callback, label_names))
+
+    def render(self):
+        lines = []
+        for metric in self._metrics:
+            lines.extend(metric.render())
+        return '\n'.join(lines) + '\n'
+
+
+registry = MetricsRegistry()
+
+STAGE_SECONDS = registry.histogram(
+    'forecast_stage_duration_seconds', 'Time spent in each stage of the forecasting pipeline.', ('stage',))
+REQUEST_SECONDS = registry.histogram(
+    'http_request_duration_seconds', 'HTTP request latency.', ('endpoint', 'method', 'status'))
+
+# ================================
+# Per-request stage tracking
+# ================================
+
+_request_state = threading.local()
+
+
+def begin_request():
+    """
+    Start collecting the stage breakdown of the request handled by the current thread.
+    """
+    _request_state.started = time.perf_counter()
+    _request_state.stages = []
+
+
+def end_request():
+    """
+    Stop collecting for the current thread.
+
+    Returns:
+        tuple: (elapsed seconds, list of (stage, seconds) in execution order)
+    """
+    started = getattr(_request_state, 'started', None)
+    stages = getattr(_request_state, 'stages', None) or []
+    _request_state.started = None
+    _request_state.stages = None
+    elapsed = time.perf_counter() - started if started is not None else 0.0
+    return elapsed, stages
+
+
+@contextmanager
+def stage(name):
+    """
+    Time a pipeline stage, recording it in the stage histogram and the current request's breakdown.
+    """
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        elapsed = time.perf_counter() - started
+        STAGE_SECONDS.observe(elapsed, stage=name)
+        stages = getattr(_request_state, 'stages', None)
+        if stages is not None:
+            stages.append((name, elapsed))
+
+
+def timed(name):
+    """
+    Decorator form of stage().
+    """
+    def decorator(f):
+        @wraps(f)
+        def wrapper(*args, **kwargs):
+            with stage(name):
+                return f(*args, **kwargs)
+        return wrapper
+    return decorator
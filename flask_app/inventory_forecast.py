@@ -0,0 +1,201 @@
+# inventory_forecast.py
+#
+# Detergent demand simulation and stock-out projection. Usage is counted the way
+# STAFF/php/addlaundry.php deducts stock: every order adds its load, articles and additional
+# scoops as "transactions" to both its detergent and its fabric detergent, and every
+# TRANSACTIONS_PER_UNIT transactions use up one unit of CurrentStock.
+
+import logging
+from datetime import date, timedelta
+
+import numpy as np
+import pandas as pd
+from sqlalchemy import inspect, text
+
+TRANSACTIONS_PER_UNIT = 15
+
+# Columns of laundry that count towards an order's transactions, as in addlaundry.php
+USAGE_COLUMNS = ['LAUNDRY_LOAD', 'COMFORTER_SINGLE', 'COMFORT_DOUBLE', 'BEDSHEETS_CURTAINS_TOWEL_BLANKETS',
+                 'DETERGENT_ADDITIONAL', 'FABRIC_DETERGENT_ADDITIONAL']
+
+# Largest (paths x days x products) block simulated at once; 4 MB of float32 stays in cache
+MAX_BLOCK_ELEMENTS = 1_000_000
+
+_usage_expressions = {}
+
+
+def usage_expression(engine):
+    """
+    SQL expression of an order's transactions, built from the USAGE_COLUMNS the laundry table
+    has. Without LAUNDRY_LOAD every order counts as one load. Cached per engine.
+    """
+    key = str(engine.url)
+    if key not in _usage_expressions:
+        available = {column['name'].upper() for column in inspect(engine).get_columns('laundry')}
+        terms = [f"COALESCE({column}, 0)" for column in USAGE_COLUMNS if column in available]
+        missing = [column for column in USAGE_COLUMNS if column not in available]
+        if 'LAUNDRY_LOAD' not in available:
+            terms.insert(0, '1')
+        if missing:
+            logging.warning(f"Laundry table has no {', '.join(missing)} column(s); detergent usage "
+                            f"counts {' + '.join(terms)} transactions per order.")
+        _usage_expressions[key] = ' + '.join(terms)
+    return _usage_expressions[key]
+
+
+def fetch_daily_usage(engine, history_days):
+    """
+    Fetch the daily transactions of every detergent and fabric detergent over the history_days
+    days ending on the last day with orders, in one grouped query.
+
+    Returns:
+        tuple: (product names, date of the first column, float32 array of products x days)
+    """
+    with engine.connect() as connection:
+        last = connection.execute(text("SELECT MAX(DATE) FROM laundry")).scalar()
+        if last is None:
+            return [], None, np.zeros((0, history_days), dtype=np.float32)
+        end = pd.Timestamp(last).date()
+        start = end - timedelta(days=history_days - 1)
+        query = text(f"SELECT YEAR(DATE) AS usage_year, MONTH(DATE) AS usage_month, DAY(DATE) AS usage_day, "
+                     f"DETERGENT AS detergent, FABRIC_DETERGENT AS fabric_detergent, "
+                     f"SUM({usage_expression(engine)}) AS transactions FROM laundry "
+                     f"WHERE DATE >= :start_date AND DATE < :end_date "
+                     f"GROUP BY usage_year, usage_month, usage_day, detergent, fabric_detergent")
+        df = pd.read_sql(query, connection, params={'start_date': start, 'end_date': end + timedelta(days=1)})
+
+    if df.empty:
+        return [], start, np.zeros((0, history_days), dtype=np.float32)
+
+    days = (pd.to_datetime(dict(year=df['usage_year'], month=df['usage_month'], day=df['usage_day']))
+            - pd.Timestamp(start)).dt.days.to_numpy()
+    transactions = df['transactions'].to_numpy(dtype=np.float32)
+
+    # Each group counts for its detergent and its fabric detergent
+    names = pd.concat([df['detergent'], df['fabric_detergent']], ignore_index=True)
+    codes, products = pd.factorize(names)
+    valid = codes >= 0
+    usage = np.zeros((len(products), history_days), dtype=np.float32)
+    np.add.at(usage, (codes[valid], np.tile(days, 2)[valid]), np.tile(transactions, 2)[valid])
+    return list(products), start, usage
+
+
+def fetch_stock(engine, user_id=None):
+    """
+    Fetch the current stock per product name, summed over the inventory rows of every user
+    (or of user_id only).
+    """
+    query = "SELECT ProductName AS product, SUM(CurrentStock) AS stock FROM inventory"
+    params = {}
+    if user_id is not None:
+        query += " WHERE userID = :user_id"
+        params['user_id'] = user_id
+    query += " GROUP BY ProductName"
+    with engine.connect() as connection:
+        rows = connection.execute(text(query), params).all()
+    return {row.product: int(row.stock or 0) for row in rows if row.product is not None}
+
+
+def simulate_stock_outs(usage, history_start, remaining, start, horizon_days, paths, rng):
+    """
+    Simulate paths demand paths of horizon_days days for every product at once and return the
+    day (0 = start) on which each product runs out in each path, or inf if it lasts the horizon.
+
+    Paths are a weekday-aligned bootstrap of the history: day h of a path replays the usage of a
+    random past day with the same weekday, and every product replays the same day, so busy days
+    are busy for all products. Only the drawn days are random; the paths x days x products array
+    is one gather of whole history rows, one cumulative sum and one comparison, split over paths
+    only to keep each block in cache. Cumulative usage never decreases, so the stock-out day is
+    the number of days still below the product's remaining transactions.
+
+    Parameters:
+        usage (ndarray): Transactions per product and day of history, products x days.
+        history_start (date): Date of the first history column.
+        remaining (ndarray): Transactions left per product before it runs out.
+        start (date): First simulated day.
+        horizon_days (int): Number of simulated days.
+        paths (int): Number of simulated paths.
+        rng (Generator): Random generator for the drawn days.
+
+    Returns:
+        ndarray: float32 stock-out days, products x paths.
+    """
+    products, history_days = usage.shape
+    weeks = history_days // 7
+    if weeks == 0:
+        raise ValueError("At least one week of history is needed.")
+    # Use whole weeks ending on the last history day, one row per day
+    usage_by_day = np.ascontiguousarray(usage[:, history_days - 7 * weeks:].T)
+    first_weekday = (history_start + timedelta(days=history_days - 7 * weeks)).weekday()
+
+    target_weekdays = (start.weekday() + np.arange(horizon_days)) % 7
+    offsets = (target_weekdays - first_weekday) % 7
+    drawn = offsets + 7 * rng.integers(0, weeks, size=(paths, horizon_days))
+
+    stock_out = np.empty((paths, products), dtype=np.float32)
+    block = max(1, MAX_BLOCK_ELEMENTS // max(horizon_days * products, 1))
+    for first in range(0, paths, block):
+        cumulative = usage_by_day[drawn[first:first + block]]
+        np.cumsum(cumulative, axis=1, out=cumulative)
+        stock_out[first:first + block] = np.count_nonzero(cumulative < remaining, axis=1)
+    stock_out[stock_out == horizon_days] = np.inf
+    return stock_out.T
+
+
+def project_stock_outs(engine, horizon_days=90, paths=2000, history_weeks=12, percentiles=(10, 50, 90),
+                       user_id=None, today=None, seed=0):
+    """
+    Project when every stocked product runs out, from simulated demand paths.
+
+    Returns:
+        dict: The simulation settings and, per product, its stock, mean daily usage in units,
+              the probability of running out within the horizon, and the stock-out date at each
+              percentile (None where the product lasts beyond the horizon).
+    """
+    today = today or date.today()
+    names, history_start, usage = fetch_daily_usage(engine, 7 * history_weeks)
+    stock = fetch_stock(engine, user_id)
+
+    # Products without recorded usage never run out (unless they already have)
+    products = sorted(stock)
+    positions = pd.Index(names).get_indexer(products)
+    found = positions >= 0
+    product_usage = np.zeros((len(products), usage.shape[1]), dtype=np.float32)
+    product_usage[found] = usage[positions[found]]
+    remaining = np.maximum([stock[name] for name in products], 0).astype(np.float32) * TRANSACTIONS_PER_UNIT
+
+    if products and history_start is not None:
+        stock_out = simulate_stock_outs(product_usage, history_start, remaining, today, horizon_days, paths,
+                                        np.random.default_rng(seed))
+    else:
+        stock_out = np.where(remaining[:, None] > 0, np.float32(np.inf), np.float32(0)) * np.ones(paths, np.float32)
+
+    # Nearest-rank percentiles of the stock-out day over the paths
+    ranks = np.ceil(np.asarray(percentiles) / 100 * paths).astype(int).clip(1, paths) - 1
+    bands = np.sort(stock_out, axis=1)[:, ranks]
+    probabilities = np.isfinite(stock_out).mean(axis=1)
+    daily_units = product_usage.mean(axis=1) / TRANSACTIONS_PER_UNIT
+
+    # Most likely and soonest stock-outs first
+    results = []
+    for index in np.lexsort((bands[:, len(percentiles) // 2], -probabilities)):
+        name = products[index]
+        results.append({
+            'product': name,
+            'current_stock': stock[name],
+            'mean_daily_usage': round(float(daily_units[index]), 3),
+            'stock_out_probability': round(float(probabilities[index]), 4),
+            'stock_out_date': {
+                f'p{percentile:g}': (today + timedelta(days=int(day))).isoformat() if np.isfinite(day) else None
+                for percentile, day in zip(percentiles, bands[index])
+            }
+        })
+    return {
+        'start': today.isoformat(),
+        'horizon_days': horizon_days,
+        'paths': paths,
+        'history_start': history_start.isoformat() if history_start is not None else None,
+        'history_days': usage.shape[1],
+        'transactions_per_unit': TRANSACTIONS_PER_UNIT,
+        'products': results
+    }
@@ -0,0 +1,373 @@
+# model_artifact.py
+#
+# Compact serving artifact for the SARIMAX model.
+#
+# A full SARIMAXResults pickle carries the training data, filter and smoother output and
+# covariance matrices, and needs statsmodels to unpickle. Serving only needs the estimated
+# parameters, the state-space system matrices, the state at the end of the sample and the
+# exogenous variable layout. The artifact stores exactly that as one .npy file per array plus a
+# JSON manifest. Arrays are opened with np.load(mmap_mode='r'), so worker processes share the
+# same pages, and forecasting runs the Kalman recursions in NumPy without importing statsmodels.
+#
+# Convert an existing pickle with:
+#     python model_artifact.py sarimax_model.pkl sarimax_serving
+
+import hashlib
+import json
+import logging
+import os
+import sys
+import threading
+from datetime import datetime, timezone
+from statistics import NormalDist
+
+import numpy as np
+import pandas as pd
+
+from features import build_future_exog
+from forecast_jobs import sarimax_fit_params, shared_fit_params
+
+ARTIFACT_FORMAT = 1
+MANIFEST_FILE = 'manifest.json'
+
+# Time-invariant system matrices and their expected number of dimensions
+SYSTEM_MATRICES = {'design': 2, 'obs_cov': 2, 'transition': 2, 'selection': 2, 'state_cov': 2, 'state_intercept': 1}
+
+
+def _preprocessor_config(preprocessor_file):
+    """
+    Read the cyclical feature configuration from a saved preprocessor, if present.
+    """
+    if not preprocessor_file or not os.path.exists(preprocessor_file):
+        return None
+    import joblib
+    preprocessor = joblib.load(preprocessor_file)
+    steps = getattr(preprocessor, 'named_steps', {})
+    encoder = steps.get('cyclic') if hasattr(steps, 'get') else None
+    if encoder is None:
+        return None
+    return {'cyclical_columns_periods': dict(encoder.cyclical_columns_periods)}
+
+
+def extract_arrays(results):
+    """
+    Extract the arrays needed for forecasting from fitted SARIMAX results.
+
+    Raises:
+        NotImplementedError: If the model has time-varying system matrices (other than the
+                             regression intercept), which the compact format does not support.
+    """
+    model = results.model
+    model.update(results.params)
+    ssm = model.ssm
+
+    arrays = {}
+    for name, ndim in SYSTEM_MATRICES.items():
+        matrix = np.asarray(ssm[name], dtype=np.float64)
+        if matrix.ndim != ndim:
+            raise NotImplementedError(f"System matrix '{name}' is time-varying; cannot export a compact artifact.")
+        arrays[name] = matrix
+
+    exog_names = list(model.exog_names or [])
+    params = pd.Series(np.asarray(results.params), index=model.param_names)
+    exog_coef = params[exog_names].to_numpy(dtype=np.float64)
+    if exog_names and not np.allclose(np.asarray(ssm['obs_intercept'])[0], model.exog @ exog_coef):
+        raise NotImplementedError("Observation intercept is not a linear regression on exog; cannot export.")
+
+    filter_results = results.filter_results
+    arrays['params'] = params.to_numpy(dtype=np.float64)
+    arrays['exog_coef'] = exog_coef
+    arrays['initial_state'] = np.asarray(filter_results.initial_state, dtype=np.float64)
+    arrays['initial_state_cov'] = np.asarray(filter_results.initial_state_cov, dtype=np.float64)
+    arrays['predicted_state'] = np.asarray(filter_results.predicted_state[:, -1], dtype=np.float64)
+    arrays['predicted_state_cov'] = np.asarray(filter_results.predicted_state_cov[:, :, -1], dtype=np.float64)
+    return arrays
+
+
+def export_artifact(results, directory, preprocessor_file='preprocessor.joblib'):
+    """
+    Write the compact serving artifact for fitted SARIMAX results to directory.
+    """
+    model = results.model
+    arrays = extract_arrays(results)
+
+    os.makedirs(directory, exist_ok=True)
+    for name, array in arrays.items():
+        np.save(os.path.join(directory, f'{name}.npy'), np.ascontiguousarray(array))
+
+    manifest = {
+        'format': ARTIFACT_FORMAT,
+        'model': 'SARIMAX',
+        'order': list(model.order),
+        'seasonal_order': list(model.seasonal_order),
+        'trend': model.trend,
+        'enforce_stationarity': bool(model.enforce_stationarity),
+        'enforce_invertibility': bool(model.enforce_invertibility),
+        'endog_name': model.endog_names,
+        'exog_names': list(model.exog_names or []),
+        'param_names': list(model.param_names),
+        'nobs': int(results.nobs),
+        'last_date': model._index[-1].isoformat(),
+        'freq': 'M',
+        'target_transform': 'log1p',
+        'preprocessor': _preprocessor_config(preprocessor_file),
+        'arrays': sorted(arrays),
+        'created_at': datetime.now(timezone.utc).isoformat()
+    }
+    # The manifest is written last and atomically, so a reader never sees a partial artifact
+    manifest_path = os.path.join(directory, MANIFEST_FILE)
+    with open(manifest_path + '.tmp', 'w') as f:
+        json.dump(manifest, f, indent=2)
+    os.replace(manifest_path + '.tmp', manifest_path)
+    logging.info(f"Compact serving artifact written to '{directory}'.")
+
+
+class CompactServingModel:
+    """
+    Serves forecasts from a compact artifact with NumPy Kalman filter recursions.
+    Offers the same interface as model_server.ServingModel: new months extend the state under
+    the stored parameters, filtered series are run through the filter from the initial state,
+    and parameters are only re-estimated (with statsmodels, imported lazily) on refit.
+    """
+
+    def __init__(self, manifest, arrays, drift_threshold=0.25, drift_window=3, fit_params=None, refit_dir=None):
+        """
+        Initializes the CompactServingModel.
+
+        Parameters:
+            manifest (dict): Model specification read from the artifact manifest.
+            arrays (dict): Arrays read from the artifact (possibly memory-mapped).
+            drift_threshold (float): Mean absolute one-step error on the log scale above which
+                                     the parameters are re-estimated.
+            drift_window (int): Number of most recently appended months used for the drift check.
+            fit_params (callable): Runs the refit fit, as in model_server.ServingModel.
+            refit_dir (str): Directory shared by the processes serving this model, as in
+                             model_server.ServingModel.
+        """
+        self.manifest = manifest
+        self.drift_threshold = drift_threshold
+        self.drift_window = drift_window
+        self.fit_params = fit_params or sarimax_fit_params
+        self.refit_dir = refit_dir
+        self.version = 1
+        self.refitting = False
+        self._recent_errors = []
+        self._lock = threading.Lock()
+        self._set_arrays(arrays, pd.Timestamp(manifest['last_date']))
+
+    def _set_arrays(self, arrays, last_date):
+        self.arrays = arrays
+        self.exog_names = self.manifest['exog_names']
+        self._state = arrays['predicted_state']
+        self._state_cov = arrays['predicted_state_cov']
+        self._last_date = last_date
+        selection = arrays['selection']
+        self._selected_state_cov = selection @ arrays['state_cov'] @ selection.T
+
+    @classmethod
+    def load(cls, directory, mmap=True, **kwargs):
+        """
+        Loads an artifact directory, memory-mapping its arrays. Returns None if it does not exist.
+        """
+        manifest_path = os.path.join(directory, MANIFEST_FILE)
+        if not os.path.exists(manifest_path):
+            logging.warning(f"Serving artifact '{directory}' not found.")
+            return None
+        with open(manifest_path, 'r') as f:
+            manifest = json.load(f)
+        if manifest.get('format') != ARTIFACT_FORMAT:
+            raise ValueError(f"Unsupported artifact format {manifest.get('format')} in '{directory}'.")
+        arrays = {name: np.load(os.path.join(directory, f'{name}.npy'), mmap_mode='r' if mmap else None)
+                  for name in manifest['arrays']}
+        logging.info(f"Compact serving artifact loaded from '{directory}' "
+                     f"(SARIMAX{tuple(manifest['order'])}x{tuple(manifest['seasonal_order'])}, "
+                     f"{manifest['nobs']} months).")
+        return cls(manifest, arrays, **kwargs)
+
+    @property
+    def last_date(self):
+        return self._last_date
+
+    @property
+    def fingerprint(self):
+        """
+        Digest of the model orders and estimated parameters, the same in every process that
+        loaded the same artifact. Changes when the parameters are re-estimated.
+        """
+        spec = repr((tuple(self.manifest['order']), tuple(self.manifest['seasonal_order']))).encode()
+        return hashlib.sha1(spec + np.asarray(self.arrays['params'], dtype=np.float64).tobytes()).hexdigest()
+
+    def _intercept(self, df_exog):
+        if not self.exog_names:
+            return np.zeros(len(df_exog))
+        return df_exog[self.exog_names].to_numpy(dtype=np.float64) @ self.arrays['exog_coef']
+
+    def _filter(self, y, intercept, state, state_cov):
+        """
+        Run the Kalman filter over y from the predicted state (state, state_cov).
+
+        Returns:
+            tuple: (predicted state, predicted state covariance, one-step forecast errors)
+        """
+        design = self.arrays['design'][0]
+        obs_var = float(self.arrays['obs_cov'][0, 0])
+        transition = self.arrays['transition']
+        state_intercept = self.arrays['state_intercept']
+        state = np.array(state, dtype=np.float64)
+        state_cov = np.array(state_cov, dtype=np.float64)
+        errors = np.empty(len(y))
+        for t in range(len(y)):
+            errors[t] = y[t] - design @ state - intercept[t]
+            if not np.isnan(y[t]):
+                cov_design = state_cov @ design
+                gain = cov_design / (design @ cov_design + obs_var)
+                state = state + gain * errors[t]
+                state_cov = state_cov - np.outer(gain, cov_design)
+            state = transition @ state + state_intercept
+            state_cov = transition @ state_cov @ transition.T + self._selected_state_cov
+        return state, state_cov, errors
+
+    def update(self, df_features):
+        """
+        Extend the state with months of df_features newer than the last modelled month,
+        keeping the stored parameters. Returns the number of months appended.
+        """
+        with self._lock:
+            new = df_features[df_features.index > self._last_date]
+            if new.empty:
+                return 0
+            state, state_cov, errors = self._filter(new['TOTAL_log'].to_numpy(dtype=np.float64),
+                                                    self._intercept(new), self._state, self._state_cov)
+            self._state, self._state_cov, self._last_date = state, state_cov, new.index[-1]
+            self.version += 1
+
+            self._recent_errors = (self._recent_errors + np.abs(errors).tolist())[-self.drift_window:]
+            drift = float(np.mean(self._recent_errors))
+            logging.info(f"Serving model extended by {len(new)} month(s) to {self._last_date:%B %Y} "
+                         f"(recent one-step error {drift:.3f}).")
+
+        if drift > self.drift_threshold:
+            logging.warning(f"Forecast error {drift:.3f} exceeds drift threshold {self.drift_threshold}; "
+                            f"scheduling a refit.")
+            self.refit_in_background(df_features)
+        return len(new)
+
+    def rebase(self, df_features):
+        """
+        Rebuild the state from df_features under the stored parameters, for when months the model
+        has already seen were revised. Costs one filter pass; no parameters are re-estimated.
+        """
+        with self._lock:
+            state, state_cov, _ = self._filter(df_features['TOTAL_log'].to_numpy(dtype=np.float64),
+                                               self._intercept(df_features), self.arrays['initial_state'],
+                                               self.arrays['initial_state_cov'])
+            self._state, self._state_cov, self._last_date = state, state_cov, df_features.index[-1]
+            self.version += 1
+        logging.info(f"Serving model state rebuilt over {len(df_features)} months.")
+
+    def refit(self, df_features=None):
+        """
+        Re-estimate the parameters on df_features (the full training series), starting from the
+        stored ones. The compact artifact holds no training data, so df_features is required.
+        The fit runs without holding the model lock; forecasts use the old parameters until the
+        new arrays are swapped in.
+        """
+        if df_features is None:
+            raise ValueError("The compact serving model needs the training series to refit.")
+        from statsmodels.tsa.statespace.sarimax import SARIMAX
+
+        spec = {name: self.manifest[name] for name in
+                ('order', 'seasonal_order', 'trend', 'enforce_stationarity', 'enforce_invertibility')}
+        endog = df_features['TOTAL_log'].to_numpy(dtype=np.float64)
+        exog = df_features[self.exog_names].to_numpy(dtype=np.float64) if self.exog_names else None
+        logging.info(f"Refitting serving model SARIMAX{tuple(spec['order'])}x{tuple(spec['seasonal_order'])} "
+                     f"on {len(df_features)} months.")
+        params = shared_fit_params(self.refit_dir, self.fit_params, endog, exog, spec,
+                                   np.asarray(self.arrays['params']))
+
+        # Only the filter output of the new parameters is exported, so one filter pass suffices
+        model = SARIMAX(df_features['TOTAL_log'], exog=df_features[self.exog_names] if self.exog_names else None,
+                        order=tuple(spec['order']), seasonal_order=tuple(spec['seasonal_order']),
+                        trend=spec['trend'], enforce_stationarity=spec['enforce_stationarity'],
+                        enforce_invertibility=spec['enforce_invertibility'])
+        arrays = extract_arrays(model.filter(np.asarray(params)))
+        with self._lock:
+            self._set_arrays(arrays, df_features.index[-1])
+            self.version += 1
+            self._recent_errors = []
+        logging.info("Serving model refit completed.")
+
+    def refit_in_background(self, df_features=None):
+        """
+        Start a refit on a daemon thread unless one is already running.
+        """
+        with self._lock:
+            if self.refitting:
+                return False
+            self.refitting = True
+
+        def run():
+            try:
+                self.refit(df_features)
+            except Exception:
+                logging.exception("Serving model refit failed.")
+            finally:
+                self.refitting = False
+
+        threading.Thread(target=run, name='serving-model-refit', daemon=True).start()
+        return True
+
+    def _state_for(self, df_features, extend):
+        """
+        Return the predicted (state, covariance) for the month after the last month of df_features.
+        """
+        if extend and df_features.index[-1] >= self._last_date:
+            self.update(df_features)
+            return self._state, self._state_cov
+        state, state_cov, _ = self._filter(df_features['TOTAL_log'].to_numpy(dtype=np.float64),
+                                           self._intercept(df_features), self.arrays['initial_state'],
+                                           self.arrays['initial_state_cov'])
+        return state, state_cov
+
+    def _forecast(self, df_features, steps, extend):
+        state, state_cov = self._state_for(df_features, extend)
+        intercept = self._intercept(build_future_exog(df_features, steps=steps))
+        design = self.arrays['design'][0]
+        obs_var = float(self.arrays['obs_cov'][0, 0])
+        transition = self.arrays['transition']
+        state_intercept = self.arrays['state_intercept']
+        mean = np.empty(steps)
+        variance = np.empty(steps)
+        for h in range(steps):
+            mean[h] = design @ state + intercept[h]
+            variance[h] = design @ state_cov @ design + obs_var
+            state = transition @ state + state_intercept
+            state_cov = transition @ state_cov @ transition.T + self._selected_state_cov
+        return mean, variance
+
+    def forecast(self, df_features, steps=1, extend=False):
+        """
+        Forecast the steps months following df_features on the sales scale.
+        """
+        mean, _ = self._forecast(df_features, steps, extend)
+        return np.expm1(mean)
+
+    def forecast_interval(self, df_features, steps=1, alpha=0.05, extend=False):
+        """
+        Forecast the steps months following df_features with (1 - alpha) confidence intervals.
+
+        Returns:
+            tuple: (mean, lower, upper) arrays on the sales scale.
+        """
+        mean, variance = self._forecast(df_features, steps, extend)
+        half_width = NormalDist().inv_cdf(1 - alpha / 2) * np.sqrt(variance)
+        return np.expm1(mean), np.expm1(mean - half_width), np.expm1(mean + half_width)
+
+
+if __name__ == '__main__':
+    if len(sys.argv) != 3:
+        print("Usage: python model_artifact.py <sarimax_model.pkl> <artifact directory>")
+        sys.exit(1)
+    import joblib
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s %(levelname)s %(message)s')
+    export_artifact(joblib.load(sys.argv[1]), sys.argv[2])
@@ -0,0 +1,196 @@
+# model_server.py
+
+import hashlib
+import logging
+import os
+import threading
+
+import joblib
+import numpy as np
+
+from features import EXOG_COLUMNS, build_future_exog
+from forecast_jobs import sarimax_fit_params, shared_fit_params
+
+
+class ServingModel:
+    """
+    Serves forecasts from the SARIMAX results persisted by train_model.save_model.
+    The estimated parameters are reused for every request; new months only extend the
+    model's state, and parameters are re-estimated on an explicit refit or when the
+    one-step forecast error of newly appended months drifts past a threshold.
+    """
+
+    def __init__(self, results, drift_threshold=0.25, drift_window=3, fit_params=None, refit_dir=None):
+        """
+        Initializes the ServingModel.
+
+        Parameters:
+            results (SARIMAXResults): Fitted results loaded from the training pipeline.
+            drift_threshold (float): Mean absolute one-step error on the log scale above which
+                                     the parameters are re-estimated.
+            drift_window (int): Number of most recently appended months used for the drift check.
+            fit_params (callable): Runs forecast_jobs.sarimax_fit_params(endog, exog, spec,
+                                   start_params) for a refit, e.g. on a worker pool; by default
+                                   the fit runs in the calling thread.
+            refit_dir (str): Directory shared by the processes serving this model, so that only
+                             one of them fits a refit (see forecast_jobs.shared_fit_params).
+        """
+        self.results = results
+        self.drift_threshold = drift_threshold
+        self.drift_window = drift_window
+        self.fit_params = fit_params or sarimax_fit_params
+        self.refit_dir = refit_dir
+        self.version = 1
+        self.refitting = False
+        self._recent_errors = []
+        self._lock = threading.Lock()
+
+    @classmethod
+    def load(cls, filename='sarimax_model.pkl', **kwargs):
+        """
+        Loads the persisted results object, or returns None if the file does not exist.
+        """
+        if not os.path.exists(filename):
+            logging.warning(f"Serving model file '{filename}' not found.")
+            return None
+        results = joblib.load(filename)
+        logging.info(f"Serving model loaded from '{filename}' "
+                     f"(SARIMAX{results.model.order}x{results.model.seasonal_order}, {results.nobs} months).")
+        return cls(results, **kwargs)
+
+    @property
+    def last_date(self):
+        return self.results.model._index[-1]
+
+    @property
+    def fingerprint(self):
+        """
+        Digest of the model orders and estimated parameters, the same in every process that
+        loaded the same model. Changes when the parameters are re-estimated.
+        """
+        model = self.results.model
+        spec = repr((model.order, model.seasonal_order)).encode()
+        return hashlib.sha1(spec + np.asarray(self.results.params, dtype=np.float64).tobytes()).hexdigest()
+
+    def update(self, df_features):
+        """
+        Extend the model state with months of df_features newer than the last modelled month,
+        keeping the existing parameters. Returns the number of months appended.
+        """
+        with self._lock:
+            new = df_features[df_features.index > self.last_date]
+            if new.empty:
+                return 0
+
+            self.results = self.results.append(new['TOTAL_log'], exog=new[EXOG_COLUMNS], refit=False)
+            self.version += 1
+
+            # One-step-ahead predictions for the appended months come from the filter, so the
+            # residuals measure how well the current parameters explain the new data
+            errors = np.abs(np.asarray(self.results.resid)[-len(new):])
+            self._recent_errors = (self._recent_errors + errors.tolist())[-self.drift_window:]
+            drift = float(np.mean(self._recent_errors))
+            logging.info(f"Serving model extended by {len(new)} month(s) to {self.last_date:%B %Y} "
+                         f"(recent one-step error {drift:.3f}).")
+
+        if drift > self.drift_threshold:
+            logging.warning(f"Forecast error {drift:.3f} exceeds drift threshold {self.drift_threshold}; "
+                            f"scheduling a refit.")
+            self.refit_in_background()
+        return len(new)
+
+    def rebase(self, df_features):
+        """
+        Rebuild the model state from df_features under the existing parameters, for when months
+        the model has already seen were revised. Costs one filter pass; no parameters are re-estimated.
+        """
+        with self._lock:
+            self.results = self.results.apply(df_features['TOTAL_log'], exog=df_features[EXOG_COLUMNS], refit=False)
+            self.version += 1
+        logging.info(f"Serving model state rebuilt over {len(df_features)} months.")
+
+    def refit(self, df_features=None):
+        """
+        Re-estimate the parameters on all modelled months, starting from the current ones.
+        Months of df_features newer than the last modelled month are appended first. The fit
+        runs without holding the model lock, so forecasts carry on with the old parameters until
+        the new ones are swapped in.
+        """
+        with self._lock:
+            if df_features is not None:
+                new = df_features[df_features.index > self.last_date]
+                if not new.empty:
+                    self.results = self.results.append(new['TOTAL_log'], exog=new[EXOG_COLUMNS], refit=False)
+            results = self.results
+
+        model = results.model
+        spec = {'order': model.order, 'seasonal_order': model.seasonal_order, 'trend': model.trend,
+                'enforce_stationarity': model.enforce_stationarity,
+                'enforce_invertibility': model.enforce_invertibility}
+        logging.info(f"Refitting serving model SARIMAX{model.order}x{model.seasonal_order} "
+                     f"on {results.nobs} months.")
+        params = shared_fit_params(self.refit_dir, self.fit_params, np.asarray(model.endog).ravel(),
+                                   model.exog, spec, np.asarray(results.params))
+
+        with self._lock:
+            # Months appended while the fit ran are kept: the new parameters are applied to the
+            # current model, which costs one smoother pass
+            self.results = self.results.model.smooth(np.asarray(params))
+            self.version += 1
+            self._recent_errors = []
+        logging.info("Serving model refit completed.")
+
+    def refit_in_background(self, df_features=None):
+        """
+        Start a refit on a daemon thread unless one is already running.
+        """
+        with self._lock:
+            if self.refitting:
+                return False
+            self.refitting = True
+
+        def run():
+            try:
+                self.refit(df_features)
+            except Exception:
+                logging.exception("Serving model refit failed.")
+            finally:
+                self.refitting = False
+
+        threading.Thread(target=run, name='serving-model-refit', daemon=True).start()
+        return True
+
+    def _results_for(self, df_features, extend):
+        """
+        Return results whose state ends at the last month of df_features.
+
+        With extend=True df_features is the series the model was trained on and the model state
+        is extended with its new months. Otherwise (e.g. a filtered series) the persisted
+        parameters are applied to df_features without re-estimation.
+        """
+        if extend and df_features.index[-1] >= self.last_date:
+            self.update(df_features)
+            return self.results
+        return self.results.apply(df_features['TOTAL_log'], exog=df_features[EXOG_COLUMNS], refit=False)
+
+    def forecast(self, df_features, steps=1, extend=False):
+        """
+        Forecast the steps months following df_features on the sales scale.
+        """
+        future_exog = build_future_exog(df_features, steps=steps)
+        forecast_log = self._results_for(df_features, extend).forecast(steps=steps, exog=future_exog)
+        return np.expm1(np.asarray(forecast_log))
+
+    def forecast_interval(self, df_features, steps=1, alpha=0.05, extend=False):
+        """
+        Forecast the steps months following df_features with (1 - alpha) confidence intervals.
+
+        Returns:
+            tuple: (mean, lower, upper) arrays on the sales scale.
+        """
+        future_exog = build_future_exog(df_features, steps=steps)
+        prediction = self._results_for(df_features, extend).get_forecast(steps=steps, exog=future_exog)
+        conf_int = np.asarray(prediction.conf_int(alpha=alpha))
+        return (np.expm1(np.asarray(prediction.predicted_mean)),
+                np.expm1(conf_int[:, 0]),
+                np.expm1(conf_int[:, 1]))
@@ -1,12 +1,25 @@
-import pandas as pd
-import numpy as np
-from flask import Flask, request, jsonify
-from sqlalchemy import create_engine, text
+from flask import Flask, request, jsonify, url_for, Response
 from flask_cors import CORS
 from functools import wraps
+import atexit
+import hashlib
 import logging
 import json
-from statsmodels.tsa.statespace.sarimax import SARIMAX
+import os
+import pstats
+import random
+import threading
+import time
+from config import Config
+from forecast_cache import ForecastCache
+from single_flight import SingleFlight
+from instrumentation import registry, stage, timed, begin_request, end_request, REQUEST_SECONDS
+from forecast_jobs import (ForecastJobManager, JobQueueFull, sarimax_fit_params, sarimax_forecast,
+                          sarimax_forecast_interval)
+from profiling import ProfileStore
+
+# pandas, numpy, statsmodels and SQLAlchemy are imported by warm_up() and inside the functions
+# that need them, so importing this module (and answering '/') does not wait for them
 
 app = Flask(__name__)
 CORS(app)  # Enable CORS for all routes
@@ -15,21 +28,93 @@ CORS(app)  # Enable CORS for all routes
 # Configuration
 # ================================
 
-# Database configuration
-DB_HOST = 'localhost'       # Your database host
-DB_PORT = '3306'            # Default MySQL port
-DB_USER = 'root'            # Your database username
-DB_PASSWORD = ''            # Your database password
-DB_NAME = 'dbcapstone'      # Your database name
+# Database configuration and API key come from config.Config (environment variables)
+DATABASE_URI = Config.DATABASE_URI
+API_KEY = Config.API_KEY
+
+# Forecast cache configuration
+CACHE_MAX_ENTRIES = 128     # Maximum number of cached forecasts
+CACHE_TTL_SECONDS = 3600    # Seconds before a cached forecast expires
+
+# Initialize the in-process forecast cache
+forecast_cache = ForecastCache(max_entries=CACHE_MAX_ENTRIES, ttl_seconds=CACHE_TTL_SECONDS)
+
+# Serving configuration
+SERVING_MODE = 'persisted'              # 'persisted' serves the trained model file; 'refit' fits a model per request
+SERVING_MODEL_FILE = 'sarimax_model.pkl'
+SERVING_ARTIFACT_DIR = 'sarimax_serving'  # Compact artifact exported by train_model; preferred over the pickle
+DRIFT_THRESHOLD = 0.25                  # Mean absolute one-step log error on new months that triggers a refit
+REFIT_TIMEOUT_SECONDS = 300             # Seconds a serving model refit may run on the job pool
+
+# Per-request model used when no persisted model is served
+SARIMAX_ORDER = (1, 1, 1)
+SARIMAX_SEASONAL_ORDER = (1, 1, 1, 12)
+SARIMAX_FIT_TIMEOUT = 120   # Seconds a per-request fit may run before it is abandoned
+MIN_SARIMAX_MONTHS = 2 * SARIMAX_SEASONAL_ORDER[3]  # Shorter series are answered by the fallback model
+
+# Latency budget configuration
+PREDICT_BUDGET_SECONDS = 8          # Default /predict budget; the PHP dashboard gives up after 10 seconds
+PREDICT_MAX_BUDGET_SECONDS = 60     # Largest budget a client may ask for
+
+# HTTP caching of /predict: clients and proxies may store forecasts but revalidate them with
+# If-None-Match, which is answered from in-memory state. Stale answers and fallbacks standing in
+# for a SARIMAX forecast are not stored.
+PREDICT_CACHE_CONTROL = 'public, no-cache'
+
+# Forecast job configuration
+JOB_WORKERS = 2             # Worker processes for background model fits
+JOB_MAX_PENDING = 8         # Maximum number of queued or running forecast jobs
+PRECOMPUTE_WORKERS = 1      # Worker processes for precomputed forecasts, apart from the request pool
+
+# Batch forecast configuration
+BATCH_MAX_FILTERS = 50      # Maximum number of filter sets in one /predict/batch request
+BATCH_MAX_HORIZON = 24      # Maximum number of months forecast per filter set
+BATCH_ALPHA = 0.05          # Significance level of the returned confidence intervals
+BATCH_TIMEOUT_SECONDS = 120  # Longest a batch request waits for its model fits
 
-# API Key for authentication
-API_KEY = 'testkey123'  # Replace with your actual API key
+# Inventory forecast configuration
+INVENTORY_HORIZON_DAYS = 90         # Default number of days simulated by /forecast/inventory
+INVENTORY_MAX_HORIZON_DAYS = 365    # Largest horizon a client may ask for
+INVENTORY_PATHS = 2000              # Default number of simulated demand paths
+INVENTORY_MAX_PATHS = 10000         # Largest number of paths a client may ask for
+INVENTORY_HISTORY_WEEKS = 12        # Weeks of recent usage the demand paths are drawn from
 
-# Create a database connection string
-DATABASE_URI = f'mysql+pymysql://{DB_USER}:{DB_PASSWORD}@{DB_HOST}:{DB_PORT}/{DB_NAME}'
+# Profiling configuration
+PROFILE_FLAGS = ('1', 'true', 'yes')   # Values of the 'profile' parameter or X-Profile header that ask for a profile
+PROFILE_REPORT_LIMIT = 50             # Default number of functions in a text profile report
 
-# Initialize SQLAlchemy engine
-engine = create_engine(DATABASE_URI)
+# Monitoring configuration
+SLOW_REQUEST_SECONDS = 2.0  # Requests slower than this are logged with their stage breakdown
+
+# Warm-up configuration
+WARM_UP_WAIT_SECONDS = 30   # Longest a request waits for the warm-up before answering 503
+
+# Initialize the background forecast executor and the store of last good forecasts per filter
+forecast_jobs = ForecastJobManager(max_workers=JOB_WORKERS, max_pending=JOB_MAX_PENDING,
+                                   status_dir=Config.JOB_STATUS_DIR)
+last_good_forecasts = ForecastCache(max_entries=1024, ttl_seconds=float('inf'))
+
+# Fits of the forecast precomputation run on their own pool, so a run never queues /predict's
+# fits behind hundreds of its own
+precompute_jobs = ForecastJobManager(max_workers=PRECOMPUTE_WORKERS, max_pending=PRECOMPUTE_WORKERS)
+
+# Identical /predict requests that arrive while one is being computed share its result
+predict_flight = SingleFlight()
+
+# Bounded on-disk ring of cProfile captures, shared with train_model --profile
+profile_store = ProfileStore(Config.PROFILE_DIR, max_profiles=Config.PROFILE_MAX_FILES)
+
+# Created by warm_up():
+engine = None               # SQLAlchemy engine with the configured connection pool
+prediction_writer = None    # Buffers prediction rows and writes them in batches off the request path
+change_detector = None      # Polls per-month watermarks so caches and the model follow data changes
+aggregate_features = None   # Features of the unfiltered series, kept so new months only extend them
+service_forecaster = None   # Per-service forecaster, which shares the forecast worker pool
+metrics = None              # Model evaluation metrics from 'model_metrics.json'
+dashboard_aggregates = None  # In-memory dashboard rollups, built by the first /dashboard/aggregates request
+serving_model = None        # Persisted SARIMAX model in 'persisted' serving mode
+forecast_precomputer = None  # Stores the forecasts of every dashboard filter in forecast_lookup
+precompute_scheduler = None  # Runs the precomputer off-peak and after model changes
 
 # ================================
 # Logging Configuration
@@ -38,7 +123,7 @@ engine = create_engine(DATABASE_URI)
 logging.basicConfig(level=logging.INFO,
                     format='%(asctime)s %(levelname)s %(message)s',
                     handlers=[
-                        logging.FileHandler("api.log"),
+                        logging.FileHandler(Config.LOG_FILE),
                         logging.StreamHandler()
                     ])
 
@@ -59,84 +144,424 @@ def load_model_metrics():
         logging.error("Model metrics file 'model_metrics.json' not found.")
         return None
 
-# Load metrics at the start of the application
-metrics = load_model_metrics()
+def fit_serving_params(endog, exog, spec, start_params):
+    """
+    Re-estimate the serving model's parameters on the forecast job pool, so the fit neither
+    holds this process's GIL nor blocks request threads.
+    """
+    (params, error), = forecast_jobs.run_batch(
+        sarimax_fit_params, [(endog, exog, spec, start_params, REFIT_TIMEOUT_SECONDS)],
+        timeout=REFIT_TIMEOUT_SECONDS + 30)
+    if error is not None:
+        raise RuntimeError(f"Serving model refit failed: {error}")
+    return params
+
+def load_serving_model():
+    """
+    Load the persisted SARIMAX model once at startup when running in 'persisted' serving mode.
+    The compact artifact is preferred; the full results pickle is used when no artifact exists.
+    """
+    if SERVING_MODE != 'persisted':
+        logging.info("Serving mode 'refit': a model will be fitted for every request.")
+        return None
+    from model_artifact import CompactServingModel
+    from model_server import ServingModel
+    # Refits run on the job pool, and only one of the server's worker processes fits each one
+    options = {'drift_threshold': DRIFT_THRESHOLD, 'fit_params': fit_serving_params,
+               'refit_dir': Config.JOB_STATUS_DIR}
+    try:
+        if os.path.isdir(SERVING_ARTIFACT_DIR):
+            return CompactServingModel.load(SERVING_ARTIFACT_DIR, **options)
+    except Exception as e:
+        logging.error(f"Could not load serving artifact '{SERVING_ARTIFACT_DIR}', trying '{SERVING_MODEL_FILE}': {e}")
+    try:
+        return ServingModel.load(SERVING_MODEL_FILE, **options)
+    except Exception as e:
+        logging.error(f"Could not load serving model '{SERVING_MODEL_FILE}', falling back to per-request fits: {e}")
+        return None
+
+# ================================
+# Warm-up
+# ================================
+
+_warm_up_lock = threading.Lock()          # Held while warm_up() runs
+_warm_up_thread_lock = threading.Lock()   # Guards starting the background warm-up thread
+_warm_up_done = threading.Event()
+_warm_up_thread = None
+warm_up_state = {'status': 'cold', 'seconds': None, 'error': None}
+
+def warm_up(take_snapshot=True):
+    """
+    Import the numeric libraries, create the database engine and background components, and load
+    the model metrics and serving model. Only the first call does the work; others wait for it.
+    With take_snapshot the change detector's first snapshot is taken too (and its polling started).
+    """
+    global engine, prediction_writer, change_detector, aggregate_features, service_forecaster
+    global metrics, serving_model, dashboard_aggregates, forecast_precomputer, precompute_scheduler
+    with _warm_up_lock:
+        if _warm_up_done.is_set():
+            return
+        started = time.perf_counter()
+        warm_up_state['status'] = 'warming'
+        try:
+            from change_detector import ChangeDetector
+            from dashboard_aggregates import DashboardAggregates
+            from features import FeatureEngine
+            from forecast_precompute import ForecastPrecomputer, PrecomputeScheduler
+            from prediction_writer import PredictionWriter
+            from sales_data import create_db_engine
+            from service_forecast import ServiceForecaster
 
+            engine = create_db_engine(Config)
+            prediction_writer = PredictionWriter(engine, flush_rows=Config.PREDICTION_FLUSH_ROWS,
+                                                 flush_seconds=Config.PREDICTION_FLUSH_SECONDS)
+            atexit.register(prediction_writer.close)
+            change_detector = ChangeDetector(engine, interval_seconds=Config.CHANGE_POLL_SECONDS)
+            change_detector.subscribe(on_data_change)
+            atexit.register(change_detector.stop)
+            aggregate_features = FeatureEngine()
+            dashboard_aggregates = DashboardAggregates(engine, refresh_seconds=Config.DASHBOARD_REFRESH_SECONDS,
+                                                       recheck_seconds=Config.DASHBOARD_RECHECK_SECONDS)
+            service_forecaster = ServiceForecaster(forecast_jobs, SARIMAX_ORDER, SARIMAX_SEASONAL_ORDER,
+                                                   fit_timeout=SARIMAX_FIT_TIMEOUT,
+                                                   batch_timeout=BATCH_TIMEOUT_SECONDS)
+            metrics = load_model_metrics()
+            serving_model = load_serving_model()
+            forecast_precomputer = ForecastPrecomputer(engine, change_detector, forecast_filters, model_fingerprint,
+                                                       prediction_writer=prediction_writer)
+            precompute_scheduler = PrecomputeScheduler(forecast_precomputer, hours=Config.PRECOMPUTE_HOURS,
+                                                       check_seconds=Config.PRECOMPUTE_CHECK_SECONDS)
+            atexit.register(precompute_scheduler.stop)
+        except Exception as e:
+            logging.exception("Warm-up failed.")
+            warm_up_state.update(status='failed', error=str(e))
+            raise
+
+        # The first data snapshot is taken here when the database is reachable; otherwise the
+        # first request takes it
+        try:
+            if take_snapshot:
+                change_detector.start()
+        except Exception as e:
+            logging.warning(f"Could not take the first data snapshot during warm-up: {e}")
+        # Forked workers (take_snapshot=False) leave the precomputation to one process: the
+        # cron job on gunicorn hosts, or the scheduler of a single-process server
+        if take_snapshot and Config.PRECOMPUTE_HOURS:
+            precompute_scheduler.start()
+
+        warm_up_state.update(status='ready', seconds=round(time.perf_counter() - started, 3), error=None)
+        _warm_up_done.set()
+        logging.info(f"Warm-up completed in {warm_up_state['seconds']}s.")
+
+def start_warm_up():
+    """
+    Run warm_up() on a background thread, so the server can accept requests meanwhile.
+    """
+    global _warm_up_thread
+    with _warm_up_thread_lock:
+        if _warm_up_done.is_set() or (_warm_up_thread is not None and _warm_up_thread.is_alive()):
+            return
+        _warm_up_thread = threading.Thread(target=_run_warm_up, name='warm-up', daemon=True)
+        _warm_up_thread.start()
+
+def _run_warm_up():
+    try:
+        warm_up()
+    except Exception:
+        pass    # Already logged and reported by /ready; the next request retries
+
+def ensure_warm(timeout=WARM_UP_WAIT_SECONDS):
+    """
+    Wait up to timeout seconds for the warm-up, running it in this thread if none is in progress.
+    Returns True once the service is warm.
+    """
+    if _warm_up_done.is_set():
+        return True
+    thread = _warm_up_thread
+    if thread is not None and thread.is_alive():
+        return _warm_up_done.wait(timeout)
+    warm_up()
+    return True
+
+def require_warm(f):
+    """
+    Decorator making an endpoint wait for the warm-up, answering 503 if it takes too long.
+    """
+    @wraps(f)
+    def decorated(*args, **kwargs):
+        try:
+            with stage('warm_up_wait'):
+                warm = ensure_warm()
+        except Exception as e:
+            return jsonify({'error': f'The service failed to warm up: {str(e)}'}), 503
+        if not warm:
+            response = jsonify({'error': 'The service is warming up; retry shortly.'})
+            response.headers['Retry-After'] = '5'
+            return response, 503
+        return f(*args, **kwargs)
+    return decorated
+
+def model_version():
+    """
+    Version of the model answering requests; changes whenever the serving model is extended or refit.
+    """
+    return serving_model.version if serving_model is not None else 0
+
+def model_fingerprint():
+    """
+    Identity of the model answering /predict that is the same in every process: the serving
+    model's parameter digest, or the fixed orders fitted per request in 'refit' mode.
+    """
+    if serving_model is None:
+        return f"refit-{SARIMAX_ORDER}-{SARIMAX_SEASONAL_ORDER}"
+    return serving_model.fingerprint
+
+def forecast_version():
+    """
+    Version of the model behind cached forecasts and their ETags. It is built from
+    model_fingerprint(), so every worker process agrees on it: a forecast depends only on the
+    model parameters and the data, which the watermark covers, however far each process has
+    extended its own copy of the model state.
+    """
+    return model_fingerprint()
+
+@timed('fetch')
 def fetch_sales_data(year=None, month=None, day=None):
     """
-    Fetch historical sales data from the database.
+    Fetch historical monthly sales totals. Once the change detector has a snapshot, series not
+    filtered by day are read from it; day filters are aggregated by the database.
     """
-    query = "SELECT DATE, TOTAL FROM laundry"
-    conditions = []
-    params = {}
+    from sales_data import fetch_monthly_sales
 
-    if year:
-        conditions.append("YEAR(DATE) = :year")
-        params['year'] = year
-    if month:
-        conditions.append("MONTH(DATE) = :month")
-        params['month'] = month
-    if day:
-        conditions.append("DAY(DATE) = :day")
-        params['day'] = day
+    if day is None and change_detector.ready:
+        return change_detector.monthly_sales(year, month)
+    return fetch_monthly_sales(engine, year, month, day)
 
-    if conditions:
-        query += " WHERE " + " AND ".join(conditions)
+def data_watermark(year=None, month=None, day=None):
+    """
+    Watermark of the data behind the filters, from the change detector's in-memory snapshot.
+    It only changes when a month the filters cover changes, so cached forecasts of other
+    filters stay valid.
+    """
+    return change_detector.watermark(year, month, day)
 
-    logging.info(f"Executing query: {query} with params: {params}")
-    df = pd.read_sql(text(query), engine, params=params)
-    return df
+def update_serving_model(changed_months):
+    """
+    Bring the serving model up to date with changed months of the unfiltered series: new months
+    extend its state, revisions of months it has already seen rebuild the state.
+    """
+    _, _, df_features = prepare_data(change_detector.monthly_sales(), aggregate_features)
+    if df_features is None:
+        return
+    last_month = (serving_model.last_date.year, serving_model.last_date.month)
+    if min(changed_months) <= last_month:
+        serving_model.rebase(df_features)
+    else:
+        serving_model.update(df_features)
 
-def prepare_data(df):
+def on_data_change(changed_months):
     """
-    Prepare data for SARIMAX.
+    Change detector listener: drop the cached forecasts whose filters cover a changed month and
+    update the serving model. Runs on the detector's polling thread.
     """
-    if df.empty:
-        logging.warning("No data available for the given filters.")
-        return None, None, None, None
+    from change_detector import month_matches
 
-    df['DATE'] = pd.to_datetime(df['DATE'])
-    df.set_index('DATE', inplace=True)
-    monthly_sales = df['TOTAL'].resample('M').sum()
+    invalidated = forecast_cache.invalidate(
+        lambda key: any(month_matches(changed, key[0], key[1]) for changed in changed_months))
+    logging.info(f"Invalidated {invalidated} cached forecast(s) after a data change.")
+    if serving_model is not None:
+        update_serving_model(changed_months)
 
-    all_months = pd.date_range(start=monthly_sales.index.min(), end=monthly_sales.index.max(), freq='M')
-    monthly_sales = monthly_sales.reindex(all_months, fill_value=0)
+@timed('prepare')
+def prepare_data(df, feature_engine=None):
+    """
+    Prepare data for SARIMAX: the monthly sales series and its features.
+
+    Parameters:
+        df (DataFrame): Monthly sales with 'DATE' and 'TOTAL' columns.
+        feature_engine (FeatureEngine): Engine to update incrementally; a new one is used if None.
+
+    Returns:
+        tuple: (sales array, label of the next period, feature frame indexed by month end)
+    """
+    import pandas as pd
+    from features import FeatureEngine
 
-    monthly_sales = monthly_sales.reset_index()
-    monthly_sales.rename(columns={'index': 'DATE', 'TOTAL': 'TOTAL'}, inplace=True)
+    if df.empty:
+        logging.warning("No data available for the given filters.")
+        return None, None, None
 
-    monthly_sales.sort_values('DATE', inplace=True)
-    y = monthly_sales['TOTAL'].values
+    totals = pd.Series(df['TOTAL'].to_numpy(dtype=float), index=pd.to_datetime(df['DATE']))
+    if feature_engine is None:
+        feature_engine = FeatureEngine.from_totals(totals)
+    else:
+        feature_engine.update(totals)
+    df_features = feature_engine.frame()
+    y = df_features['TOTAL'].to_numpy()
 
-    last_date = monthly_sales['DATE'].max()
+    last_date = df_features.index[-1]
     next_period_date = last_date + pd.DateOffset(months=1)
     next_period_label = next_period_date.strftime('%B %Y')
 
     logging.info(f"Prepared data for SARIMAX. Next period to predict: {next_period_label}")
 
-    return y, next_period_label, monthly_sales
+    return y, next_period_label, df_features
+
+def save_prediction_to_db(prediction_date, predicted_sales):
+    """
+    Queues the predicted sales for the write-behind buffer, which saves it to the database.
+    """
+    prediction_writer.put(prediction_date, predicted_sales)
+    logging.info(f"Queued prediction for {prediction_date}: ₱ {predicted_sales}")
+
+def save_predictions_to_db(predictions):
+    """
+    Queues several predicted sales for the write-behind buffer.
+
+    Parameters:
+        predictions (dict): Mapping of prediction date to predicted sales.
+    """
+    prediction_writer.put_many(predictions)
+    logging.info(f"Queued {len(predictions)} predictions.")
+
+def record_forecast(filter_key, watermark, prediction_date, next_period_label, forecast_value, forecast_engine):
+    """
+    Save a new forecast to the database and the caches, returning the forecast result.
+    """
+    predicted_sales = round(float(max(forecast_value, 0)), 2)
+    logging.info(f"Predicted sales for {next_period_label}: ₱ {predicted_sales}")
+
+    save_prediction_to_db(prediction_date, predicted_sales)
 
-def train_model_sarimax(y):
+    forecast_result = {
+        'predicted_sales': predicted_sales,
+        'next_period': next_period_label,
+        'engine': forecast_engine
+    }
+    forecast_cache.put(filter_key + watermark + (forecast_version(),), forecast_result)
+    last_good_forecasts.put(filter_key, forecast_result)
+    return forecast_result
+
+def lookup_forecast(filter_key):
     """
-    Train a SARIMAX model.
+    Return the precomputed forecast of filter_key from forecast_lookup, or None if there is none
+    for the current data and model.
     """
     try:
-        model = SARIMAX(y, order=(1, 1, 1), seasonal_order=(1, 1, 1, 12))
-        model_fit = model.fit(disp=False)
-        logging.info("SARIMAX model trained successfully.")
-        return model_fit
-    except Exception as e:
-        logging.error(f"Error training SARIMAX model: {str(e)}")
-        raise
+        with stage('lookup'):
+            return forecast_precomputer.lookup(filter_key, change_detector.digest(*filter_key), model_fingerprint())
+    except Exception:
+        logging.exception("Reading the precomputed forecast failed; computing it instead.")
+        return None
 
-def save_prediction_to_db(prediction_date, predicted_sales):
+def forecast_filters(items):
+    """
+    Forecast the next month of every (filter key, monthly sales) item the way /predict does, for
+    the precomputed forecast lookup. In 'refit' serving mode the SARIMAX fits run on the
+    precomputation's own worker pool; the persisted model forecasts in this process.
+
+    Returns:
+        list: (prediction date, forecast result) per item, or None where the series is empty or
+              the forecast failed.
+    """
+    import pandas as pd
+    from fallback_forecast import fallback_forecast
+
+    results = [None] * len(items)
+    fits = []
+    for index, (filter_key, df) in enumerate(items):
+        try:
+            y, next_period_label, df_features = prepare_data(
+                df, aggregate_features if filter_key == (None, None, None) else None)
+            if y is None:
+                continue
+            prediction_date = df_features.index[-1] + pd.DateOffset(months=1)
+            if len(y) < MIN_SARIMAX_MONTHS:
+                forecast, forecast_engine = fallback_forecast(y, steps=1)
+            elif serving_model is not None:
+                forecast = serving_model.forecast(df_features, steps=1, extend=filter_key == (None, None, None))
+                forecast_engine = 'sarimax-persisted'
+            else:
+                fits.append((index, y, prediction_date, next_period_label))
+                continue
+            results[index] = (prediction_date, {
+                'predicted_sales': round(float(max(forecast[0], 0)), 2),
+                'next_period': next_period_label,
+                'engine': forecast_engine
+            })
+        except Exception as e:
+            logging.warning(f"Precomputing the forecast of {filter_key} failed: {e}")
+
+    outcomes = precompute_jobs.run_batch(
+        sarimax_forecast, [(y, SARIMAX_ORDER, SARIMAX_SEASONAL_ORDER, 1, SARIMAX_FIT_TIMEOUT) for _, y, _, _ in fits])
+    for (index, _, prediction_date, next_period_label), (forecast, error) in zip(fits, outcomes):
+        if error is not None:
+            logging.warning(f"Precomputing the forecast of {items[index][0]} failed: {error}")
+            continue
+        results[index] = (prediction_date, {
+            'predicted_sales': round(float(max(forecast[0], 0)), 2),
+            'next_period': next_period_label,
+            'engine': 'sarimax-refit'
+        })
+    return results
+
+def forecast_etag(filter_key):
+    """
+    Entity tag of the /predict response for filter_key. It changes when the data behind the
+    filters or the model answering them changes, and is built without touching the database
+    (the watermark comes from the change detector's snapshot) or running the model. Returns
+    None if no snapshot can be taken.
+    """
+    try:
+        version = (filter_key, data_watermark(*filter_key), forecast_version())
+    except Exception:
+        logging.exception("Could not compute the forecast ETag; answering without one.")
+        return None
+    return hashlib.sha1(repr(version).encode()).hexdigest()[:20]
+
+def forecast_payload(forecast_result, cache_status, **extra):
+    """
+    Build the /predict JSON body for a forecast result.
+    """
+    latest_mae = metrics.get('mae') if metrics else None
+    latest_mse = metrics.get('mse') if metrics else None
+    latest_r2 = metrics.get('r2') if metrics else None
+
+    return {
+        'predicted_sales': forecast_result['predicted_sales'],
+        'next_period': forecast_result['next_period'],
+        'mae': latest_mae,
+        'mse': latest_mse,
+        'r2': latest_r2,
+        'cache': cache_status,
+        'engine': forecast_result['engine'],
+        **extra
+    }
+
+def forecast_response(forecast_result, cache_status, **extra):
+    """
+    Build the /predict JSON response for a forecast result.
+    """
+    return jsonify(forecast_payload(forecast_result, cache_status, **extra)), 200
+
+def fallback_response(y, next_period_label, reason, **extra):
     """
-    Saves the predicted sales to the database.
+    Build the /predict response from the closed-form fallback model, for when SARIMAX cannot
+    answer within the request's budget. The result is not cached: the SARIMAX forecast, if one
+    is still running, replaces it.
     """
-    query = text("REPLACE INTO sales_predictions (prediction_date, predicted_sales) VALUES (:prediction_date, :predicted_sales)")
-    with engine.connect() as connection:
-        connection.execute(query, {'prediction_date': prediction_date, 'predicted_sales': predicted_sales})
-    logging.info(f"Saved prediction for {prediction_date}: ₱ {predicted_sales}")
+    from fallback_forecast import fallback_forecast
+
+    with stage('fallback'):
+        forecast, forecast_engine = fallback_forecast(y, steps=1)
+    forecast_result = {
+        'predicted_sales': round(float(max(forecast[0], 0)), 2),
+        'next_period': next_period_label,
+        'engine': forecast_engine
+    }
+    logging.info(f"Answering from the {forecast_engine} fallback ({reason}) for {next_period_label}: "
+                 f"₱ {forecast_result['predicted_sales']}")
+    return forecast_response(forecast_result, 'miss', fallback=reason, **extra)
 
 def require_api_key(f):
     """
@@ -152,62 +577,695 @@ def require_api_key(f):
             return jsonify({'error': 'Unauthorized'}), 401
     return decorated
 
+def profile_reason(args, headers):
+    """
+    Return why a request with these query args and headers is profiled: 'requested' (profile=1
+    or an 'X-Profile: 1' header), 'sampled' (at Config.PROFILE_SAMPLE_RATE), or None.
+    """
+    if args.get('profile', '').lower() in PROFILE_FLAGS or headers.get('X-Profile', '').lower() in PROFILE_FLAGS:
+        return 'requested'
+    if random.random() < Config.PROFILE_SAMPLE_RATE:
+        return 'sampled'
+    return None
+
+def profiled(f):
+    """
+    Decorator profiling an endpoint with cProfile when the request asks for it (profile=1 or an
+    'X-Profile: 1' header) or is sampled at Config.PROFILE_SAMPLE_RATE. The profile covers the whole
+    view, including fits it runs on the forecast worker pool, and is stored with the request
+    parameters; its id is returned in the X-Profile-Id header. Place it below require_api_key so
+    that only authenticated requests can turn profiling on.
+    """
+    @wraps(f)
+    def decorated(*args, **kwargs):
+        reason = profile_reason(request.args, request.headers)
+        if reason is None:
+            return f(*args, **kwargs)
+
+        metadata = {
+            'reason': reason,
+            'method': request.method,
+            'path': request.path,
+            'args': {key: value for key, value in request.args.items() if key not in ('api_key', 'profile')},
+            'body': request.get_json(silent=True)
+        }
+        with profile_store.capture('request', metadata) as capture:
+            response = app.make_response(f(*args, **kwargs))
+            capture.metadata['status'] = response.status_code
+        if capture.profile_id is not None:
+            PROFILES_CAPTURED.inc(kind='request', reason=reason)
+            response.headers['X-Profile-Id'] = capture.profile_id
+        return response
+    return decorated
+
+def after_fork():
+    """
+    Prepare a worker process forked from a parent that imported this module (see gunicorn.conf.py).
+    Pooled connections, threads and worker pools are not shared across fork, so each worker
+    opens its own; the loaded model, metrics and imports stay shared copy-on-write.
+    """
+    if engine is not None:
+        engine.dispose(close=False)
+        prediction_writer.after_fork()
+        precompute_scheduler.after_fork()
+        change_detector.after_fork()
+        dashboard_aggregates.after_fork()
+    forecast_jobs.after_fork()
+    precompute_jobs.after_fork()
+
+def shutdown():
+    """
+    Write buffered predictions and stop the background threads and worker pools of this process.
+    """
+    if engine is not None:
+        precompute_scheduler.stop()
+        change_detector.stop()
+        prediction_writer.close()
+    forecast_jobs.shutdown()
+    precompute_jobs.shutdown()
+
+# ================================
+# Monitoring
+# ================================
+
+@app.before_request
+def start_request_timer():
+    begin_request()
+
+@app.after_request
+def record_request_metrics(response):
+    """
+    Record request latency and log a stage breakdown for slow requests.
+    """
+    elapsed, stages = end_request()
+    endpoint = request.url_rule.rule if request.url_rule is not None else 'unmatched'
+    REQUEST_SECONDS.observe(elapsed, endpoint=endpoint, method=request.method, status=response.status_code)
+    if elapsed > SLOW_REQUEST_SECONDS:
+        params = {key: value for key, value in request.args.items() if key != 'api_key'}
+        breakdown = ', '.join(f"{name}={seconds * 1000:.1f}ms" for name, seconds in stages) or 'no stages recorded'
+        logging.warning(f"Slow request {request.method} {request.path} {params} took {elapsed * 1000:.1f}ms "
+                        f"(status {response.status_code}): {breakdown}")
+    return response
+
+def collect_pool_metrics():
+    """
+    Connection pool statistics of the SQLAlchemy engine.
+    """
+    pool = engine.pool
+    samples = []
+    for name in ('size', 'checkedin', 'checkedout', 'overflow'):
+        method = getattr(pool, name, None)
+        if callable(method):
+            samples.append(((name,), method()))
+    return samples
+
+def cache_samples(field):
+    """
+    Return a callback reading one counter of every forecast cache.
+    """
+    def samples():
+        caches = {'forecast': forecast_cache, 'last_good': last_good_forecasts}
+        if service_forecaster is not None:
+            caches['service'] = service_forecaster.cache
+        return [((name,), cache.stats()[field]) for name, cache in caches.items()]
+    return samples
+
+registry.gauge_callback('db_pool_connections', 'SQLAlchemy connection pool statistics.',
+                        collect_pool_metrics, ('state',))
+registry.counter_callback('forecast_cache_hits_total', 'Forecast cache hits.', cache_samples('hits'), ('cache',))
+registry.counter_callback('forecast_cache_misses_total', 'Forecast cache misses.', cache_samples('misses'), ('cache',))
+registry.counter_callback('forecast_cache_evictions_total', 'Forecast cache evictions.',
+                          cache_samples('evictions'), ('cache',))
+registry.gauge_callback('forecast_cache_entries', 'Entries currently held in each forecast cache.',
+                        cache_samples('size'), ('cache',))
+registry.gauge_callback('forecast_jobs_pending', 'Queued or running background forecast jobs.',
+                        lambda: forecast_jobs.stats()['pending'])
+registry.counter_callback('forecast_jobs_rejected_total', 'Forecast jobs rejected because the queue was full.',
+                          lambda: forecast_jobs.stats()['rejected'])
+registry.counter_callback('predict_requests_coalesced_total',
+                          'Requests to /predict answered by an identical in-flight request.',
+                          lambda: predict_flight.stats()['coalesced'])
+registry.gauge_callback('predict_requests_in_flight', 'Distinct /predict filters currently being computed.',
+                        lambda: predict_flight.stats()['in_flight'])
+registry.gauge_callback('prediction_writes_buffered', 'Predictions waiting in the write-behind buffer.',
+                        lambda: prediction_writer.stats()['buffered'])
+registry.counter_callback('prediction_writes_total', 'Predictions written to sales_predictions.',
+                          lambda: prediction_writer.stats()['written'])
+registry.counter_callback('prediction_write_failures_total', 'Failed flushes of the write-behind buffer.',
+                          lambda: prediction_writer.stats()['failed_flushes'])
+registry.counter_callback('forecast_cache_invalidations_total',
+                          'Cached forecasts dropped because a month they cover changed.',
+                          cache_samples('invalidations'), ('cache',))
+registry.counter_callback('data_change_polls_total', 'Polls of the laundry watermarks.',
+                          lambda: change_detector.stats()['polls'])
+registry.counter_callback('data_change_poll_failures_total', 'Failed polls of the laundry watermarks.',
+                          lambda: change_detector.stats()['failures'])
+registry.counter_callback('data_changed_months_total', 'Months whose laundry watermark changed.',
+                          lambda: change_detector.stats()['changed_months'])
+registry.counter_callback('dashboard_refreshes_total', 'Refreshes of the in-memory dashboard aggregates.',
+                          lambda: dashboard_aggregates.stats()['refreshes'])
+registry.counter_callback('dashboard_folded_orders_total', 'Laundry orders folded into the dashboard aggregates.',
+                          lambda: dashboard_aggregates.stats()['folded_orders'])
+registry.counter_callback('dashboard_rescanned_months_total',
+                          'Months of the dashboard aggregates rescanned after existing orders changed.',
+                          lambda: dashboard_aggregates.stats()['rescanned_months'])
+PREDICT_NOT_MODIFIED = registry.counter('predict_not_modified_total',
+                                        'Requests to /predict answered 304 Not Modified.')
+PROFILES_CAPTURED = registry.counter('profiles_captured_total', 'cProfile captures stored in the profile ring.',
+                                     ('kind', 'reason'))
+PRECOMPUTED_HITS = registry.counter('precomputed_forecast_hits_total',
+                                   'Requests to /predict answered from the precomputed forecast lookup.')
+registry.counter_callback('forecast_precompute_runs_total', 'Runs of the dashboard forecast precomputation.',
+                          lambda: precompute_scheduler.stats()['runs'])
+registry.counter_callback('forecast_precompute_failures_total', 'Failed runs of the dashboard forecast precomputation.',
+                          lambda: precompute_scheduler.stats()['failures'])
+registry.counter_callback('forecast_precomputed_total', 'Forecasts computed into the forecast lookup.',
+                          lambda: precompute_scheduler.stats()['computed'])
+registry.gauge_callback('serving_model_version', 'Version of the persisted serving model (0 if none).',
+                        model_version)
+
 # ================================
 # API Endpoints
 # ================================
 
 @app.route('/predict', methods=['GET'])
 @require_api_key
+@require_warm
+@profiled
 def predict_sales():
     """
     API endpoint to predict next month's sales.
+    The optional 'budget' parameter is the number of seconds the client is prepared to wait;
+    when a SARIMAX forecast cannot be produced within it, a closed-form fallback answers instead.
+    Forecasts carry an ETag, and a request whose If-None-Match still matches gets 304 Not Modified.
+    """
+    year = request.args.get('year', default=None, type=int)
+    month = request.args.get('month', default=None, type=int)
+    day = request.args.get('day', default=None, type=int)
+    budget = request.args.get('budget', default=PREDICT_BUDGET_SECONDS, type=float)
+    budget_seconds = min(max(budget, 0), PREDICT_MAX_BUDGET_SECONDS)
+    deadline = time.monotonic() + budget_seconds
+
+    logging.info(f"Received prediction request with year={year}, month={month}, day={day}, budget={budget}s")
+
+    etag = forecast_etag((year, month, day))
+    if etag is not None and request.if_none_match.contains(etag):
+        PREDICT_NOT_MODIFIED.inc()
+        response = Response(status=304)
+        response.set_etag(etag)
+        response.headers['Cache-Control'] = PREDICT_CACHE_CONTROL
+        return response
+
+    # Concurrent requests for the same filters and whole-second budget wait for one computation.
+    # The leader started first, so a follower never waits past its own budget, and a fallback
+    # forced by a short budget is never handed to a request that was prepared to wait longer.
+    flight_key = (year, month, day, int(budget_seconds))
+    (body, status, headers), shared = predict_flight.do(flight_key, predict_response,
+                                                        year, month, day, deadline)
+    if shared:
+        logging.info(f"Coalesced prediction request with year={year}, month={month}, day={day}")
+    return Response(body, status=status, headers=headers)
+
+def predict_response(year, month, day, deadline, df=None):
+    """
+    Compute the /predict response for the given filters and freeze it to (body, status, headers),
+    so that every request sharing it gets its own Response object. Successful SARIMAX and
+    short-series forecasts carry an ETag; other answers are marked no-store.
+    """
+    response = app.make_response(compute_prediction(year, month, day, deadline, df))
+    payload = response.get_json(silent=True) or {}
+    # Tag with the state after the computation, which may have extended the serving model
+    etag = forecast_etag((year, month, day))
+    if etag is not None and response.status_code == 200 and payload.get('cache') in ('hit', 'miss', 'precomputed') \
+            and payload.get('fallback') in (None, 'short_series'):
+        response.set_etag(etag)
+        response.headers['Cache-Control'] = PREDICT_CACHE_CONTROL
+    else:
+        response.headers['Cache-Control'] = 'no-store'
+    return response.get_data(), response.status_code, list(response.headers)
+
+def compute_prediction(year, month, day, deadline, df=None):
+    """
+    Compute the /predict response for the given filters, answering by deadline (time.monotonic()).
+    df, the monthly sales of the filters, is fetched here unless the caller already has it.
     """
+    import pandas as pd
+    from fallback_forecast import fallback_forecast
+
     try:
-        year = request.args.get('year', default=None, type=int)
-        month = request.args.get('month', default=None, type=int)
-        day = request.args.get('day', default=None, type=int)
+        filter_key = (year, month, day)
+        watermark = data_watermark(year, month, day)
+        forecast_result = forecast_cache.get(filter_key + watermark + (forecast_version(),))
+
+        if forecast_result is not None:
+            logging.info(f"Forecast cache hit for year={year}, month={month}, day={day} (watermark={watermark})")
+            return forecast_response(forecast_result, 'hit')
+
+        logging.info(f"Forecast cache miss for year={year}, month={month}, day={day} (watermark={watermark})")
 
-        logging.info(f"Received prediction request with year={year}, month={month}, day={day}")
+        forecast_result = lookup_forecast(filter_key)
+        if forecast_result is not None:
+            PRECOMPUTED_HITS.inc()
+            forecast_cache.put(filter_key + watermark + (forecast_version(),), forecast_result)
+            last_good_forecasts.put(filter_key, forecast_result)
+            return forecast_response(forecast_result, 'precomputed')
 
-        df = fetch_sales_data(year, month, day)
-        y, next_period_label, monthly_sales = prepare_data(df)
+        if df is None:
+            df = fetch_sales_data(year, month, day)
+        y, next_period_label, df_features = prepare_data(
+            df, aggregate_features if filter_key == (None, None, None) else None)
 
         if y is None:
             logging.error("Insufficient data for prediction.")
             return jsonify({'error': 'Insufficient data for prediction.'}), 400
 
-        model_fit = train_model_sarimax(y)
-        forecast = model_fit.forecast(steps=1)
-        predicted_sales = max(forecast[0], 0)
-        predicted_sales = round(predicted_sales, 2)
+        prediction_date = df_features.index[-1] + pd.DateOffset(months=1)
+
+        # A seasonal SARIMAX needs two full seasons; shorter series are answered by the fallback model
+        if len(y) < MIN_SARIMAX_MONTHS:
+            with stage('fallback'):
+                forecast, forecast_engine = fallback_forecast(y, steps=1)
+            forecast_result = record_forecast(filter_key, watermark, prediction_date, next_period_label,
+                                              forecast[0], forecast_engine)
+            return forecast_response(forecast_result, 'miss', fallback='short_series')
+
+        if serving_model is not None:
+            try:
+                with stage('forecast'):
+                    forecast = serving_model.forecast(df_features, steps=1, extend=filter_key == (None, None, None))
+            except Exception:
+                logging.exception("Serving model forecast failed; using the fallback model.")
+                return fallback_response(y, next_period_label, 'model_error')
+            forecast_result = record_forecast(filter_key, watermark, prediction_date, next_period_label,
+                                              forecast[0], 'sarimax-persisted')
+            return forecast_response(forecast_result, 'miss')
+
+        # Without a persisted model the fit runs on the background process pool
+        def on_done(forecast):
+            return record_forecast(filter_key, watermark, prediction_date, next_period_label,
+                                   forecast[0], 'sarimax-refit')
+
+        stale_result = last_good_forecasts.get(filter_key)
+        try:
+            job_id = forecast_jobs.submit(sarimax_forecast, y, SARIMAX_ORDER, SARIMAX_SEASONAL_ORDER, 1,
+                                          SARIMAX_FIT_TIMEOUT, key=filter_key + watermark, on_done=on_done)
+        except JobQueueFull as e:
+            logging.warning(f"Forecast queue full for year={year}, month={month}, day={day}: {e}")
+            if stale_result is not None:
+                return forecast_response(stale_result, 'stale')
+            return fallback_response(y, next_period_label, 'overloaded')
+
+        status_url = url_for('prediction_status', job_id=job_id)
+        if stale_result is not None:
+            return forecast_response(stale_result, 'stale', job_id=job_id, status_url=status_url)
+
+        with stage('fit_wait'):
+            finished = forecast_jobs.wait(job_id, max(deadline - time.monotonic(), 0))
+        if finished:
+            job = forecast_jobs.status(job_id)
+            if job['status'] == 'failed':
+                logging.warning(f"Forecast job {job_id} failed: {job['error']}")
+                return fallback_response(y, next_period_label, 'fit_failed')
+            return forecast_response(job['result'], 'miss')
+
+        # The fit keeps running and caches its result; this request is answered within its budget
+        logging.info(f"Forecast job {job_id} did not finish within the budget; using the fallback model.")
+        return fallback_response(y, next_period_label, 'budget', job_id=job_id, status_url=status_url)
+
+    except Exception as e:
+        logging.exception("An error occurred during prediction.")
+        return jsonify({'error': f'An error occurred: {str(e)}'}), 500
+
+def parse_batch_filter(item):
+    """
+    Normalize one filter set of a batch request into a (year, month, day) key.
+    """
+    if not isinstance(item, dict):
+        raise ValueError("Each filter set must be an object with optional year, month and day.")
+    key = []
+    for field in ('year', 'month', 'day'):
+        value = item.get(field)
+        if isinstance(value, bool):
+            raise ValueError(f"'{field}' must be an integer, not a boolean.")
+        key.append(int(value) if value not in (None, '', 0) else None)
+    return tuple(key)
+
+@app.route('/predict/batch', methods=['POST'])
+@require_api_key
+@require_warm
+@profiled
+def predict_batch():
+    """
+    API endpoint to forecast several filter sets over a multi-month horizon in one request.
+
+    Expects a JSON body {"filters": [{"year": .., "month": .., "day": ..}, ...], "horizon": n}.
+    Filter sets are fetched once each, and filter sets whose monthly series are identical share
+    one fitted model. Series shorter than two seasons are forecast by the fallback model, whose
+    forecasts have no lower and upper bounds.
+    """
+    import numpy as np
+    import pandas as pd
+    from fallback_forecast import fallback_forecast
+
+    try:
+        payload = request.get_json(silent=True) or {}
+        filters = payload.get('filters')
+        horizon = payload.get('horizon', 1)
+
+        if not isinstance(filters, list) or not filters:
+            return jsonify({'error': "'filters' must be a non-empty list."}), 400
+        if len(filters) > BATCH_MAX_FILTERS:
+            return jsonify({'error': f"At most {BATCH_MAX_FILTERS} filter sets are allowed per request."}), 400
+        if not isinstance(horizon, int) or isinstance(horizon, bool) or not 1 <= horizon <= BATCH_MAX_HORIZON:
+            return jsonify({'error': f"'horizon' must be an integer between 1 and {BATCH_MAX_HORIZON}."}), 400
+        try:
+            keys = [parse_batch_filter(item) for item in filters]
+        except (TypeError, ValueError) as e:
+            return jsonify({'error': f'Invalid filter set: {str(e)}'}), 400
+
+        logging.info(f"Received batch prediction request for {len(keys)} filter set(s), horizon={horizon}")
+
+        # Fetch every distinct filter once and group filters by their underlying monthly series
+        series_by_key = {}
+        series_groups = {}
+        for key in dict.fromkeys(keys):
+            y, next_period_label, df_features = prepare_data(
+                fetch_sales_data(*key), aggregate_features if key == (None, None, None) else None)
+            if y is None:
+                series_by_key[key] = None
+                continue
+            fingerprint = (tuple(df_features.index.strftime('%Y-%m')), tuple(np.round(y, 2)))
+            series_by_key[key] = fingerprint
+            series_groups.setdefault(fingerprint, {'keys': [], 'y': y, 'df_features': df_features})
+            series_groups[fingerprint]['keys'].append(key)
 
-        logging.info(f"Predicted sales for {next_period_label}: ₱ {predicted_sales}")
+        # Forecast each distinct series once. Series shorter than two seasons are answered by the
+        # fallback model, which has no confidence interval, in either serving mode.
+        forecasts = {}
+        engines = {}
+        with stage('forecast'):
+            fits = []
+            for fingerprint, group in series_groups.items():
+                if len(group['y']) < MIN_SARIMAX_MONTHS:
+                    mean, engines[fingerprint] = fallback_forecast(group['y'], steps=horizon)
+                    forecasts[fingerprint] = ((mean, None, None), None)
+                elif serving_model is not None:
+                    extend = (None, None, None) in group['keys']
+                    try:
+                        forecasts[fingerprint] = (serving_model.forecast_interval(
+                            group['df_features'], steps=horizon, alpha=BATCH_ALPHA, extend=extend), None)
+                    except Exception as e:
+                        forecasts[fingerprint] = (None, str(e))
+                    engines[fingerprint] = 'sarimax-persisted'
+                else:
+                    fits.append(fingerprint)
+                    engines[fingerprint] = 'sarimax-refit'
+            if fits:
+                outcomes = forecast_jobs.run_batch(
+                    sarimax_forecast_interval,
+                    [(series_groups[f]['y'], SARIMAX_ORDER, SARIMAX_SEASONAL_ORDER, horizon, BATCH_ALPHA,
+                      SARIMAX_FIT_TIMEOUT) for f in fits],
+                    timeout=BATCH_TIMEOUT_SECONDS)
+                forecasts.update(zip(fits, outcomes))
 
-        save_prediction_to_db(monthly_sales['DATE'].max() + pd.DateOffset(months=1), predicted_sales)
+        results = []
+        predictions = {}
+        for key in keys:
+            year, month, day = key
+            item = {'year': year, 'month': month, 'day': day}
+            fingerprint = series_by_key[key]
+            if fingerprint is None:
+                item['error'] = 'Insufficient data for prediction.'
+                results.append(item)
+                continue
+            forecast, error = forecasts[fingerprint]
+            if error is not None:
+                item['error'] = f'An error occurred: {error}'
+                results.append(item)
+                continue
 
-        latest_mae = metrics.get('mae') if metrics else None
-        latest_mse = metrics.get('mse') if metrics else None
-        latest_r2 = metrics.get('r2') if metrics else None
+            mean, lower, upper = forecast
+            last_date = series_groups[fingerprint]['df_features'].index[-1]
+            item['engine'] = engines[fingerprint]
+            item['forecasts'] = []
+            for step in range(horizon):
+                prediction_date = last_date + pd.DateOffset(months=step + 1)
+                predicted_sales = round(float(max(mean[step], 0)), 2)
+                item['forecasts'].append({
+                    'period': prediction_date.strftime('%B %Y'),
+                    'predicted_sales': predicted_sales,
+                    'lower': round(float(max(lower[step], 0)), 2) if lower is not None else None,
+                    'upper': round(float(max(upper[step], 0)), 2) if upper is not None else None
+                })
+                predictions[prediction_date] = predicted_sales
+            results.append(item)
 
+        save_predictions_to_db(predictions)
+
+        logging.info(f"Batch prediction served {len(keys)} filter set(s) from {len(series_groups)} distinct series.")
         return jsonify({
-            'predicted_sales': predicted_sales,
-            'next_period': next_period_label,
-            'mae': latest_mae,
-            'mse': latest_mse,
-            'r2': latest_r2
+            'horizon': horizon,
+            'confidence_level': 1 - BATCH_ALPHA,
+            'results': results
         }), 200
 
+    except JobQueueFull as e:
+        logging.warning(f"Forecast queue full for a batch prediction: {e}")
+        response = jsonify({'error': 'The forecast queue is full; retry shortly.'})
+        response.headers['Retry-After'] = '5'
+        return response, 503
     except Exception as e:
-        logging.exception("An error occurred during prediction.")
+        logging.exception("An error occurred during batch prediction.")
+        return jsonify({'error': f'An error occurred: {str(e)}'}), 500
+
+@app.route('/predict/services', methods=['GET'])
+@require_api_key
+@require_warm
+@profiled
+def predict_services():
+    """
+    API endpoint to forecast sales per SERVICE, optionally reconciled to the total forecast.
+    """
+    import pandas as pd
+    from sales_data import fetch_monthly_sales_by_service
+    from service_forecast import TOTAL_SERIES
+
+    try:
+        year = request.args.get('year', default=None, type=int)
+        month = request.args.get('month', default=None, type=int)
+        day = request.args.get('day', default=None, type=int)
+        horizon = request.args.get('horizon', default=1, type=int)
+        reconcile = request.args.get('reconcile', default='true').lower() not in ('0', 'false', 'no')
+
+        if not 1 <= horizon <= BATCH_MAX_HORIZON:
+            return jsonify({'error': f"'horizon' must be between 1 and {BATCH_MAX_HORIZON}."}), 400
+
+        logging.info(f"Received service prediction request with year={year}, month={month}, day={day}, "
+                     f"horizon={horizon}, reconcile={reconcile}")
+
+        with stage('fetch'):
+            wide = fetch_monthly_sales_by_service(engine, year, month, day)
+        if wide.empty:
+            logging.error("Insufficient data for prediction.")
+            return jsonify({'error': 'Insufficient data for prediction.'}), 400
+
+        with stage('forecast'):
+            forecasts, errors, fitted = service_forecaster.forecast(wide, steps=horizon, alpha=BATCH_ALPHA,
+                                                                    reconcile=reconcile)
+
+        periods = [(wide.index[-1] + pd.DateOffset(months=step + 1)).strftime('%B %Y') for step in range(horizon)]
+        services = {}
+        for name, (mean, lower, upper) in forecasts.items():
+            services[name] = [{
+                'period': periods[step],
+                'predicted_sales': round(float(mean[step]), 2),
+                'lower': round(float(lower[step]), 2),
+                'upper': round(float(upper[step]), 2)
+            } for step in range(horizon)]
+
+        return jsonify({
+            'total': services.pop(TOTAL_SERIES, None),
+            'services': services,
+            'errors': errors,
+            'reconciled': reconcile and not errors,
+            'fitted_series': fitted,
+            'cached_series': len(forecasts) + len(errors) - fitted,
+            'engine': 'sarimax-refit'
+        }), 200
+
+    except JobQueueFull as e:
+        logging.warning(f"Forecast queue full for a service prediction: {e}")
+        response = jsonify({'error': 'The forecast queue is full; retry shortly.'})
+        response.headers['Retry-After'] = '5'
+        return response, 503
+    except Exception as e:
+        logging.exception("An error occurred during service prediction.")
+        return jsonify({'error': f'An error occurred: {str(e)}'}), 500
+
+@app.route('/forecast/inventory', methods=['GET'])
+@require_api_key
+@require_warm
+def forecast_inventory():
+    """
+    API endpoint projecting when each detergent and fabric detergent runs out of stock, with
+    percentile bands over simulated demand paths. Optional parameters: 'horizon' (days), 'paths'
+    and 'user_id' (limits the stock to that user's inventory).
+    """
+    from inventory_forecast import project_stock_outs
+
+    horizon = request.args.get('horizon', default=INVENTORY_HORIZON_DAYS, type=int)
+    paths = request.args.get('paths', default=INVENTORY_PATHS, type=int)
+    user_id = request.args.get('user_id', default=None, type=int)
+
+    if not 1 <= horizon <= INVENTORY_MAX_HORIZON_DAYS:
+        return jsonify({'error': f"'horizon' must be between 1 and {INVENTORY_MAX_HORIZON_DAYS}."}), 400
+    if not 1 <= paths <= INVENTORY_MAX_PATHS:
+        return jsonify({'error': f"'paths' must be between 1 and {INVENTORY_MAX_PATHS}."}), 400
+
+    logging.info(f"Received inventory forecast request with horizon={horizon}, paths={paths}, user_id={user_id}")
+
+    try:
+        with stage('simulate'):
+            result = project_stock_outs(engine, horizon_days=horizon, paths=paths,
+                                        history_weeks=INVENTORY_HISTORY_WEEKS, user_id=user_id)
+        return jsonify(result), 200
+    except Exception as e:
+        logging.exception("An error occurred during the inventory forecast.")
+        return jsonify({'error': f'An error occurred: {str(e)}'}), 500
+
+@app.route('/predict/status/<job_id>', methods=['GET'])
+@require_api_key
+def prediction_status(job_id):
+    """
+    API endpoint to report the progress and result of a background forecast job.
+    """
+    job = forecast_jobs.status(job_id)
+    if job is None:
+        return jsonify({'error': 'Unknown or expired job id.'}), 404
+    return jsonify(job), 200
+
+@app.route('/model/refit', methods=['POST'])
+@require_api_key
+@require_warm
+def refit_model():
+    """
+    API endpoint to explicitly re-estimate the serving model's parameters.
+    """
+    if serving_model is None:
+        return jsonify({'error': 'No persisted serving model is loaded.'}), 409
+    try:
+        _, _, df_features = prepare_data(fetch_sales_data(), aggregate_features)
+        if df_features is None:
+            return jsonify({'error': 'Insufficient data for refit.'}), 400
+        serving_model.refit(df_features)
+        forecast_cache.clear()
+        # The precomputed forecasts were made with the old parameters
+        precompute_scheduler.trigger()
+        return jsonify({'status': 'refit', 'model_version': serving_model.version}), 200
+    except Exception as e:
+        logging.exception("An error occurred while refitting the serving model.")
+        return jsonify({'error': f'An error occurred: {str(e)}'}), 500
+
+@app.route('/forecast/precompute', methods=['POST'])
+@require_api_key
+@require_warm
+def precompute_forecasts():
+    """
+    API endpoint to start a run of the dashboard forecast precomputation now, rather than at the
+    next off-peak hour. Answers 202 with the scheduler's statistics; the run is incremental.
+    """
+    precompute_scheduler.trigger()
+    return jsonify({'status': 'scheduled', **precompute_scheduler.stats()}), 202
+
+@app.route('/dashboard/aggregates', methods=['GET'])
+@require_api_key
+@require_warm
+def dashboard_aggregates_endpoint():
+    """
+    API endpoint returning every aggregate of the admin dashboard for the year/month/day filters
+    in one response, from in-memory rollups that fold in new rows instead of rescanning the tables.
+    The optional 'user_id' limits the expense charts to that user's inventory.
+    """
+    from datetime import date
+
+    year = request.args.get('year', default=date.today().year, type=int)
+    month = request.args.get('month', default=None, type=int) or None
+    day = request.args.get('day', default=None, type=int) or None
+    user_id = request.args.get('user_id', default=None, type=int)
+
+    if month is not None and not 1 <= month <= 12:
+        return jsonify({'error': "'month' must be between 1 and 12."}), 400
+    if day is not None and not 1 <= day <= 31:
+        return jsonify({'error': "'day' must be between 1 and 31."}), 400
+
+    try:
+        with stage('aggregate'):
+            return jsonify(dashboard_aggregates.summary(year, month, day, user_id)), 200
+    except Exception as e:
+        logging.exception("An error occurred while computing the dashboard aggregates.")
         return jsonify({'error': f'An error occurred: {str(e)}'}), 500
 
+@app.route('/metrics', methods=['GET'])
+@require_api_key
+def metrics_endpoint():
+    """
+    API endpoint exposing latency histograms, pool and cache statistics in Prometheus format.
+    """
+    return Response(registry.render(), mimetype='text/plain; version=0.0.4')
+
+@app.route('/admin/profiles', methods=['GET'])
+@require_api_key
+def list_profiles():
+    """
+    API endpoint listing the stored profiles, newest first, with the parameters they were taken for.
+    """
+    return jsonify({'max_profiles': profile_store.max_profiles, 'profiles': profile_store.list()}), 200
+
+@app.route('/admin/profiles/<profile_id>', methods=['GET'])
+@require_api_key
+def download_profile(profile_id):
+    """
+    API endpoint downloading a stored profile with its worker profiles merged in, as a binary
+    pstats file by default or, with format=text, as a report of the top 'limit' functions by 'sort'.
+    """
+    output = request.args.get('format', default='pstats')
+    sort = request.args.get('sort', default='cumulative')
+    limit = request.args.get('limit', default=PROFILE_REPORT_LIMIT, type=int)
+
+    if output not in ('pstats', 'text'):
+        return jsonify({'error': "'format' must be 'pstats' or 'text'."}), 400
+    if sort not in pstats.Stats.sort_arg_dict_default:
+        return jsonify({'error': f"'sort' must be one of {', '.join(sorted(pstats.Stats.sort_arg_dict_default))}."}), 400
+    try:
+        if output == 'text':
+            return Response(profile_store.report(profile_id, sort=sort, limit=limit), mimetype='text/plain')
+        return Response(profile_store.export(profile_id), mimetype='application/octet-stream',
+                        headers={'Content-Disposition': f'attachment; filename={profile_id}.prof'})
+    except KeyError:
+        return jsonify({'error': f"No profile '{profile_id}'."}), 404
+
 @app.route('/')
 def home():
+    """
+    Liveness check; answers as soon as the process accepts requests, before the warm-up.
+    """
     return "Flask Sales Prediction Service is running."
 
+@app.route('/ready', methods=['GET'])
+def ready():
+    """
+    Readiness check: 200 once the warm-up has loaded the models and created the engine,
+    503 while it is running or after it failed.
+    """
+    start_warm_up()
+    body = {**warm_up_state, 'serving_model': serving_model is not None,
+            'model_version': model_version()}
+    return jsonify(body), 200 if _warm_up_done.is_set() else 503
+
 # ================================
 # Run the Flask App
 # ================================
 
 if __name__ == '__main__':
+    start_warm_up()
     app.run(host='0.0.0.0', port=5000, debug=True)
@@ -0,0 +1,152 @@
+# prediction_writer.py
+
+import logging
+import threading
+
+import pandas as pd
+from sqlalchemy import Date, Float, column, table, text
+from sqlalchemy.dialects import mysql, sqlite
+
+from instrumentation import stage
+
+SALES_PREDICTIONS = table('sales_predictions', column('prediction_date', Date), column('predicted_sales', Float))
+
+
+class PredictionWriter:
+    """
+    Write-behind buffer for the sales_predictions table.
+    Predictions are queued in memory, keyed by prediction date (a newer prediction for the same
+    date replaces a queued one), and written by a background thread in one multi-row upsert
+    when flush_rows rows are buffered, every flush_seconds, and on close().
+    """
+
+    def __init__(self, engine, flush_rows=50, flush_seconds=5.0):
+        """
+        Initializes the PredictionWriter.
+
+        Parameters:
+            engine (Engine): SQLAlchemy engine of the database holding sales_predictions.
+            flush_rows (int): Number of buffered rows that triggers an immediate flush.
+            flush_seconds (float): Maximum number of seconds a row stays buffered.
+        """
+        self.engine = engine
+        self.flush_rows = flush_rows
+        self.flush_seconds = flush_seconds
+        self._buffer = {}
+        self._condition = threading.Condition()
+        self._flush_lock = threading.Lock()
+        self._closed = False
+        self._thread = None
+        self._written = 0
+        self._failed_flushes = 0
+
+    def _start(self):
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._run, name='prediction-writer', daemon=True)
+            self._thread.start()
+
+    def put(self, prediction_date, predicted_sales):
+        """
+        Queue one prediction.
+        """
+        self.put_many({prediction_date: predicted_sales})
+
+    def put_many(self, predictions):
+        """
+        Queue several predictions given as a mapping of prediction date to predicted sales.
+        """
+        if not predictions:
+            return
+        with self._condition:
+            for prediction_date, predicted_sales in predictions.items():
+                self._buffer[pd.Timestamp(prediction_date).date()] = float(predicted_sales)
+            closed = self._closed
+            if not closed:
+                self._start()
+                if len(self._buffer) >= self.flush_rows:
+                    self._condition.notify()
+        # After close() there is no background thread, so write straight through
+        if closed:
+            self.flush()
+
+    def _run(self):
+        wrote = True
+        while True:
+            with self._condition:
+                # After a failed (or empty) flush wait a full interval rather than retrying at once
+                if not self._closed and (not wrote or len(self._buffer) < self.flush_rows):
+                    self._condition.wait(self.flush_seconds)
+                if self._closed:
+                    return
+            wrote = self.flush() > 0
+
+    def _upsert(self, rows):
+        """
+        Build the multi-row upsert statement for the engine's dialect.
+        """
+        dialect = self.engine.dialect.name
+        if dialect == 'mysql':
+            statement = mysql.insert(SALES_PREDICTIONS).values(rows)
+            return statement.on_duplicate_key_update(predicted_sales=statement.inserted.predicted_sales), None
+        if dialect == 'sqlite':
+            statement = sqlite.insert(SALES_PREDICTIONS).values(rows)
+            return statement.on_conflict_do_update(
+                index_elements=['prediction_date'],
+                set_={'predicted_sales': statement.excluded.predicted_sales}), None
+        return text("REPLACE INTO sales_predictions (prediction_date, predicted_sales) "
+                    "VALUES (:prediction_date, :predicted_sales)"), rows
+
+    def flush(self):
+        """
+        Write all buffered predictions in one transaction. Rows are re-queued if the write fails,
+        unless a newer prediction for the same date has been queued meanwhile.
+        """
+        with self._flush_lock:
+            with self._condition:
+                pending, self._buffer = self._buffer, {}
+            if not pending:
+                return 0
+            rows = [{'prediction_date': prediction_date, 'predicted_sales': predicted_sales}
+                    for prediction_date, predicted_sales in sorted(pending.items())]
+            try:
+                statement, parameters = self._upsert(rows)
+                with stage('save'), self.engine.begin() as connection:
+                    connection.execute(statement, parameters)
+            except Exception:
+                logging.exception(f"Failed to write {len(rows)} buffered prediction(s); they will be retried.")
+                with self._condition:
+                    self._failed_flushes += 1
+                    self._buffer = {**pending, **self._buffer}
+                return 0
+            with self._condition:
+                self._written += len(rows)
+            logging.info(f"Wrote {len(rows)} buffered prediction(s) to sales_predictions.")
+            return len(rows)
+
+    def close(self):
+        """
+        Stop the background thread and write whatever is still buffered.
+        """
+        with self._condition:
+            self._closed = True
+            self._condition.notify()
+        if self._thread is not None:
+            self._thread.join(timeout=self.flush_seconds + 5)
+        self.flush()
+
+    def after_fork(self):
+        """
+        Reset the writer in a forked child: the parent's background thread does not exist there,
+        and rows buffered by the parent are the parent's to write.
+        """
+        self._buffer = {}
+        self._condition = threading.Condition()
+        self._flush_lock = threading.Lock()
+        self._thread = None
+
+    def stats(self):
+        """
+        Return the number of buffered rows, rows written and failed flushes.
+        """
+        with self._condition:
+            return {'buffered': len(self._buffer), 'written': self._written, 'failed_flushes': self._failed_flushes}
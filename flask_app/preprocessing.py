@@ -27,14 +27,19 @@ class CyclicEncoder(BaseEstimator, TransformerMixin):
         return self
 
     def transform(self, X):
-        X = X.copy()
-        for col, period in self.cyclical_columns_periods.items():
+        columns = list(self.cyclical_columns_periods)
+        for col in columns:
             if col not in X.columns:
                 raise ValueError(f"Column '{col}' not found in input DataFrame.")
-            X[f'{col}_sin'] = np.sin(2 * np.pi * X[col] / period)
-            X[f'{col}_cos'] = np.cos(2 * np.pi * X[col] / period)
-            X = X.drop(columns=[col])
-        return X
+
+        # Encode all cyclical columns in one array operation, then drop them in a single call
+        periods = np.array([self.cyclical_columns_periods[col] for col in columns], dtype=float)
+        angles = 2 * np.pi * X[columns].to_numpy(dtype=float) / periods
+        encoded = np.empty((len(X), 2 * len(columns)))
+        encoded[:, 0::2] = np.sin(angles)
+        encoded[:, 1::2] = np.cos(angles)
+        names = [f'{col}_{part}' for col in columns for part in ('sin', 'cos')]
+        return pd.concat([X.drop(columns=columns), pd.DataFrame(encoded, index=X.index, columns=names)], axis=1)
 
 def create_preprocessor(cyclical_columns_periods):
     """
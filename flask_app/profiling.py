@@ -0,0 +1,257 @@
+# profiling.py
+#
+# On-demand cProfile captures, kept in a bounded on-disk ring shared by every process that uses
+# the same directory (API workers and training runs). A capture profiles the calling thread;
+# functions it sends to a process pool through worker_call() are profiled in the worker and saved
+# next to it, so a fit on the forecast pool shows up in the same profile.
+
+import cProfile
+import io
+import json
+import logging
+import marshal
+import os
+import pstats
+import re
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from datetime import datetime, timezone
+from pathlib import Path
+
+PROFILE_SUFFIX = '.prof'
+METADATA_SUFFIX = '.json'
+
+# Profile ids are generated by ProfileStore.new_id(); anything else is rejected before touching the disk
+_ID_PATTERN = re.compile(r'^\d{8}-\d{9}-[0-9a-f]{8}$')
+
+# Worker processes keep one profiler per capture they ran functions for, and at most this many
+WORKER_PROFILERS = 8
+
+_local = threading.local()
+_worker_profilers = OrderedDict()
+
+
+def start_profiler():
+    """
+    Return an enabled cProfile.Profile, or None if another profiler is already active
+    (Python 3.12+ allows only one per process).
+    """
+    profiler = cProfile.Profile()
+    try:
+        profiler.enable()
+    except ValueError:
+        return None
+    return profiler
+
+
+def current_capture():
+    """
+    Return the capture active on this thread, or None.
+    """
+    return getattr(_local, 'capture', None)
+
+
+def worker_call(fn):
+    """
+    Return fn, wrapped so that it profiles itself in a worker process if a capture is active on
+    this thread. Pass the result to a process pool instead of fn.
+    """
+    capture = current_capture()
+    if capture is None or capture.profile_id is None:
+        return fn
+    return WorkerCall(capture.store.directory, capture.profile_id, fn)
+
+
+class WorkerCall:
+    """
+    Picklable wrapper running fn under a per-capture profiler in a worker process. The profiler
+    accumulates over every call the worker runs for the capture, and its statistics are written
+    to '<profile id>.worker-<pid>.prof' after each call.
+    """
+
+    def __init__(self, directory, profile_id, fn):
+        self.directory = str(directory)
+        self.profile_id = profile_id
+        self.fn = fn
+        self.parent_pid = os.getpid()
+
+    def __call__(self, *args, **kwargs):
+        # In-process the caller's capture already sees the call
+        if os.getpid() == self.parent_pid:
+            return self.fn(*args, **kwargs)
+        profiler = _worker_profilers.pop(self.profile_id, None) or cProfile.Profile()
+        _worker_profilers[self.profile_id] = profiler
+        while len(_worker_profilers) > WORKER_PROFILERS:
+            _worker_profilers.popitem(last=False)
+        try:
+            profiler.enable()
+        except ValueError:
+            return self.fn(*args, **kwargs)
+        try:
+            return self.fn(*args, **kwargs)
+        finally:
+            profiler.disable()
+            try:
+                os.makedirs(self.directory, exist_ok=True)
+                profiler.dump_stats(os.path.join(self.directory,
+                                                 f"{self.profile_id}.worker-{os.getpid()}{PROFILE_SUFFIX}"))
+            except OSError as e:
+                logging.warning(f"Could not save the worker profile of {self.profile_id}: {e}")
+
+
+class Capture:
+    """
+    Context manager profiling the calling thread into a ProfileStore. metadata may be extended
+    inside the block (e.g. with a response status) and is saved with the profile on exit.
+    profile_id stays None if profiling could not start, in which case nothing is saved.
+    """
+
+    def __init__(self, store, kind, metadata):
+        self.store = store
+        self.kind = kind
+        self.metadata = dict(metadata)
+        self.profile_id = None
+        self._profiler = None
+        self._started = None
+        self._previous = None
+
+    def __enter__(self):
+        self._profiler = start_profiler()
+        if self._profiler is None:
+            logging.warning(f"Another profiler is active; the {self.kind} runs unprofiled.")
+            return self
+        self.profile_id = self.store.new_id()
+        self._started = time.perf_counter()
+        self._previous = current_capture()
+        _local.capture = self
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        if self._profiler is None:
+            return False
+        self._profiler.disable()
+        _local.capture = self._previous
+        elapsed = time.perf_counter() - self._started
+        metadata = {
+            'id': self.profile_id,
+            'kind': self.kind,
+            'created': datetime.now(timezone.utc).isoformat(),
+            'elapsed_seconds': round(elapsed, 6),
+            'pid': os.getpid(),
+            **self.metadata
+        }
+        if exc_type is not None:
+            metadata['error'] = f"{exc_type.__name__}: {exc_value}"
+        try:
+            self.store.save(self.profile_id, self._profiler, metadata)
+            logging.info(f"Saved {self.kind} profile {self.profile_id} ({elapsed * 1000:.1f}ms).")
+        except OSError as e:
+            logging.error(f"Could not save {self.kind} profile {self.profile_id}: {e}")
+        return False
+
+
+class ProfileStore:
+    """
+    Directory of profiles, each a '<id>.prof' cProfile dump with a '<id>.json' metadata file plus
+    any worker dumps. Only the newest max_profiles profiles are kept; ids sort by creation time.
+    """
+
+    def __init__(self, directory, max_profiles=50):
+        self.directory = Path(directory)
+        self.max_profiles = max_profiles
+
+    def new_id(self):
+        """
+        Return a new profile id: the UTC creation time to the millisecond and a random suffix.
+        """
+        now = time.time()
+        timestamp = time.strftime('%Y%m%d-%H%M%S', time.gmtime(now))
+        return f"{timestamp}{int(now * 1000) % 1000:03d}-{uuid.uuid4().hex[:8]}"
+
+    def capture(self, kind, metadata=None):
+        """
+        Return a Capture profiling a block of the calling thread into this store.
+        """
+        return Capture(self, kind, metadata or {})
+
+    def save(self, profile_id, profiler, metadata):
+        """
+        Write a profile and its metadata, then drop the oldest profiles beyond max_profiles.
+        """
+        self.directory.mkdir(parents=True, exist_ok=True)
+        profiler.dump_stats(str(self.directory / f"{profile_id}{PROFILE_SUFFIX}"))
+        # The metadata file is written last and atomically; it is what makes a profile listed
+        temporary = self.directory / f"{profile_id}{METADATA_SUFFIX}.tmp"
+        temporary.write_text(json.dumps(metadata, default=str))
+        os.replace(temporary, self.directory / f"{profile_id}{METADATA_SUFFIX}")
+        self._trim()
+
+    def _ids(self):
+        if not self.directory.is_dir():
+            return []
+        return sorted(path.name[:-len(METADATA_SUFFIX)] for path in self.directory.glob(f'*{METADATA_SUFFIX}')
+                      if _ID_PATTERN.match(path.name[:-len(METADATA_SUFFIX)]))
+
+    def _trim(self):
+        ids = self._ids()
+        for profile_id in ids[:max(len(ids) - self.max_profiles, 0)]:
+            # Metadata first, so a concurrent list() never shows a half-deleted profile
+            for path in [self.directory / f"{profile_id}{METADATA_SUFFIX}", *self._files(profile_id)]:
+                try:
+                    path.unlink()
+                except FileNotFoundError:
+                    pass
+
+    def _files(self, profile_id):
+        return sorted(self.directory.glob(f"{profile_id}*{PROFILE_SUFFIX}"))
+
+    def list(self):
+        """
+        Return the metadata of the stored profiles, newest first, with the number of worker
+        dumps and the total size of each.
+        """
+        profiles = []
+        for profile_id in reversed(self._ids()):
+            try:
+                metadata = json.loads((self.directory / f"{profile_id}{METADATA_SUFFIX}").read_text())
+                files = self._files(profile_id)
+                metadata['worker_profiles'] = len(files) - 1
+                metadata['size_bytes'] = sum(path.stat().st_size for path in files)
+            except (FileNotFoundError, ValueError):
+                continue
+            profiles.append(metadata)
+        return profiles
+
+    def load(self, profile_id, stream=None):
+        """
+        Return the pstats.Stats of a profile with its worker dumps merged in.
+        Raises KeyError if there is no such profile.
+        """
+        main = self.directory / f"{profile_id}{PROFILE_SUFFIX}"
+        if not _ID_PATTERN.match(profile_id) or not main.is_file():
+            raise KeyError(profile_id)
+        stats = pstats.Stats(str(main), stream=stream)
+        for path in self._files(profile_id):
+            if path != main:
+                try:
+                    stats.add(str(path))
+                except (OSError, EOFError, ValueError) as e:
+                    logging.warning(f"Skipping unreadable worker profile '{path.name}': {e}")
+        return stats
+
+    def export(self, profile_id):
+        """
+        Return a profile, worker dumps merged in, in the binary format pstats.Stats() and
+        viewers such as snakeviz read.
+        """
+        return marshal.dumps(self.load(profile_id).stats)
+
+    def report(self, profile_id, sort='cumulative', limit=50):
+        """
+        Return the pstats text report of a profile's top limit functions by sort.
+        """
+        stream = io.StringIO()
+        self.load(profile_id, stream=stream).sort_stats(sort).print_stats(limit)
+        return stream.getvalue()
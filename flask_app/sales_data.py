@@ -0,0 +1,293 @@
+# sales_data.py
+
+import calendar
+import logging
+import time
+from contextlib import contextmanager
+from datetime import date, timedelta
+
+import pandas as pd
+from sqlalchemy import create_engine, inspect, text
+from sqlalchemy.engine import make_url
+
+# Daily rollup of the laundry table, maintained by the triggers in sql/laundry_daily_sales.sql.
+# Day-level rows are kept (rather than months) so the day filter of /predict can be answered too.
+ROLLUP_TABLE = 'laundry_daily_sales'
+ROLLUP_RECHECK_SECONDS = 300    # Seconds before the rollup table is inspected again, e.g. once it has been created
+
+# asyncio drivers used by create_async_db_engine, per database backend
+ASYNC_DRIVERS = {'mysql': 'aiomysql', 'sqlite': 'aiosqlite'}
+
+_rollup_columns = {}    # Database URL -> (rollup columns or None, time.monotonic() of the inspection)
+
+
+def create_db_engine(config):
+    """
+    Create the SQLAlchemy engine for config.DATABASE_URI with the pool settings of config.
+    """
+    options = {'pool_pre_ping': config.DB_POOL_PRE_PING, 'pool_recycle': config.DB_POOL_RECYCLE}
+    # SQLite (used by the benchmark) does not take pool sizing options
+    if make_url(config.DATABASE_URI).get_backend_name() != 'sqlite':
+        options.update(pool_size=config.DB_POOL_SIZE, max_overflow=config.DB_MAX_OVERFLOW)
+    return create_engine(config.DATABASE_URI, **options)
+
+
+def create_async_db_engine(config):
+    """
+    Create the SQLAlchemy AsyncEngine used by the ASGI serving mode, with the pool settings of
+    config. Its URI is config.ASYNC_DATABASE_URI, or config.DATABASE_URI with the backend's
+    ASYNC_DRIVERS driver (mysql+pymysql becomes mysql+aiomysql, sqlite becomes sqlite+aiosqlite).
+    """
+    from sqlalchemy.ext.asyncio import create_async_engine
+
+    url = make_url(config.ASYNC_DATABASE_URI or config.DATABASE_URI)
+    backend = url.get_backend_name()
+    if not config.ASYNC_DATABASE_URI:
+        if backend not in ASYNC_DRIVERS:
+            raise ValueError(f"No asyncio driver known for '{backend}'; set ASYNC_DATABASE_URI.")
+        url = url.set(drivername=f"{backend}+{ASYNC_DRIVERS[backend]}")
+    options = {'pool_pre_ping': config.DB_POOL_PRE_PING, 'pool_recycle': config.DB_POOL_RECYCLE}
+    if backend != 'sqlite':
+        options.update(pool_size=config.DB_POOL_SIZE, max_overflow=config.DB_MAX_OVERFLOW)
+    return create_async_engine(url, **options)
+
+
+def has_rollup(engine, *columns):
+    """
+    Return True if the daily rollup table exists and has the given columns besides SALE_DATE,
+    TOTAL and ORDER_COUNT. engine may also be a connection. The table's columns are cached per
+    database URL for ROLLUP_RECHECK_SECONDS, or until a query fails (see rollup_errors).
+    """
+    key = str(engine.engine.url)
+    cached = _rollup_columns.get(key)
+    if cached is None or time.monotonic() - cached[1] >= ROLLUP_RECHECK_SECONDS:
+        inspector = inspect(engine)
+        if inspector.has_table(ROLLUP_TABLE):
+            available = {column['name'].upper() for column in inspector.get_columns(ROLLUP_TABLE)}
+        else:
+            available = None
+        # Warn when the table is first seen without what it needs, not on every recheck
+        if cached is None or cached[0] != available:
+            if available is None:
+                logging.warning(f"Rollup table '{ROLLUP_TABLE}' not found; aggregating directly from 'laundry'.")
+            elif 'PAID_TOTAL' not in available:
+                logging.warning(f"Rollup table '{ROLLUP_TABLE}' has no PAID_TOTAL column; rerun "
+                                f"sql/laundry_daily_sales.sql to add it. Paid sales are aggregated from 'laundry'.")
+        cached = _rollup_columns[key] = (available, time.monotonic())
+    available = cached[0]
+    return available is not None and all(column in available for column in columns)
+
+
+@contextmanager
+def rollup_errors(engine):
+    """
+    Forget the cached rollup columns of engine's database if the block raises, so that the next
+    query inspects the table again instead of failing until the recheck (e.g. after the rollup
+    table was dropped or altered).
+    """
+    try:
+        yield
+    except Exception:
+        _rollup_columns.pop(str(engine.engine.url), None)
+        raise
+
+
+def date_filter(year=None, month=None, day=None, column='DATE'):
+    """
+    Build WHERE conditions for the year/month/day filters.
+    Whenever the year is known the filter is expressed as a half-open date range on the column
+    so it can use an index; month or day filters without a year fall back to MONTH()/DAY().
+
+    Returns:
+        tuple: (list of condition strings, dict of bound parameters)
+    """
+    conditions = []
+    params = {}
+
+    if year and month:
+        start = date(year, month, day or 1)
+        if day:
+            end = start + timedelta(days=1)
+        else:
+            end = start + timedelta(days=calendar.monthrange(year, month)[1])
+        conditions += [f"{column} >= :start_date", f"{column} < :end_date"]
+        params.update(start_date=start, end_date=end)
+        return conditions, params
+
+    if year:
+        conditions += [f"{column} >= :start_date", f"{column} < :end_date"]
+        params.update(start_date=date(year, 1, 1), end_date=date(year + 1, 1, 1))
+    elif month:
+        conditions.append(f"MONTH({column}) = :month")
+        params['month'] = month
+    if day:
+        conditions.append(f"DAY({column}) = :day")
+        params['day'] = day
+
+    return conditions, params
+
+
+def monthly_sales_query(rollup, year=None, month=None, day=None):
+    """
+    Build the monthly sales query for the filters, against the rollup table if rollup is True.
+
+    Returns:
+        tuple: (query string, dict of bound parameters), or (None, None) if the filters are not a valid date.
+    """
+    if rollup:
+        table, column, total = ROLLUP_TABLE, 'SALE_DATE', 'TOTAL'
+    else:
+        table, column, total = 'laundry', 'DATE', 'TOTAL'
+
+    try:
+        conditions, params = date_filter(year, month, day, column=column)
+    except ValueError as e:
+        logging.warning(f"Invalid date filter year={year}, month={month}, day={day}: {e}")
+        return None, None
+
+    query = (f"SELECT YEAR({column}) AS sales_year, MONTH({column}) AS sales_month, SUM({total}) AS TOTAL "
+             f"FROM {table}")
+    if conditions:
+        query += " WHERE " + " AND ".join(conditions)
+    query += " GROUP BY sales_year, sales_month ORDER BY sales_year, sales_month"
+    return query, params
+
+
+def monthly_sales_frame(df):
+    """
+    Convert the rows of a monthly sales query to the 'DATE' (month end) and 'TOTAL' frame.
+    """
+    if df.empty:
+        return pd.DataFrame(columns=['DATE', 'TOTAL'])
+    df['DATE'] = pd.to_datetime(dict(year=df['sales_year'], month=df['sales_month'], day=1)) + pd.offsets.MonthEnd(0)
+    df['TOTAL'] = df['TOTAL'].astype(float)
+    return df[['DATE', 'TOTAL']]
+
+
+def fetch_monthly_sales(engine, year=None, month=None, day=None):
+    """
+    Fetch monthly sales totals, aggregated in the database.
+
+    Returns:
+        DataFrame: One row per month with data, with 'DATE' (month end) and 'TOTAL' columns.
+    """
+    query, params = monthly_sales_query(has_rollup(engine), year, month, day)
+    if query is None:
+        return pd.DataFrame(columns=['DATE', 'TOTAL'])
+
+    logging.info(f"Executing query: {query} with params: {params}")
+    with rollup_errors(engine):
+        return monthly_sales_frame(pd.read_sql(text(query), engine, params=params))
+
+
+async def fetch_monthly_sales_async(engine, year=None, month=None, day=None):
+    """
+    fetch_monthly_sales on an AsyncEngine: the request waits on the database as a coroutine
+    instead of holding a thread.
+    """
+    async with engine.connect() as connection:
+        query, params = monthly_sales_query(await connection.run_sync(has_rollup), year, month, day)
+        if query is None:
+            return pd.DataFrame(columns=['DATE', 'TOTAL'])
+        logging.info(f"Executing query: {query} with params: {params}")
+        with rollup_errors(connection):
+            result = await connection.execute(text(query), params)
+        df = pd.DataFrame(result.all(), columns=list(result.keys()))
+    return monthly_sales_frame(df)
+
+
+def fetch_daily_sales(engine):
+    """
+    Fetch the sales total of every day with orders in one grouped query.
+
+    Returns:
+        DataFrame: One row per day with 'sales_year', 'sales_month', 'sales_day' and 'TOTAL' columns.
+    """
+    if has_rollup(engine):
+        table, column, total = ROLLUP_TABLE, 'SALE_DATE', 'TOTAL'
+    else:
+        table, column, total = 'laundry', 'DATE', 'TOTAL'
+    query = (f"SELECT YEAR({column}) AS sales_year, MONTH({column}) AS sales_month, DAY({column}) AS sales_day, "
+             f"SUM({total}) AS TOTAL FROM {table} GROUP BY sales_year, sales_month, sales_day "
+             f"ORDER BY sales_year, sales_month, sales_day")
+    with rollup_errors(engine):
+        df = pd.read_sql(text(query), engine)
+    df['TOTAL'] = df['TOTAL'].astype(float)
+    return df
+
+
+def fetch_monthly_sales_by_service(engine, year=None, month=None, day=None):
+    """
+    Fetch monthly sales totals for every SERVICE in one grouped query.
+
+    Returns:
+        DataFrame: Months as a continuous month-end index, one column per service, zero-filled.
+    """
+    try:
+        conditions, params = date_filter(year, month, day)
+    except ValueError as e:
+        logging.warning(f"Invalid date filter year={year}, month={month}, day={day}: {e}")
+        return pd.DataFrame()
+
+    query = ("SELECT COALESCE(SERVICE, 'Unspecified') AS service, YEAR(DATE) AS sales_year, "
+             "MONTH(DATE) AS sales_month, SUM(TOTAL) AS TOTAL FROM laundry")
+    if conditions:
+        query += " WHERE " + " AND ".join(conditions)
+    query += " GROUP BY service, sales_year, sales_month"
+
+    logging.info(f"Executing query: {query} with params: {params}")
+    df = pd.read_sql(text(query), engine, params=params)
+    if df.empty:
+        return pd.DataFrame()
+
+    df['DATE'] = pd.to_datetime(dict(year=df['sales_year'], month=df['sales_month'], day=1)) + pd.offsets.MonthEnd(0)
+    wide = df.pivot_table(index='DATE', columns='service', values='TOTAL', aggfunc='sum').astype(float)
+    all_months = pd.date_range(start=wide.index.min(), end=wide.index.max(), freq='M')
+    return wide.reindex(all_months, fill_value=0).fillna(0)
+
+
+def fetch_month_watermarks(engine, paid=False):
+    """
+    Fetch a watermark per month of the laundry data in one grouped query: the number of orders
+    and their total. A month's watermark changes whenever its rows are added, removed or re-priced.
+    With paid, the total of the orders with PAYMENT_STATUS 'Paid' is included too, so that
+    payments recorded on existing orders change it as well.
+
+    Returns:
+        dict: (year, month) -> (row count, total), or (row count, total, paid total) with paid
+    """
+    if has_rollup(engine, *(['PAID_TOTAL'] if paid else [])):
+        paid_column = ", SUM(PAID_TOTAL) AS paid_total" if paid else ""
+        query = text(f"SELECT YEAR(SALE_DATE) AS sales_year, MONTH(SALE_DATE) AS sales_month, "
+                     f"SUM(ORDER_COUNT) AS row_count, SUM(TOTAL) AS total{paid_column} FROM {ROLLUP_TABLE} "
+                     f"GROUP BY sales_year, sales_month")
+    else:
+        paid_column = (", SUM(CASE WHEN PAYMENT_STATUS = 'Paid' THEN TOTAL ELSE 0 END) AS paid_total"
+                       if paid else "")
+        query = text(f"SELECT YEAR(DATE) AS sales_year, MONTH(DATE) AS sales_month, "
+                     f"COUNT(*) AS row_count, SUM(TOTAL) AS total{paid_column} FROM laundry "
+                     f"GROUP BY sales_year, sales_month")
+    with rollup_errors(engine), engine.connect() as connection:
+        rows = connection.execute(query).all()
+    watermarks = {}
+    for row in rows:
+        if row.sales_year is None:
+            continue
+        watermark = (int(row.row_count or 0), round(float(row.total or 0), 2))
+        if paid:
+            watermark += (round(float(row.paid_total or 0), 2),)
+        watermarks[(int(row.sales_year), int(row.sales_month))] = watermark
+    return watermarks
+
+
+def rebuild_rollup(engine):
+    """
+    Rebuild the daily rollup table from the laundry table.
+    """
+    with engine.begin() as connection:
+        connection.execute(text(f"DELETE FROM {ROLLUP_TABLE}"))
+        connection.execute(text(
+            f"INSERT INTO {ROLLUP_TABLE} (SALE_DATE, TOTAL, ORDER_COUNT, PAID_TOTAL) "
+            f"SELECT DATE(DATE), SUM(TOTAL), COUNT(*), "
+            f"SUM(CASE WHEN PAYMENT_STATUS = 'Paid' THEN TOTAL ELSE 0 END) FROM laundry GROUP BY DATE(DATE)"))
+    logging.info(f"Rollup table '{ROLLUP_TABLE}' rebuilt from 'laundry'.")
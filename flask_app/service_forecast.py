@@ -0,0 +1,110 @@
+# service_forecast.py
+
+import hashlib
+import logging
+
+import numpy as np
+
+from forecast_cache import ForecastCache
+from forecast_jobs import sarimax_forecast_interval
+
+# Name under which the aggregate of all services is reported
+TOTAL_SERIES = 'TOTAL'
+
+
+class ServiceForecaster:
+    """
+    Forecasts the monthly sales of every SERVICE, plus their total, in one pass.
+    Series are fitted in parallel on the forecast process pool, and each series' forecast is
+    cached under a fingerprint of its values, so only services whose data changed are refitted.
+    """
+
+    def __init__(self, job_manager, order, seasonal_order, cache_entries=256, cache_ttl_seconds=3600,
+                 fit_timeout=None, batch_timeout=None):
+        """
+        Initializes the ServiceForecaster.
+
+        Parameters:
+            job_manager (ForecastJobManager): Provides the worker pool used for the fits.
+            order (tuple): SARIMAX (p, d, q) order used for every series.
+            seasonal_order (tuple): SARIMAX (P, D, Q, s) seasonal order used for every series.
+            cache_entries (int): Maximum number of cached per-series forecasts.
+            cache_ttl_seconds (float): Seconds before a cached per-series forecast expires.
+            fit_timeout (float): Seconds a single fit may run before it gives up.
+            batch_timeout (float): Seconds forecast() waits for all of its fits.
+        """
+        self.job_manager = job_manager
+        self.order = order
+        self.seasonal_order = seasonal_order
+        self.cache = ForecastCache(max_entries=cache_entries, ttl_seconds=cache_ttl_seconds)
+        self.fit_timeout = fit_timeout
+        self.batch_timeout = batch_timeout
+
+    @staticmethod
+    def _series_key(name, y, steps, alpha):
+        fingerprint = hashlib.sha1(np.ascontiguousarray(y, dtype=float).tobytes()).hexdigest()
+        return (name, len(y), fingerprint, steps, alpha)
+
+    def forecast(self, wide, steps=1, alpha=0.05, reconcile=True):
+        """
+        Forecast every column of wide (months x services) and the row-wise total.
+
+        With reconcile=True the service forecasts are scaled proportionally, per step, so that
+        they sum to the forecast of the total series. Interval bounds are scaled by the same factor.
+        Raises JobQueueFull if the forecast queue has no room for the fits.
+
+        Returns:
+            tuple: (forecasts, errors, fitted) where forecasts maps series name to (mean, lower,
+                   upper) arrays, errors maps series name to an error message, and fitted is the
+                   number of series that had to be fitted (the rest came from the cache).
+        """
+        series = {name: wide[name].to_numpy(dtype=float) for name in wide.columns}
+        series[TOTAL_SERIES] = wide.sum(axis=1).to_numpy(dtype=float)
+
+        forecasts = {}
+        errors = {}
+        pending = []
+        for name, y in series.items():
+            key = self._series_key(name, y, steps, alpha)
+            cached = self.cache.get(key)
+            if cached is not None:
+                forecasts[name] = cached
+            else:
+                pending.append((name, key, y))
+
+        outcomes = self.job_manager.run_batch(
+            sarimax_forecast_interval,
+            [(y, self.order, self.seasonal_order, steps, alpha, self.fit_timeout) for _, _, y in pending],
+            timeout=self.batch_timeout)
+        for (name, key, _), (result, error) in zip(pending, outcomes):
+            if error is not None:
+                logging.warning(f"Forecast for service '{name}' failed: {error}")
+                errors[name] = error
+                continue
+            mean, lower, upper = (np.maximum(np.asarray(values), 0) for values in result)
+            forecasts[name] = (mean, lower, upper)
+            self.cache.put(key, forecasts[name])
+
+        logging.info(f"Service forecasts: {len(series)} series, {len(pending)} fitted, "
+                     f"{len(series) - len(pending)} from cache.")
+
+        if reconcile:
+            forecasts = self._reconcile(forecasts, errors)
+        return forecasts, errors, len(pending)
+
+    @staticmethod
+    def _reconcile(forecasts, errors):
+        """
+        Scale the service forecasts so that, at every step, they sum to the total forecast.
+        """
+        if errors or TOTAL_SERIES not in forecasts:
+            logging.warning("Skipping reconciliation because some series could not be forecast.")
+            return forecasts
+        services = [name for name in forecasts if name != TOTAL_SERIES]
+        service_sum = np.sum([forecasts[name][0] for name in services], axis=0)
+        total = forecasts[TOTAL_SERIES][0]
+        scale = np.divide(total, service_sum, out=np.ones_like(total), where=service_sum > 0)
+        reconciled = {TOTAL_SERIES: forecasts[TOTAL_SERIES]}
+        for name in services:
+            reconciled[name] = tuple(values * scale for values in forecasts[name])
+        return reconciled
@@ -0,0 +1,111 @@
+# single_flight.py
+
+import asyncio
+import threading
+
+
+class _Call:
+    def __init__(self):
+        self.done = threading.Event()
+        self.value = None
+        self.error = None
+
+
+class SingleFlight:
+    """
+    Coalesces concurrent calls that share a key: the first caller runs the function and
+    callers arriving while it is in flight wait for, and receive, the same result (or exception).
+    Nothing is kept once the call completes; caching is left to ForecastCache.
+    """
+
+    def __init__(self):
+        self._calls = {}
+        self._lock = threading.Lock()
+        self._executed = 0
+        self._coalesced = 0
+
+    def do(self, key, fn, *args, **kwargs):
+        """
+        Run fn(*args, **kwargs) unless a call for key is already in flight, in which case wait for it.
+
+        Returns:
+            tuple: (value, shared) where shared is True if the value came from another caller's execution.
+        """
+        with self._lock:
+            call = self._calls.get(key)
+            if call is not None:
+                self._coalesced += 1
+                leader = False
+            else:
+                call = self._calls[key] = _Call()
+                self._executed += 1
+                leader = True
+
+        if not leader:
+            call.done.wait()
+            if call.error is not None:
+                raise call.error
+            return call.value, True
+
+        try:
+            call.value = fn(*args, **kwargs)
+        except BaseException as e:
+            call.error = e
+            raise
+        finally:
+            with self._lock:
+                del self._calls[key]
+            call.done.set()
+        return call.value, False
+
+    def stats(self):
+        """
+        Return the number of in-flight keys, executions and coalesced calls.
+        """
+        with self._lock:
+            return {
+                'in_flight': len(self._calls),
+                'executed': self._executed,
+                'coalesced': self._coalesced
+            }
+
+
+class AsyncSingleFlight:
+    """
+    SingleFlight for coroutines on one event loop: callers for a key in flight await the same
+    task instead of a thread each. The task is shielded, so a caller that goes away (e.g. a
+    disconnected client) does not cancel the work the others are waiting for.
+    """
+
+    def __init__(self):
+        self._tasks = {}
+        self._executed = 0
+        self._coalesced = 0
+
+    async def do(self, key, fn, *args, **kwargs):
+        """
+        Await fn(*args, **kwargs), a coroutine function, unless a call for key is already in
+        flight, in which case await that one.
+
+        Returns:
+            tuple: (value, shared) where shared is True if the value came from another caller's execution.
+        """
+        task = self._tasks.get(key)
+        shared = task is not None
+        if shared:
+            self._coalesced += 1
+        else:
+            task = self._tasks[key] = asyncio.ensure_future(fn(*args, **kwargs))
+            task.add_done_callback(lambda _: self._tasks.pop(key, None))
+            self._executed += 1
+        return await asyncio.shield(task), shared
+
+    def stats(self):
+        """
+        Return the number of in-flight keys, executions and coalesced calls.
+        """
+        return {
+            'in_flight': len(self._tasks),
+            'executed': self._executed,
+            'coalesced': self._coalesced
+        }
@@ -0,0 +1,86 @@
+-- laundry_daily_sales.sql
+--
+-- Daily rollup of laundry sales used by the forecasting service (see sales_data.py).
+-- The rollup is kept in sync by triggers, so fetching the monthly series reads one row per
+-- day instead of every laundry transaction. PAID_TOTAL lets the dashboard aggregates notice
+-- payments recorded on existing orders. Run once against dbcapstone; rerunning it is safe and
+-- upgrades an existing rollup (e.g. adds PAID_TOTAL) while the PHP side keeps writing:
+--
+--     mysql -u root dbcapstone < sql/laundry_daily_sales.sql
+
+-- Index so filters on DATE can use range scans
+SET @statement = IF((SELECT COUNT(*) FROM information_schema.statistics
+                     WHERE table_schema = DATABASE() AND table_name = 'laundry' AND index_name = 'idx_laundry_date') = 0,
+                    'CREATE INDEX idx_laundry_date ON laundry (`DATE`)', 'DO 0');
+PREPARE statement FROM @statement;
+EXECUTE statement;
+DEALLOCATE PREPARE statement;
+
+CREATE TABLE IF NOT EXISTS laundry_daily_sales (
+    SALE_DATE DATE NOT NULL PRIMARY KEY,
+    TOTAL DECIMAL(14, 2) NOT NULL DEFAULT 0,
+    ORDER_COUNT INT NOT NULL DEFAULT 0,
+    PAID_TOTAL DECIMAL(14, 2) NOT NULL DEFAULT 0
+);
+
+-- Rollups created before PAID_TOTAL existed
+SET @statement = IF((SELECT COUNT(*) FROM information_schema.columns
+                     WHERE table_schema = DATABASE() AND table_name = 'laundry_daily_sales'
+                       AND column_name = 'PAID_TOTAL') = 0,
+                    'ALTER TABLE laundry_daily_sales ADD COLUMN PAID_TOTAL DECIMAL(14, 2) NOT NULL DEFAULT 0', 'DO 0');
+PREPARE statement FROM @statement;
+EXECUTE statement;
+DEALLOCATE PREPARE statement;
+
+DROP TRIGGER IF EXISTS laundry_daily_sales_ai;
+DROP TRIGGER IF EXISTS laundry_daily_sales_au;
+DROP TRIGGER IF EXISTS laundry_daily_sales_ad;
+
+DELIMITER //
+
+CREATE TRIGGER laundry_daily_sales_ai AFTER INSERT ON laundry
+FOR EACH ROW
+BEGIN
+    INSERT INTO laundry_daily_sales (SALE_DATE, TOTAL, ORDER_COUNT, PAID_TOTAL)
+    VALUES (DATE(NEW.`DATE`), COALESCE(NEW.TOTAL, 0), 1, IF(NEW.PAYMENT_STATUS = 'Paid', COALESCE(NEW.TOTAL, 0), 0))
+    ON DUPLICATE KEY UPDATE TOTAL = TOTAL + COALESCE(NEW.TOTAL, 0), ORDER_COUNT = ORDER_COUNT + 1,
+        PAID_TOTAL = PAID_TOTAL + IF(NEW.PAYMENT_STATUS = 'Paid', COALESCE(NEW.TOTAL, 0), 0);
+END//
+
+CREATE TRIGGER laundry_daily_sales_au AFTER UPDATE ON laundry
+FOR EACH ROW
+BEGIN
+    UPDATE laundry_daily_sales
+    SET TOTAL = TOTAL - COALESCE(OLD.TOTAL, 0), ORDER_COUNT = ORDER_COUNT - 1,
+        PAID_TOTAL = PAID_TOTAL - IF(OLD.PAYMENT_STATUS = 'Paid', COALESCE(OLD.TOTAL, 0), 0)
+    WHERE SALE_DATE = DATE(OLD.`DATE`);
+
+    INSERT INTO laundry_daily_sales (SALE_DATE, TOTAL, ORDER_COUNT, PAID_TOTAL)
+    VALUES (DATE(NEW.`DATE`), COALESCE(NEW.TOTAL, 0), 1, IF(NEW.PAYMENT_STATUS = 'Paid', COALESCE(NEW.TOTAL, 0), 0))
+    ON DUPLICATE KEY UPDATE TOTAL = TOTAL + COALESCE(NEW.TOTAL, 0), ORDER_COUNT = ORDER_COUNT + 1,
+        PAID_TOTAL = PAID_TOTAL + IF(NEW.PAYMENT_STATUS = 'Paid', COALESCE(NEW.TOTAL, 0), 0);
+END//
+
+CREATE TRIGGER laundry_daily_sales_ad AFTER DELETE ON laundry
+FOR EACH ROW
+BEGIN
+    UPDATE laundry_daily_sales
+    SET TOTAL = TOTAL - COALESCE(OLD.TOTAL, 0), ORDER_COUNT = ORDER_COUNT - 1,
+        PAID_TOTAL = PAID_TOTAL - IF(OLD.PAYMENT_STATUS = 'Paid', COALESCE(OLD.TOTAL, 0), 0)
+    WHERE SALE_DATE = DATE(OLD.`DATE`);
+END//
+
+DELIMITER ;
+
+-- (Re)build the rollup from the existing transactions, after the triggers exist. The shared
+-- next-key locks on every laundry row block inserts, updates and deletes (and so their
+-- triggers) until the commit; they then apply to the rebuilt rows. Readers keep seeing the
+-- previous rows until the commit.
+SET TRANSACTION ISOLATION LEVEL REPEATABLE READ;
+START TRANSACTION;
+SELECT COUNT(*) FROM laundry LOCK IN SHARE MODE;
+DELETE FROM laundry_daily_sales;
+INSERT INTO laundry_daily_sales (SALE_DATE, TOTAL, ORDER_COUNT, PAID_TOTAL)
+SELECT DATE(`DATE`), SUM(TOTAL), COUNT(*), SUM(IF(PAYMENT_STATUS = 'Paid', TOTAL, 0))
+FROM laundry GROUP BY DATE(`DATE`);
+COMMIT;
@@ -0,0 +1,94 @@
+# conftest.py
+#
+# The tests run against the SQLite stand-in that benchmark.py builds: synthetic laundry data in a
+# temporary database, with the MySQL date functions registered on every SQLite connection. The
+# service reads its configuration from the environment when config is first imported, so it is
+# pointed at the temporary directory here, before any test imports the service.
+#
+# Run from the repository root or flask_app:
+#     python -m pytest -q
+
+import os
+import shutil
+import sys
+import tempfile
+from pathlib import Path
+
+import pytest
+
+APP_DIR = Path(__file__).resolve().parents[1]
+TEST_DIR = Path(tempfile.mkdtemp(prefix='sales-forecast-tests-'))
+
+# Synthetic data: enough months for the seasonal models, small enough to generate in seconds
+TEST_ROWS = 20000
+TEST_YEARS = 3
+TEST_SERVICES = 3
+
+os.environ.update({
+    'DATABASE_URI': f"sqlite:///{TEST_DIR / 'laundry.db'}",
+    'LOG_FILE': str(TEST_DIR / 'api.log'),
+    'PROFILE_DIR': str(TEST_DIR / 'profiles'),
+    'JOB_STATUS_DIR': str(TEST_DIR / 'jobs'),
+    'CHANGE_POLL_SECONDS': '0',     # Every snapshot read polls, so data changes are seen at once
+    'PRECOMPUTE_HOURS': '',         # No scheduled precomputation runs
+})
+
+# The service's modules are top-level modules of flask_app, and its model files are read
+# relative to the working directory
+sys.path.insert(0, str(APP_DIR))
+os.chdir(APP_DIR)
+
+import benchmark  # noqa: E402
+
+benchmark.install_sqlite_functions()
+
+
+@pytest.fixture(scope='session', autouse=True)
+def test_directory():
+    yield TEST_DIR
+    shutil.rmtree(TEST_DIR, ignore_errors=True)
+
+
+@pytest.fixture(scope='session')
+def engine():
+    """
+    Engine of the stand-in database, filled with benchmark.py's synthetic data and rollup.
+    """
+    from sqlalchemy import create_engine
+
+    engine = create_engine(os.environ['DATABASE_URI'])
+    benchmark.populate_database(engine, TEST_ROWS, TEST_YEARS, TEST_SERVICES)
+    yield engine
+    engine.dispose()
+
+
+@pytest.fixture(scope='session')
+def df_features(engine):
+    """
+    Monthly sales features of the stand-in's full series, as /predict prepares them.
+    """
+    from predict_sales import prepare_data
+    from sales_data import fetch_monthly_sales
+
+    _, _, df_features = prepare_data(fetch_monthly_sales(engine))
+    return df_features
+
+
+@pytest.fixture(scope='session')
+def service(engine):
+    """
+    The predict_sales module, warmed up against the stand-in, with its background threads and
+    worker pools stopped at the end of the session.
+    """
+    import predict_sales
+
+    # A refit triggered by the synthetic data would change the model (and ETags) mid-test
+    predict_sales.DRIFT_THRESHOLD = float('inf')
+    predict_sales.warm_up()
+    yield predict_sales
+    predict_sales.shutdown()
+
+
+@pytest.fixture
+def client(service):
+    return service.app.test_client()
@@ -0,0 +1,91 @@
+# test_change_detector.py
+#
+# Watermarks only change for the months whose rows changed, so forecasts and caches of other
+# filters stay valid.
+
+from datetime import date
+
+import pytest
+from sqlalchemy import text
+
+from change_detector import ChangeDetector
+from sales_data import ROLLUP_TABLE
+
+LAST_YEAR = date.today().year - 1
+
+
+@pytest.fixture
+def detector(engine):
+    detector = ChangeDetector(engine, interval_seconds=0)
+    detector.start()
+    yield detector
+    detector.stop()
+
+
+@pytest.fixture
+def revise_march(engine):
+    """
+    Re-price a day of last year's March in the rollup table, restoring it afterwards.
+    """
+    update = text(f"UPDATE {ROLLUP_TABLE} SET TOTAL = TOTAL + :amount WHERE SALE_DATE = "
+                  f"(SELECT MIN(SALE_DATE) FROM {ROLLUP_TABLE} WHERE SALE_DATE >= :start)")
+    start = date(LAST_YEAR, 3, 1)
+
+    def revise(amount=250):
+        with engine.begin() as connection:
+            connection.execute(update, {'amount': amount, 'start': start})
+        revisions.append(amount)
+
+    revisions = []
+    yield revise
+    with engine.begin() as connection:
+        connection.execute(update, {'amount': -sum(revisions), 'start': start})
+
+
+def test_unchanged_data_keeps_watermarks(detector):
+    watermark = detector.watermark()
+    assert detector.poll() == set()
+    assert detector.watermark() == watermark
+
+
+def test_change_is_reported_for_its_month_only(detector, revise_march):
+    notified = []
+    detector.subscribe(notified.append)
+    year_watermark = detector.watermark(LAST_YEAR)
+    other_year = detector.watermark(LAST_YEAR - 1)
+    other_month = detector.watermark(LAST_YEAR, 4)
+
+    revise_march()
+
+    assert detector.poll() == {(LAST_YEAR, 3)}
+    assert notified == [{(LAST_YEAR, 3)}]
+    assert detector.watermark(LAST_YEAR) != year_watermark
+    assert detector.watermark(LAST_YEAR - 1) == other_year
+    assert detector.watermark(LAST_YEAR, 4) == other_month
+
+
+def test_listener_may_read_the_snapshot(detector, revise_march):
+    # With interval_seconds 0 a listener reading the snapshot polls again; it must not deadlock
+    totals = []
+    detector.subscribe(lambda changed: totals.append(detector.monthly_sales(LAST_YEAR)['TOTAL'].sum()))
+    before = detector.monthly_sales(LAST_YEAR)['TOTAL'].sum()
+
+    revise_march(100)
+    detector.poll()
+
+    assert totals == [pytest.approx(before + 100)]
+
+
+def test_digest_is_stable_across_detectors(engine, detector):
+    other = ChangeDetector(engine, interval_seconds=0)
+    assert other.digest(LAST_YEAR, 3) == detector.digest(LAST_YEAR, 3)
+    assert other.digest(LAST_YEAR, 3) != detector.digest(LAST_YEAR, 4)
+
+
+def test_snapshot_serves_monthly_sales(detector):
+    from sales_data import fetch_monthly_sales
+    import pandas as pd
+
+    expected = fetch_monthly_sales(detector.engine, LAST_YEAR)
+    pd.testing.assert_frame_equal(detector.monthly_sales(LAST_YEAR).reset_index(drop=True),
+                                  expected.reset_index(drop=True), check_exact=False, rtol=1e-9)
@@ -0,0 +1,53 @@
+# test_fallback_forecast.py
+#
+# The closed-form fallback picks the richest model the series length supports.
+
+import numpy as np
+import pytest
+
+from fallback_forecast import SEASON, fallback_forecast, seasonal_naive
+
+
+def seasonal_series(months):
+    t = np.arange(months)
+    return 1000 + 10 * t + 200 * np.sin(2 * np.pi * t / SEASON)
+
+
+@pytest.mark.parametrize('months, engine', [
+    (2 * SEASON, 'holt-winters'),
+    (2 * SEASON - 1, 'seasonal-naive'),
+    (SEASON, 'seasonal-naive'),
+    (SEASON - 1, 'holt'),
+    (3, 'holt'),
+    (2, 'naive'),
+    (1, 'naive'),
+])
+def test_engine_follows_series_length(months, engine):
+    forecast, chosen = fallback_forecast(seasonal_series(months), steps=3)
+
+    assert chosen == engine
+    assert forecast.shape == (3,)
+    assert np.all(np.isfinite(forecast))
+
+
+def test_seasonal_naive_repeats_the_last_season():
+    y = np.arange(30, dtype=float)
+    np.testing.assert_array_equal(seasonal_naive(y, steps=14), y[18:30][np.arange(14) % SEASON])
+
+
+def test_naive_repeats_the_last_month():
+    forecast, _ = fallback_forecast([120.0, 250.0], steps=2)
+    np.testing.assert_allclose(forecast, [250.0, 250.0])
+
+
+def test_holt_winters_follows_a_seasonal_pattern():
+    y = seasonal_series(4 * SEASON)
+    forecast, engine = fallback_forecast(y, steps=SEASON)
+
+    assert engine == 'holt-winters'
+    np.testing.assert_allclose(forecast, seasonal_series(5 * SEASON)[-SEASON:], rtol=0.05)
+
+
+def test_negative_sales_are_clipped():
+    forecast, _ = fallback_forecast([-50.0, 0.0, -10.0], steps=1)
+    assert forecast[0] >= 0
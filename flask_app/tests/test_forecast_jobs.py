@@ -0,0 +1,66 @@
+# test_forecast_jobs.py
+#
+# run_batch takes the free job slots and gives every one back, whether its call finished, was
+# dropped or outlived the batch's timeout.
+
+import math
+import time
+
+import pytest
+
+from forecast_jobs import ForecastJobManager, JobQueueFull
+
+
+def wait_until_idle(manager, timeout=30):
+    deadline = time.monotonic() + timeout
+    while manager.stats()['pending'] and time.monotonic() < deadline:
+        time.sleep(0.05)
+    return manager.stats()['pending']
+
+
+@pytest.fixture(scope='module')
+def manager():
+    manager = ForecastJobManager(max_workers=1, max_pending=2)
+    # Start the worker process before any test times its calls
+    manager.run_batch(math.sqrt, [(1,)])
+    yield manager
+    manager.shutdown()
+
+
+def test_batch_runs_every_call_in_order(manager):
+    outcomes = manager.run_batch(math.sqrt, [(value,) for value in (4, 9, 16, 25, 36)])
+
+    assert outcomes == [(2.0, None), (3.0, None), (4.0, None), (5.0, None), (6.0, None)]
+    assert manager.stats()['pending'] == 0
+
+
+def test_failed_calls_report_their_error(manager):
+    outcomes = manager.run_batch(math.sqrt, [(-1,), (4,)])
+
+    assert outcomes[0][0] is None and 'math domain error' in outcomes[0][1]
+    assert outcomes[1] == (2.0, None)
+    assert manager.stats()['pending'] == 0
+
+
+def test_unfinished_calls_keep_their_slot_until_they_end(manager):
+    started = time.monotonic()
+    outcomes = manager.run_batch(time.sleep, [(1,), (1,), (1,)], timeout=0.3)
+
+    assert time.monotonic() - started < 1
+    assert all(result is None and error.startswith('Not finished') for result, error in outcomes)
+    # The running call (and one the pool had already queued) still holds a slot
+    assert 1 <= manager.stats()['pending'] <= 2
+    assert wait_until_idle(manager) == 0
+
+
+def test_full_queue_rejects_batches(manager):
+    job_ids = [manager.submit(time.sleep, 0.5) for _ in range(2)]
+    rejected = manager.stats()['rejected']
+
+    with pytest.raises(JobQueueFull):
+        manager.run_batch(math.sqrt, [(4,)])
+
+    assert manager.stats()['rejected'] == rejected + 1
+    for job_id in job_ids:
+        assert manager.wait(job_id, 30)
+    assert manager.run_batch(math.sqrt, [(4,)]) == [(2.0, None)]
@@ -0,0 +1,68 @@
+# test_model_artifact.py
+#
+# The compact artifact's NumPy Kalman recursions must forecast exactly what the statsmodels
+# results they were exported from forecast.
+
+import warnings
+
+import numpy as np
+import pytest
+
+from benchmark import ARTIFACT_TOLERANCE
+from features import EXOG_COLUMNS
+from model_artifact import CompactServingModel, export_artifact
+from model_server import ServingModel
+
+ORDER = (1, 0, 0)
+SEASONAL_ORDER = (1, 0, 0, 12)
+
+
+def fit_results(df_features):
+    from statsmodels.tsa.statespace.sarimax import SARIMAX
+
+    model = SARIMAX(df_features['TOTAL_log'], exog=df_features[EXOG_COLUMNS], order=ORDER,
+                    seasonal_order=SEASONAL_ORDER, enforce_stationarity=False, enforce_invertibility=False)
+    with warnings.catch_warnings():
+        warnings.simplefilter('ignore')
+        return model.fit(disp=False)
+
+
+def serving_pair(results, directory):
+    export_artifact(results, str(directory), preprocessor_file=None)
+    options = {'drift_threshold': float('inf')}
+    return ServingModel(results, **options), CompactServingModel.load(str(directory), **options)
+
+
+def assert_same_forecasts(full, compact, df_features, extend):
+    expected = np.concatenate(full.forecast_interval(df_features, steps=12, extend=extend))
+    actual = np.concatenate(compact.forecast_interval(df_features, steps=12, extend=extend))
+    np.testing.assert_allclose(actual, expected, rtol=ARTIFACT_TOLERANCE)
+
+
+@pytest.fixture(scope='module')
+def results(df_features):
+    return fit_results(df_features)
+
+
+def test_filtered_series_match_statsmodels(results, df_features, tmp_path):
+    full, compact = serving_pair(results, tmp_path)
+    # A filtered series is run through the filter from the initial state under the stored parameters
+    assert_same_forecasts(full, compact, df_features.iloc[:-6], extend=False)
+
+
+def test_training_series_match_statsmodels(results, df_features, tmp_path):
+    full, compact = serving_pair(results, tmp_path)
+    assert_same_forecasts(full, compact, df_features, extend=True)
+
+
+def test_appended_months_match_statsmodels(df_features, tmp_path):
+    full, compact = serving_pair(fit_results(df_features.iloc[:-3]), tmp_path)
+
+    assert_same_forecasts(full, compact, df_features, extend=True)
+    assert full.last_date == compact.last_date == df_features.index[-1]
+    assert full.version == compact.version == 2
+
+
+def test_fingerprint_is_shared_with_statsmodels(results, tmp_path):
+    full, compact = serving_pair(results, tmp_path)
+    assert compact.fingerprint == full.fingerprint
@@ -0,0 +1,91 @@
+# test_predict_etag.py
+#
+# /predict answers carry an ETag built from the data watermark and the model fingerprint, and a
+# request whose If-None-Match still matches is answered 304 Not Modified without a forecast.
+
+from contextlib import contextmanager
+
+import pytest
+from sqlalchemy import text
+
+from sales_data import ROLLUP_TABLE
+
+
+@contextmanager
+def revised_last_day(engine, amount=100):
+    """
+    Re-price the last day of sales in the rollup table for the duration of the block, as the
+    rollup triggers do when an order of that day is updated.
+    """
+    update = text(f"UPDATE {ROLLUP_TABLE} SET TOTAL = TOTAL + :amount "
+                  f"WHERE SALE_DATE = (SELECT MAX(SALE_DATE) FROM {ROLLUP_TABLE})")
+    with engine.begin() as connection:
+        connection.execute(update, {'amount': amount})
+    try:
+        yield
+    finally:
+        with engine.begin() as connection:
+            connection.execute(update, {'amount': -amount})
+
+
+@pytest.fixture
+def predict_url(service):
+    return f'/predict?api_key={service.API_KEY}'
+
+
+def test_forecast_carries_etag(client, predict_url):
+    response = client.get(predict_url)
+
+    assert response.status_code == 200
+    assert response.headers['Cache-Control'] == 'public, no-cache'
+    etag, _ = response.get_etag()
+    assert etag is not None
+    assert client.get(predict_url).get_etag()[0] == etag
+
+
+def test_matching_etag_is_not_modified(client, predict_url):
+    etag, _ = client.get(predict_url).get_etag()
+
+    response = client.get(predict_url, headers={'If-None-Match': f'"{etag}"'})
+
+    assert response.status_code == 304
+    assert response.data == b''
+    assert response.get_etag()[0] == etag
+
+
+def test_stale_etag_gets_a_new_forecast(client, predict_url):
+    response = client.get(predict_url, headers={'If-None-Match': '"not-the-current-etag"'})
+
+    assert response.status_code == 200
+    assert response.get_json()['predicted_sales'] >= 0
+
+
+def test_data_change_changes_etag(client, engine, predict_url):
+    etag, _ = client.get(predict_url).get_etag()
+
+    with revised_last_day(engine):
+        response = client.get(predict_url, headers={'If-None-Match': f'"{etag}"'})
+        assert response.status_code == 200
+        assert response.get_etag()[0] != etag
+
+    assert client.get(predict_url, headers={'If-None-Match': f'"{etag}"'}).status_code == 304
+
+
+def test_etag_ignores_changes_outside_the_filters(client, engine, service):
+    # The last day's month is the latest month of data; a year filter before it is unaffected
+    first_year = service.change_detector.monthly_sales()['DATE'].min().year
+    url = f'/predict?api_key={service.API_KEY}&year={first_year}'
+    etag, _ = client.get(url).get_etag()
+
+    with revised_last_day(engine):
+        assert client.get(url, headers={'If-None-Match': f'"{etag}"'}).status_code == 304
+
+
+def test_etag_is_the_same_in_every_process(service):
+    # Built from the model fingerprint rather than per-process counters, so gunicorn workers agree
+    etag = service.forecast_etag((None, None, None))
+    service.serving_model.version += 1
+    try:
+        assert service.forecast_etag((None, None, None)) == etag
+    finally:
+        service.serving_model.version -= 1
@@ -0,0 +1,70 @@
+# test_profiling.py
+#
+# The profile store keeps the newest max_profiles profiles, worker dumps included, and drops
+# the rest.
+
+import cProfile
+
+import pytest
+
+from profiling import METADATA_SUFFIX, PROFILE_SUFFIX, ProfileStore
+
+
+def profile_ids(count):
+    # new_id() format, one millisecond apart, so creation order is unambiguous
+    return [f"20260101-000000{index:03d}-{index:08x}" for index in range(count)]
+
+
+def save(store, profile_id, worker_pids=()):
+    profiler = cProfile.Profile()
+    profiler.enable()
+    sum(range(100))
+    profiler.disable()
+    for pid in worker_pids:
+        profiler.dump_stats(str(store.directory / f"{profile_id}.worker-{pid}{PROFILE_SUFFIX}"))
+    store.save(profile_id, profiler, {'id': profile_id})
+
+
+@pytest.fixture
+def store(tmp_path):
+    store = ProfileStore(tmp_path / 'profiles', max_profiles=3)
+    store.directory.mkdir()
+    return store
+
+
+def test_only_the_newest_profiles_are_kept(store):
+    ids = profile_ids(5)
+    for profile_id in ids:
+        save(store, profile_id)
+
+    assert [profile['id'] for profile in store.list()] == ids[:1:-1]
+    assert sorted(path.name for path in store.directory.iterdir()) == sorted(
+        f"{profile_id}{suffix}" for profile_id in ids[2:] for suffix in (PROFILE_SUFFIX, METADATA_SUFFIX))
+
+
+def test_worker_dumps_are_trimmed_with_their_profile(store):
+    ids = profile_ids(4)
+    save(store, ids[0], worker_pids=(101, 102))
+    assert store.list()[0]['worker_profiles'] == 2
+
+    for profile_id in ids[1:]:
+        save(store, profile_id, worker_pids=(103,))
+
+    assert not list(store.directory.glob(f"{ids[0]}*"))
+    assert [profile['worker_profiles'] for profile in store.list()] == [1, 1, 1]
+
+
+def test_worker_dumps_are_merged_into_the_profile(store):
+    profile_id = profile_ids(1)[0]
+    save(store, profile_id, worker_pids=(101,))
+
+    stats = store.load(profile_id)
+    assert sum(calls for calls, *_ in stats.stats.values()) > 0
+    assert 'sum' in store.report(profile_id)
+
+
+def test_unknown_ids_are_rejected(store):
+    with pytest.raises(KeyError):
+        store.load('../profiles')
+    with pytest.raises(KeyError):
+        store.load(profile_ids(1)[0])
@@ -0,0 +1,73 @@
+# test_sales_data.py
+#
+# Date filters are half-open ranges whenever the year is known, and the rollup table answers the
+# same monthly totals as aggregating the laundry table.
+
+from datetime import date
+
+import pandas as pd
+import pytest
+from sqlalchemy import text
+
+import sales_data
+from sales_data import ROLLUP_TABLE, date_filter, fetch_monthly_sales, has_rollup, monthly_sales_query
+
+
+@pytest.mark.parametrize('filters, start, end', [
+    ((2024, None, None), date(2024, 1, 1), date(2025, 1, 1)),
+    ((2024, 2, None), date(2024, 2, 1), date(2024, 3, 1)),
+    ((2023, 2, None), date(2023, 2, 1), date(2023, 3, 1)),
+    ((2024, 12, None), date(2024, 12, 1), date(2025, 1, 1)),
+    ((2024, 2, 29), date(2024, 2, 29), date(2024, 3, 1)),
+    ((2024, 12, 31), date(2024, 12, 31), date(2025, 1, 1)),
+])
+def test_year_filters_are_half_open_ranges(filters, start, end):
+    conditions, params = date_filter(*filters, column='SALE_DATE')
+
+    assert conditions == ['SALE_DATE >= :start_date', 'SALE_DATE < :end_date']
+    assert params == {'start_date': start, 'end_date': end}
+
+
+def test_filters_without_a_year_use_date_parts():
+    assert date_filter(month=3, day=15) == (['MONTH(DATE) = :month', 'DAY(DATE) = :day'], {'month': 3, 'day': 15})
+    assert date_filter() == ([], {})
+
+
+def test_invalid_dates_are_rejected():
+    with pytest.raises(ValueError):
+        date_filter(2023, 2, 29)
+    assert monthly_sales_query(False, 2023, 2, 29) == (None, None)
+
+
+def laundry_totals(engine, *filters):
+    query, params = monthly_sales_query(False, *filters)
+    return sales_data.monthly_sales_frame(pd.read_sql(text(query), engine, params=params))
+
+
+# The synthetic data covers the years up to last month, so last year is always covered
+LAST_YEAR = date.today().year - 1
+
+
+@pytest.mark.parametrize('filters', [(), (LAST_YEAR,), (LAST_YEAR, 3), (LAST_YEAR, 3, 15), (None, 6)])
+def test_rollup_matches_laundry(engine, filters):
+    assert has_rollup(engine)
+    assert not laundry_totals(engine, *filters).empty
+    pd.testing.assert_frame_equal(fetch_monthly_sales(engine, *filters), laundry_totals(engine, *filters),
+                                  check_exact=False, rtol=1e-9)
+
+
+def test_failed_rollup_query_rechecks_the_table(engine):
+    assert has_rollup(engine)
+    with engine.begin() as connection:
+        connection.execute(text(f"ALTER TABLE {ROLLUP_TABLE} RENAME TO rollup_moved"))
+    try:
+        with pytest.raises(Exception):
+            fetch_monthly_sales(engine)
+        # The failed query dropped the cached columns; the next one aggregates from laundry
+        pd.testing.assert_frame_equal(fetch_monthly_sales(engine), laundry_totals(engine))
+        assert not has_rollup(engine)
+    finally:
+        with engine.begin() as connection:
+            connection.execute(text(f"ALTER TABLE rollup_moved RENAME TO {ROLLUP_TABLE}"))
+        sales_data._rollup_columns.clear()
+    assert has_rollup(engine)